@@ -0,0 +1,172 @@
+import numpy as np
+import os
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index over face encodings.
+
+    Vectors are bucketed under the nearest of `n_lists` k-means centroids; a
+    query only scans the `n_probe` closest buckets instead of the whole
+    gallery. Each vector carries a label (the student id) so encodings can be
+    added and removed incrementally as students are imported or deleted, and
+    an id (the encoding id) so the owner can check what the index holds.
+    """
+
+    def __init__(self, dim: int = 128, n_lists: int = None, n_probe: int = 8):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        # Version of the gallery the index reflects, set by the owner
+        self.version = None
+        self.centroids = np.empty((0, dim))
+        self.list_vectors = []
+        self.list_labels = []
+        self.list_ids = []
+
+    def __len__(self):
+        return sum(len(l) for l in self.list_labels)
+
+    @property
+    def is_trained(self) -> bool:
+        return len(self.centroids) > 0
+
+    # ─── Build ──────────────────────────────────────────────────────────────
+
+    def train(self, vectors: np.ndarray, iterations: int = 15, seed: int = 0):
+        """Fit the coarse quantizer with plain k-means."""
+        vectors = np.asarray(vectors, dtype=np.float64)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = self._nearest_lists(vectors, centroids, 1)[:, 0]
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            counts = np.bincount(assign, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        self.n_lists = n_lists
+        self.centroids = centroids
+        self.list_vectors = [np.empty((0, self.dim)) for _ in range(n_lists)]
+        self.list_labels = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self.list_ids = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+
+    def build(self, vectors, labels, ids=None):
+        """Train on and index a full gallery in one go."""
+        vectors = np.asarray(vectors, dtype=np.float64).reshape(-1, self.dim)
+        if len(vectors) == 0:
+            return self
+        self.train(vectors)
+        self.add(vectors, labels, ids)
+        return self
+
+    def ids(self) -> np.ndarray:
+        """Sorted ids of every indexed vector."""
+        return np.sort(np.concatenate(self.list_ids)) if self.list_ids else np.empty(0, dtype=np.int64)
+
+    # ─── Incremental updates ────────────────────────────────────────────────
+
+    def add(self, vectors, labels, ids=None):
+        vectors = np.asarray(vectors, dtype=np.float64).reshape(-1, self.dim)
+        labels = np.asarray(labels, dtype=np.int64)
+        ids = np.full(len(labels), -1, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        if len(vectors) == 0:
+            return
+        if not self.is_trained:
+            self.build(vectors, labels, ids)
+            return
+        assign = self._nearest_lists(vectors, self.centroids, 1)[:, 0]
+        for list_no in np.unique(assign):
+            mask = assign == list_no
+            self.list_vectors[list_no] = np.vstack([self.list_vectors[list_no], vectors[mask]])
+            self.list_labels[list_no] = np.concatenate([self.list_labels[list_no], labels[mask]])
+            self.list_ids[list_no] = np.concatenate([self.list_ids[list_no], ids[mask]])
+
+    def remove(self, labels) -> int:
+        """Drop every vector carrying one of `labels`; returns how many were removed."""
+        labels = np.asarray(list(labels), dtype=np.int64)
+        removed = 0
+        for i in range(len(self.list_labels)):
+            keep = ~np.isin(self.list_labels[i], labels)
+            removed += int((~keep).sum())
+            self.list_vectors[i] = self.list_vectors[i][keep]
+            self.list_labels[i] = self.list_labels[i][keep]
+            self.list_ids[i] = self.list_ids[i][keep]
+        return removed
+
+    # ─── Search ─────────────────────────────────────────────────────────────
+
+    def search(self, queries, n_probe: int = None):
+        """
+        Return (distances, labels) of the nearest indexed vector for each query.
+        Queries with no candidates get distance inf and label -1.
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.dim)
+        distances = np.full(len(queries), np.inf)
+        labels = np.full(len(queries), -1, dtype=np.int64)
+        if not self.is_trained or len(queries) == 0:
+            return distances, labels
+
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        probes = self._nearest_lists(queries, self.centroids, n_probe)
+        for qi, query in enumerate(queries):
+            candidates = [self.list_vectors[l] for l in probes[qi] if len(self.list_labels[l])]
+            if not candidates:
+                continue
+            cand_vectors = np.vstack(candidates)
+            cand_labels = np.concatenate([self.list_labels[l] for l in probes[qi] if len(self.list_labels[l])])
+            dist = np.linalg.norm(cand_vectors - query, axis=1)
+            best = int(np.argmin(dist))
+            distances[qi] = dist[best]
+            labels[qi] = cand_labels[best]
+        return distances, labels
+
+    @staticmethod
+    def _nearest_lists(vectors, centroids, k):
+        # Squared euclidean distances via the dot-product expansion
+        d = (
+            (vectors ** 2).sum(axis=1)[:, None]
+            - 2 * vectors @ centroids.T
+            + (centroids ** 2).sum(axis=1)[None, :]
+        )
+        if k >= d.shape[1]:
+            return np.argsort(d, axis=1)
+        part = np.argpartition(d, k, axis=1)[:, :k]
+        order = np.take_along_axis(d, part, axis=1).argsort(axis=1)
+        return np.take_along_axis(part, order, axis=1)
+
+    # ─── Persistence ────────────────────────────────────────────────────────
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        sizes = np.array([len(l) for l in self.list_labels], dtype=np.int64)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            sizes=sizes,
+            vectors=np.vstack(self.list_vectors) if self.list_vectors else np.empty((0, self.dim)),
+            labels=np.concatenate(self.list_labels) if self.list_labels else np.empty(0, dtype=np.int64),
+            ids=np.concatenate(self.list_ids) if self.list_ids else np.empty(0, dtype=np.int64),
+            params=np.array([self.dim, self.n_probe], dtype=np.int64),
+            version=np.array(self.version or ""),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            dim, n_probe = (int(v) for v in data["params"])
+            index = cls(dim=dim, n_lists=len(data["centroids"]), n_probe=n_probe)
+            index.centroids = data["centroids"]
+            offsets = np.concatenate([[0], np.cumsum(data["sizes"])])
+            vectors, labels = data["vectors"], data["labels"]
+            index.list_vectors = [vectors[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+            index.list_labels = [labels[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+            ids = data["ids"] if "ids" in data.files else np.full(len(labels), -1, dtype=np.int64)
+            index.list_ids = [ids[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+            index.version = str(data["version"]) if "version" in data.files else None
+        return index
@@ -0,0 +1,120 @@
+import os
+import numpy as np
+
+# Encodings of different students closer than this are flagged as possible
+# duplicate or twin enrollments (same-person photos are typically 0.3-0.5 apart)
+FACE_DUPLICATE_DISTANCE = float(os.getenv("FACE_DUPLICATE_DISTANCE", 0.35))
+# Rows per block in the pairwise scans; one block pair holds BLOCK² float32 distances
+FACE_DUPLICATE_BLOCK = int(os.getenv("FACE_DUPLICATE_BLOCK", 2048))
+
+def _blocks(n: int, size: int):
+    for start in range(0, n, size):
+        yield start, min(start + size, n)
+
+def _sq_distances(a, a_sq, b, b_sq):
+    return np.maximum(a_sq[:, None] - 2 * a @ b.T + b_sq[None, :], 0)
+
+def nearest_other_student(encodings, student_ids, gallery_encodings, gallery_ids,
+                          block: int = FACE_DUPLICATE_BLOCK):
+    """
+    (distances, student_ids) of the closest gallery encoding that belongs to
+    a different student, for each row of `encodings`; (inf, -1) where there
+    is none. The gallery is scanned in blocks so memory stays bounded.
+    """
+    faces = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+    ids = np.asarray(student_ids)
+    best_sq = np.full(len(faces), np.inf, dtype=np.float32)
+    best_id = np.full(len(faces), -1, dtype=np.int64)
+    if len(faces) == 0:
+        return np.sqrt(best_sq), best_id
+    faces_sq = (faces ** 2).sum(axis=1)
+    for start, end in _blocks(len(gallery_ids), block):
+        known = np.asarray(gallery_encodings[start:end], dtype=np.float32)
+        known_ids = np.asarray(gallery_ids[start:end])
+        sq = _sq_distances(faces, faces_sq, known, (known ** 2).sum(axis=1))
+        sq[ids[:, None] == known_ids[None, :]] = np.inf
+        nearest = sq.argmin(axis=1)
+        d = sq[np.arange(len(faces)), nearest]
+        better = d < best_sq
+        best_sq[better] = d[better]
+        best_id[better] = known_ids[nearest[better]]
+    return np.sqrt(best_sq), best_id
+
+def flag_new_encodings(encodings: list, student_ids: list, gallery,
+                       max_distance: float = FACE_DUPLICATE_DISTANCE) -> dict:
+    """
+    {student_id: (other_student_id, distance)} for newly enrolled students
+    with an encoding within `max_distance` of another student's, either in
+    `gallery` (taken before the import) or elsewhere in the same import.
+    """
+    if not encodings:
+        return {}
+    flags = {}
+    for pool_encodings, pool_ids in ((gallery.encodings, gallery.student_ids), (encodings, student_ids)):
+        distances, matches = nearest_other_student(encodings, student_ids, pool_encodings, pool_ids)
+        for sid, other, d in zip(student_ids, matches, distances):
+            if d <= max_distance and (sid not in flags or d < flags[sid][1]):
+                flags[sid] = (int(other), float(d))
+    return flags
+
+def duplicate_pairs(encodings, student_ids, max_distance: float = FACE_DUPLICATE_DISTANCE,
+                    block: int = FACE_DUPLICATE_BLOCK) -> dict:
+    """
+    {(student_a, student_b): distance} for every pair of different students
+    with encodings within `max_distance`, keeping each pair's closest
+    distance. Only the upper triangle of the pairwise matrix is computed,
+    one block × block tile at a time.
+    """
+    x = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+    ids = np.asarray(student_ids, dtype=np.int64)
+    x_sq = (x ** 2).sum(axis=1)
+    limit = np.float32(max_distance ** 2)
+    found_a, found_b, found_sq = [], [], []
+    for i0, i1 in _blocks(len(x), block):
+        for j0, j1 in _blocks(len(x), block):
+            if j1 <= i0:
+                continue
+            sq = _sq_distances(x[i0:i1], x_sq[i0:i1], x[j0:j1], x_sq[j0:j1])
+            ri, rj = np.nonzero(sq <= limit)
+            gi, gj = ri + i0, rj + j0
+            keep = (gi < gj) & (ids[gi] != ids[gj])
+            a, b = ids[gi[keep]], ids[gj[keep]]
+            found_a.append(np.minimum(a, b))
+            found_b.append(np.maximum(a, b))
+            found_sq.append(sq[ri[keep], rj[keep]])
+    if not found_a:
+        return {}
+    a, b, sq = np.concatenate(found_a), np.concatenate(found_b), np.concatenate(found_sq)
+    # Closest distance per student pair: sort by pair then distance, keep the first
+    order = np.lexsort((sq, b, a))
+    a, b, sq = a[order], b[order], sq[order]
+    first = np.ones(len(a), dtype=bool)
+    first[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1])
+    return {(int(p), int(q)): float(np.sqrt(d)) for p, q, d in zip(a[first], b[first], sq[first])}
+
+def cluster_pairs(pairs: dict) -> list:
+    """Group students linked by duplicate pairs into clusters (connected
+    components), closest clusters first."""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        parent[find(a)] = find(b)
+    clusters = {}
+    for (a, b), distance in pairs.items():
+        cluster = clusters.setdefault(find(a), {"student_ids": set(), "pairs": []})
+        cluster["student_ids"].update((a, b))
+        cluster["pairs"].append((a, b, distance))
+    result = [
+        {"student_ids": sorted(c["student_ids"]),
+         "pairs": sorted(c["pairs"], key=lambda p: p[2]),
+         "min_distance": min(p[2] for p in c["pairs"])}
+        for c in clusters.values()
+    ]
+    return sorted(result, key=lambda c: c["min_distance"])
@@ -1,51 +1,351 @@
-import cv2
-import face_recognition
 import numpy as np
-import json
+import os
+import time
 from sqlalchemy.orm import Session
-from app.models.models import FaceEncoding, Student
+from app.models.models import FaceEncoding, FaceEncodingChange, Student
+from app.ai.ann_index import IVFIndex
+from app.ai.gallery import get_gallery
+from app.utils.metrics import (
+    VIDEO_STAGE_SECONDS, VIDEO_FRAMES, VIDEO_FACES_PER_FRAME, VIDEO_JOB_SECONDS, GALLERY_SIZE
+)
 
-def encode_student_image(image_path: str) -> list:
-    image = face_recognition.load_image_file(image_path)
+# cv2 and face_recognition (dlib) are imported inside the functions that use
+# them so API workers that never touch video do not pay for loading them.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Recognition defaults (override per call or through the environment)
+FACE_TOLERANCE = float(os.getenv("FACE_TOLERANCE", 0.5))
+FACE_MIN_HITS = int(os.getenv("FACE_MIN_HITS", 2))
+FACE_MAX_MEAN_DISTANCE = float(os.getenv("FACE_MAX_MEAN_DISTANCE", 0.5))
+FACE_FRAME_INTERVAL = int(os.getenv("FACE_FRAME_INTERVAL", 30))
+
+# Multi-photo enrollment: photos farther than this from the student's medoid
+# are rejected, and faces whose centroid distance lies within the margin of
+# the tolerance are re-checked against every stored encoding.
+FACE_OUTLIER_DISTANCE = float(os.getenv("FACE_OUTLIER_DISTANCE", 0.6))
+FACE_REFINE_MARGIN = float(os.getenv("FACE_REFINE_MARGIN", 0.08))
+
+# Optional approximate nearest-neighbour index for large galleries. Below
+# about 50k encodings the batched exact scan is as fast or faster (measure
+# with `python -m benchmarks.ann_benchmark`), so the index stays off until then.
+FACE_ANN_ENABLED = os.getenv("FACE_ANN_ENABLED", "false").lower() == "true"
+FACE_ANN_MIN_GALLERY = int(os.getenv("FACE_ANN_MIN_GALLERY", 50000))
+FACE_ANN_N_PROBE = int(os.getenv("FACE_ANN_N_PROBE", 8))
+FACE_ANN_PATH = os.getenv("FACE_ANN_PATH", os.path.join(BASE_DIR, "data", "face_index.npz"))
+
+_ann_index = None
+
+def encode_student_image(source) -> list:
+    """Encoding of the first face in a photo given as a path or file object, or None."""
+    import face_recognition
+    image = face_recognition.load_image_file(source)
     encodings = face_recognition.face_encodings(image)
     if encodings:
         return encodings[0].tolist()
     return None
 
+def encode_student_images(images: list):
+    """
+    Encode several photos (paths or file objects) of one student and drop outliers.
+
+    Returns (encodings, rejected) where rejected lists the photos that had no
+    face or whose encoding was farther than FACE_OUTLIER_DISTANCE from the
+    medoid of the student's photos (wrong person, heavy blur, etc.).
+    """
+    encodings, kept, rejected = [], [], []
+    for image in images:
+        enc = encode_student_image(image)
+        if enc is None:
+            rejected.append(image)
+        else:
+            encodings.append(enc)
+            kept.append(image)
+    inliers = select_inliers(encodings)
+    rejected += [p for i, p in enumerate(kept) if i not in inliers]
+    return [encodings[i] for i in inliers], rejected
+
+def select_inliers(encodings: list, existing: list = None) -> list:
+    """
+    Indices of `encodings` within FACE_OUTLIER_DISTANCE of the medoid of all
+    photos (including already stored `existing` ones). With fewer than three
+    photos there is no majority to judge against, so everything is kept.
+    """
+    existing = existing or []
+    pool = np.array(list(existing) + list(encodings), dtype=np.float64).reshape(-1, 128)
+    if len(pool) < 3:
+        return list(range(len(encodings)))
+    pairwise = np.linalg.norm(pool[:, None, :] - pool[None, :, :], axis=2)
+    medoid = pool[pairwise.sum(axis=1).argmin()]
+    distances = np.linalg.norm(pool[len(existing):] - medoid, axis=1)
+    return [i for i, d in enumerate(distances) if d <= FACE_OUTLIER_DISTANCE]
+
 def load_all_encodings(db: Session):
-    records = db.query(FaceEncoding).all()
-    encodings = []
-    student_ids = []
-    for r in records:
-        enc = json.loads(r.encoding)
-        encodings.append(np.array(enc))
-        student_ids.append(r.student_id)
-    return encodings, student_ids
-
-def process_video(video_path: str, db: Session, frame_interval=30):
-    known_encodings, student_ids = load_all_encodings(db)
-    detected_ids = set()
+    """Return the (n, 128) encoding matrix and matching student ids, served
+    from the memory-mapped gallery snapshot."""
+    gallery = get_gallery(db)
+    return gallery.encodings, gallery.student_ids
+
+# ─── ANN Index ──────────────────────────────────────────────────────────────
+
+def _feed_position(version: str) -> int:
+    # Gallery.version is "<change feed id>:<max encoding id>:<count>"
+    return int(version.split(":")[0])
+
+def _catch_up(db: Session, index: IVFIndex, gallery) -> bool:
+    """
+    Re-index the students whose encodings changed since `index.version`,
+    read from the face encoding change feed, so every worker follows edits
+    made through any other. Returns False when the index has to be rebuilt,
+    including when its encoding ids no longer match the gallery's (rows
+    changed outside the feed).
+    """
+    if not index.version or _feed_position(index.version) > gallery.watermark.get("version", 0):
+        return False
+    students = {
+        student_id for (student_id,) in db.query(FaceEncodingChange.student_id)
+        .filter(FaceEncodingChange.id > _feed_position(index.version),
+                FaceEncodingChange.id <= gallery.watermark.get("version", 0))
+    }
+    if None in students:
+        return False
+    if students:
+        index.remove(students)
+        changed = np.isin(gallery.student_ids, list(students))
+        index.add(gallery.encodings[changed], gallery.student_ids[changed], gallery.encoding_ids[changed])
+    index.version = gallery.version
+    return np.array_equal(index.ids(), np.sort(gallery.encoding_ids))
+
+def get_ann_index(db: Session) -> IVFIndex:
+    """Return the process-wide index, loading it from disk and catching it up
+    with the gallery version, or rebuilding it when that is not possible."""
+    global _ann_index
+    gallery = get_gallery(db)
+    if _ann_index is None and os.path.exists(FACE_ANN_PATH):
+        _ann_index = IVFIndex.load(FACE_ANN_PATH)
+    if _ann_index is not None and _ann_index.version != gallery.version:
+        if _catch_up(db, _ann_index, gallery):
+            _ann_index.save(FACE_ANN_PATH)
+        else:
+            _ann_index = None
+    if _ann_index is None:
+        _ann_index = IVFIndex(n_probe=FACE_ANN_N_PROBE).build(
+            gallery.encodings, gallery.student_ids, gallery.encoding_ids)
+        _ann_index.version = gallery.version
+        _ann_index.save(FACE_ANN_PATH)
+    return _ann_index
+
+def _nearest(matrix: np.ndarray, matrix_sq: np.ndarray, labels: np.ndarray, faces: np.ndarray):
+    # Squared distances via the dot-product expansion, one GEMM per call
+    sq = matrix_sq[None, :] - 2 * faces @ matrix.T + (faces ** 2).sum(axis=1)[:, None]
+    best = sq.argmin(axis=1)
+    distances = np.sqrt(np.maximum(sq[np.arange(len(faces)), best], 0))
+    return distances, np.asarray(labels)[best]
+
+def build_matcher(db: Session, tolerance: float = None):
+    """
+    Return a function mapping an (n, 128) array of face encodings to the
+    (distances, student_ids) of their nearest gallery entries.
+
+    Uses the ANN index when enabled and the gallery is large enough.
+    Otherwise faces are first matched against one centroid per student and
+    only those whose distance falls within FACE_REFINE_MARGIN of `tolerance`
+    are re-matched against every stored encoding.
+    """
+    tolerance = FACE_TOLERANCE if tolerance is None else tolerance
+    gallery = get_gallery(db)
+    GALLERY_SIZE.set(len(gallery))
+    if FACE_ANN_ENABLED and len(gallery) >= FACE_ANN_MIN_GALLERY:
+        index = get_ann_index(db)
+        return lambda faces: index.search(faces)
+
+    known, labels = gallery.encodings, gallery.student_ids
+    known_sq = (known ** 2).sum(axis=1)
+    centroids, centroid_labels = gallery.centroids, gallery.centroid_student_ids
+    centroids_sq = (centroids ** 2).sum(axis=1)
+    single_photo = len(centroids) == len(known)
+
+    def match(faces):
+        faces = np.asarray(faces, dtype=np.float64).reshape(-1, 128)
+        if len(known) == 0 or len(faces) == 0:
+            return np.full(len(faces), np.inf), np.full(len(faces), -1, dtype=np.int64)
+        if single_photo:
+            return _nearest(known, known_sq, labels, faces)
+        distances, matched = _nearest(centroids, centroids_sq, centroid_labels, faces)
+        borderline = np.abs(distances - tolerance) <= FACE_REFINE_MARGIN
+        if borderline.any():
+            d, l = _nearest(known, known_sq, labels, faces[borderline])
+            distances[borderline], matched[borderline] = d, l
+        return distances, matched
+
+    return match
+
+# ─── Video Recognition ──────────────────────────────────────────────────────
+
+class StudentScore:
+    """Running match statistics for one student across the sampled frames."""
+
+    def __init__(self, student_id: int):
+        self.student_id = student_id
+        self.hits = 0
+        self.frames_seen = 0
+        self.best_distance = None
+        self.distance_sum = 0.0
+        self._last_frame = None
+
+    def add(self, frame_index: int, distance: float):
+        self.hits += 1
+        self.distance_sum += distance
+        if self.best_distance is None or distance < self.best_distance:
+            self.best_distance = distance
+        if self._last_frame != frame_index:
+            self.frames_seen += 1
+            self._last_frame = frame_index
+
+    @property
+    def mean_distance(self) -> float:
+        return self.distance_sum / self.hits if self.hits else None
+
+    def is_present(self, min_hits: int, max_mean_distance: float, frames_sampled: int = None) -> bool:
+        """
+        Matched in at least `min_hits` distinct frames, closely enough on
+        average. Several matches within one frame (a duplicate detection or
+        a look-alike) count once. When the whole video yielded fewer than
+        `min_hits` sampled frames, `frames_sampled` lowers the requirement
+        to all of them, so a short clip can still mark students present.
+        """
+        if frames_sampled is not None:
+            min_hits = max(1, min(min_hits, frames_sampled))
+        return self.frames_seen >= min_hits and self.mean_distance <= max_mean_distance
+
+    def to_dict(self, frames_sampled: int) -> dict:
+        return {
+            "student_id": self.student_id,
+            "hits": self.hits,
+            "frames_seen": self.frames_seen,
+            "frames_sampled": frames_sampled,
+            "best_distance": round(self.best_distance, 4),
+            "mean_distance": round(self.mean_distance, 4),
+        }
+
+def recognition_params(frame_interval: int = None, tolerance: float = None,
+                       min_hits: int = None, max_mean_distance: float = None) -> dict:
+    """Fill unset recognition parameters with the configured defaults."""
+    return {
+        "frame_interval": frame_interval or FACE_FRAME_INTERVAL,
+        "tolerance": FACE_TOLERANCE if tolerance is None else tolerance,
+        "min_hits": FACE_MIN_HITS if min_hits is None else min_hits,
+        "max_mean_distance": FACE_MAX_MEAN_DISTANCE if max_mean_distance is None else max_mean_distance,
+    }
+
+def observe_stage(stage: str, started: float) -> float:
+    """Record a stage latency in the metrics registry and return a fresh start time."""
+    VIDEO_STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+    return time.perf_counter()
+
+def analyse_frame(frame, match, tolerance: float, record=observe_stage):
+    """
+    Detect, encode and match the faces in one BGR frame.
+
+    Returns (faces_detected, matches) where matches lists the
+    (student_id, distance) pairs within `tolerance`.
+    """
+    import cv2
+    import face_recognition
+
+    t = time.perf_counter()
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    t = record("convert", t)
+    face_locations = face_recognition.face_locations(rgb_frame)
+    t = record("detect", t)
+    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    t = record("encode", t)
+    VIDEO_FACES_PER_FRAME.observe(len(face_encodings))
+    if not face_encodings:
+        return 0, []
+
+    distances, matched_ids = match(face_encodings)
+    record("match", t)
+    matches = [(sid, d) for d, sid in zip(distances.tolist(), matched_ids.tolist())
+               if sid >= 0 and d <= tolerance]
+    return len(face_encodings), matches
+
+def process_video(video_path: str, db: Session, frame_interval: int = None,
+                  tolerance: float = None, min_hits: int = None,
+                  max_mean_distance: float = None, timings: dict = None):
+    """
+    Scan a video and aggregate face matches per student.
+
+    Every sampled face is assigned to its nearest gallery encoding when the
+    distance is within `tolerance`. A student is marked present only after
+    matches in `min_hits` distinct frames (or every sampled frame, for videos
+    shorter than that) whose mean distance is at most `max_mean_distance`,
+    so a single noisy frame no longer decides attendance.
+
+    Per-stage latencies are recorded in the metrics registry; pass a dict as
+    `timings` to also receive this job's breakdown.
+
+    Returns (detected_ids, scores) where scores maps student_id to its stats.
+    """
+    import cv2
+
+    job_start = time.perf_counter()
+    params = recognition_params(frame_interval, tolerance, min_hits, max_mean_distance)
+    frame_interval = params["frame_interval"]
+    tolerance = params["tolerance"]
+    min_hits = params["min_hits"]
+    max_mean_distance = params["max_mean_distance"]
+
+    stage_totals = {"load_gallery": 0.0, "decode": 0.0, "convert": 0.0,
+                    "detect": 0.0, "encode": 0.0, "match": 0.0}
+
+    def record(stage, started):
+        elapsed = time.perf_counter() - started
+        stage_totals[stage] += elapsed
+        VIDEO_STAGE_SECONDS.observe(elapsed, stage=stage)
+        return time.perf_counter()
+
+    t = time.perf_counter()
+    match = build_matcher(db, tolerance)
+    record("load_gallery", t)
+    scores = {}
+    frames_sampled = 0
+    faces_detected = 0
 
     cap = cv2.VideoCapture(video_path)
     frame_count = 0
 
     while cap.isOpened():
+        t = time.perf_counter()
         ret, frame = cap.read()
         if not ret:
             break
+        t = record("decode", t)
         if frame_count % frame_interval == 0:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame)
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-
-            for face_enc in face_encodings:
-                matches = face_recognition.compare_faces(known_encodings, face_enc, tolerance=0.5)
-                distances = face_recognition.face_distance(known_encodings, face_enc)
-                if True in matches:
-                    best_idx = np.argmin(distances)
-                    if matches[best_idx]:
-                        detected_ids.add(student_ids[best_idx])
+            frames_sampled += 1
+            n_faces, matches = analyse_frame(frame, match, tolerance, record)
+            faces_detected += n_faces
+            for sid, distance in matches:
+                if sid not in scores:
+                    scores[sid] = StudentScore(sid)
+                scores[sid].add(frame_count, distance)
         frame_count += 1
 
     cap.release()
-    return list(detected_ids)
\ No newline at end of file
+
+    total = time.perf_counter() - job_start
+    VIDEO_FRAMES.inc(frame_count, kind="decoded")
+    VIDEO_FRAMES.inc(frames_sampled, kind="sampled")
+    VIDEO_JOB_SECONDS.observe(total)
+    if timings is not None:
+        timings.update({
+            "total_seconds": round(total, 4),
+            "stage_seconds": {k: round(v, 4) for k, v in stage_totals.items()},
+            "frames_decoded": frame_count,
+            "frames_sampled": frames_sampled,
+            "faces_detected": faces_detected,
+            "gallery_size": len(get_gallery(db)),
+        })
+
+    detected_ids = [sid for sid, s in scores.items() if s.is_present(min_hits, max_mean_distance, frames_sampled)]
+    return detected_ids, {sid: s.to_dict(frames_sampled) for sid, s in scores.items()}
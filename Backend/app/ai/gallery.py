@@ -0,0 +1,182 @@
+import numpy as np
+import json
+import os
+import threading
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.models.models import FaceEncoding, FaceEncodingChange
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+GALLERY_DIR = os.getenv("FACE_GALLERY_DIR", os.path.join(BASE_DIR, "data", "gallery"))
+
+_lock = threading.Lock()
+_gallery = None
+
+class Gallery:
+    """
+    Read-only view of every face encoding in the database.
+
+    The matrices are memory-mapped from the on-disk snapshot, so worker
+    processes on the same host share the same physical pages instead of each
+    parsing the `face_encodings` table into a private copy.
+    """
+
+    def __init__(self, encodings: np.ndarray, student_ids: np.ndarray,
+                 encoding_ids: np.ndarray, watermark: dict,
+                 centroids: np.ndarray = None, centroid_student_ids: np.ndarray = None):
+        self.encodings = encodings
+        self.student_ids = student_ids
+        self.encoding_ids = encoding_ids
+        self.watermark = watermark
+        if centroids is None:
+            centroids, centroid_student_ids = compute_centroids(encodings, student_ids)
+        self.centroids = centroids
+        self.centroid_student_ids = centroid_student_ids
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    @property
+    def version(self) -> str:
+        w = self.watermark
+        return f"{w.get('version', 0)}:{w['max_id']}:{w['count']}"
+
+def compute_centroids(encodings: np.ndarray, student_ids: np.ndarray):
+    """Mean encoding per student, used for the fast first-pass match."""
+    if len(student_ids) == 0:
+        return np.empty((0, 128)), np.empty(0, dtype=np.int64)
+    uniq, inverse = np.unique(student_ids, return_inverse=True)
+    sums = np.zeros((len(uniq), encodings.shape[1]))
+    np.add.at(sums, inverse, encodings)
+    counts = np.bincount(inverse, minlength=len(uniq))
+    return sums / counts[:, None], uniq.astype(np.int64)
+
+def _db_watermark(db: Session) -> dict:
+    version, max_id, count = db.query(
+        select(func.max(FaceEncodingChange.id)).scalar_subquery(),
+        func.max(FaceEncoding.id),
+        func.count(FaceEncoding.id),
+    ).one()
+    return {"version": version or 0, "max_id": max_id or 0, "count": count or 0}
+
+def _fetch_rows(db: Session, after_id: int = 0, ids=None):
+    query = db.query(FaceEncoding.id, FaceEncoding.student_id, FaceEncoding.encoding)
+    if ids is not None:
+        query = query.filter(FaceEncoding.id.in_(ids))
+    rows = query.filter(FaceEncoding.id > after_id).order_by(FaceEncoding.id).all()
+    encodings = np.array([json.loads(r.encoding) for r in rows], dtype=np.float64).reshape(-1, 128)
+    student_ids = np.array([r.student_id for r in rows], dtype=np.int64)
+    encoding_ids = np.array([r.id for r in rows], dtype=np.int64)
+    return encodings, student_ids, encoding_ids
+
+# ─── Snapshot Files ─────────────────────────────────────────────────────────
+
+def _path(name: str) -> str:
+    return os.path.join(GALLERY_DIR, name)
+
+def _write_snapshot(encodings, student_ids, encoding_ids, version: int):
+    watermark = {
+        "version": version,
+        "max_id": int(encoding_ids.max()) if len(encoding_ids) else 0,
+        "count": int(len(encoding_ids)),
+    }
+    centroids, centroid_student_ids = compute_centroids(encodings, student_ids)
+    os.makedirs(GALLERY_DIR, exist_ok=True)
+    suffix = f".{os.getpid()}.tmp"
+    arrays = {
+        "encodings.npy": encodings,
+        "student_ids.npy": student_ids,
+        "encoding_ids.npy": encoding_ids,
+        "centroids.npy": centroids,
+        "centroid_student_ids.npy": centroid_student_ids,
+    }
+    for name, arr in arrays.items():
+        with open(_path(name) + suffix, "wb") as f:
+            np.save(f, arr)
+    with open(_path("meta.json") + suffix, "w") as f:
+        json.dump(watermark, f)
+    # meta.json is replaced last so readers never see a watermark newer than the data
+    for name in list(arrays) + ["meta.json"]:
+        os.replace(_path(name) + suffix, _path(name))
+
+def _read_snapshot():
+    try:
+        with open(_path("meta.json")) as f:
+            watermark = json.load(f)
+        encodings = np.load(_path("encodings.npy"), mmap_mode="r")
+        student_ids = np.load(_path("student_ids.npy"), mmap_mode="r")
+        encoding_ids = np.load(_path("encoding_ids.npy"), mmap_mode="r")
+        centroids = np.load(_path("centroids.npy"), mmap_mode="r")
+        centroid_student_ids = np.load(_path("centroid_student_ids.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if not (len(encodings) == len(student_ids) == len(encoding_ids) == watermark.get("count")):
+        return None
+    if len(centroids) != len(centroid_student_ids):
+        return None
+    return Gallery(encodings, student_ids, encoding_ids, watermark, centroids, centroid_student_ids)
+
+# ─── Refresh ────────────────────────────────────────────────────────────────
+
+def _apply_changes(db: Session, current: Gallery, target: dict) -> bool:
+    """
+    Apply the change feed since `current` was written: drop tombstoned rows,
+    fetch only the added ones. Returns False when the result does not match
+    the database (e.g. rows written outside the ORM), so the caller rebuilds.
+    """
+    changes = (
+        db.query(FaceEncodingChange.encoding_id, FaceEncodingChange.op)
+        .filter(FaceEncodingChange.id > current.watermark.get("version", 0),
+                FaceEncodingChange.id <= target["version"])
+        .order_by(FaceEncodingChange.id)
+        .all()
+    )
+    removed, added = set(), set()
+    for encoding_id, op in changes:
+        if op == "add":
+            added.add(encoding_id)
+            removed.discard(encoding_id)
+        else:
+            removed.add(encoding_id)
+            added.discard(encoding_id)
+
+    keep = ~np.isin(current.encoding_ids, list(removed | added))
+    new_enc, new_sids, new_ids = _fetch_rows(db, ids=sorted(added)) if added else (
+        np.empty((0, 128)), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    encoding_ids = np.concatenate([current.encoding_ids[keep], new_ids])
+    if len(encoding_ids) != target["count"] or int(encoding_ids.max(initial=0)) != target["max_id"]:
+        return False
+    order = np.argsort(encoding_ids, kind="stable")
+    _write_snapshot(
+        np.concatenate([current.encodings[keep], new_enc])[order],
+        np.concatenate([current.student_ids[keep], new_sids])[order],
+        encoding_ids[order],
+        target["version"],
+    )
+    return True
+
+def _refresh_snapshot(db: Session, current, target: dict):
+    """Bring the on-disk snapshot up to date from the change feed, falling
+    back to a full rebuild when there is no usable snapshot to patch."""
+    if current is not None and current.watermark.get("version", 0) <= target["version"]:
+        if _apply_changes(db, current, target):
+            return
+    _write_snapshot(*_fetch_rows(db), target["version"])
+
+def get_gallery(db: Session) -> Gallery:
+    """Return the current gallery, refreshing the snapshot if the DB moved on."""
+    global _gallery
+    target = _db_watermark(db)
+    if _gallery is not None and _gallery.watermark == target:
+        return _gallery
+    with _lock:
+        snapshot = _read_snapshot()
+        if snapshot is None or snapshot.watermark != target:
+            _refresh_snapshot(db, snapshot, target)
+            snapshot = _read_snapshot()
+        if snapshot is None:
+            # Snapshot unreadable (e.g. concurrent rebuild); serve from memory
+            encodings, student_ids, encoding_ids = _fetch_rows(db)
+            snapshot = Gallery(encodings, student_ids, encoding_ids, target)
+        _gallery = snapshot
+    return _gallery
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from app.ai.face_service import process_video, recognition_params
+from app.ai.gallery import get_gallery
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+RESULT_CACHE_DIR = os.getenv("FACE_RESULT_CACHE_DIR", os.path.join(BASE_DIR, "data", "result_cache"))
+RESULT_CACHE_ENABLED = os.getenv("FACE_RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("FACE_RESULT_CACHE_MAX_ENTRIES", 500))
+RESULT_CACHE_MEMORY_ENTRIES = 64
+
+_lock = threading.Lock()
+_memory = OrderedDict()
+
+def cache_key(content_hash: str, params: dict, gallery_version: str) -> str:
+    """Results depend on the video bytes, the recognition parameters and the
+    gallery they were matched against; a new gallery version misses naturally."""
+    raw = json.dumps([content_hash, params, gallery_version], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _path(key: str) -> str:
+    return os.path.join(RESULT_CACHE_DIR, f"{key}.json")
+
+def _get(key: str):
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    try:
+        with open(_path(key)) as f:
+            value = json.load(f)
+        os.utime(_path(key))
+    except (OSError, ValueError):
+        return None
+    _remember(key, value)
+    return value
+
+def _remember(key: str, value):
+    with _lock:
+        _memory[key] = value
+        _memory.move_to_end(key)
+        while len(_memory) > RESULT_CACHE_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+def _put(key: str, value):
+    _remember(key, value)
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    tmp = _path(key) + f".{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp, _path(key))
+    _prune()
+
+def _prune():
+    entries = [e for e in os.scandir(RESULT_CACHE_DIR) if e.name.endswith(".json")]
+    if len(entries) <= RESULT_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for e in entries[:len(entries) - RESULT_CACHE_MAX_ENTRIES]:
+        try:
+            os.unlink(e.path)
+        except OSError:
+            pass
+
+def cached_process_video(video_path: str, content_hash: str, db: Session,
+                         timings: dict = None, **params):
+    """
+    `process_video` with a result cache. Returns (detected_ids, scores, cached).
+    Entries are shared by all workers through RESULT_CACHE_DIR.
+    """
+    params = recognition_params(**params)
+    if not RESULT_CACHE_ENABLED or not content_hash:
+        return (*process_video(video_path, db, timings=timings, **params), False)
+
+    key = cache_key(content_hash, params, get_gallery(db).version)
+    hit = _get(key)
+    if hit is not None:
+        return hit["detected_ids"], {int(k): v for k, v in hit["scores"].items()}, True
+
+    detected_ids, scores = process_video(video_path, db, timings=timings, **params)
+    _put(key, {"detected_ids": detected_ids, "scores": scores})
+    return detected_ids, scores, False
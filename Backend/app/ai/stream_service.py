@@ -0,0 +1,273 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+from sqlalchemy.orm import Session
+from app.ai.face_service import StudentScore, analyse_frame, build_matcher, recognition_params
+from app.utils.metrics import STREAM_FRAMES, STREAMS_ACTIVE
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 4))
+STREAM_MAX_ACTIVE = int(os.getenv("STREAM_MAX_ACTIVE", 4))
+STREAM_MAX_SECONDS = int(os.getenv("STREAM_MAX_SECONDS", 2 * 3600))
+STREAM_RESULT_TTL = int(os.getenv("STREAM_RESULT_TTL", 600))
+STREAM_PROGRESS_INTERVAL = float(os.getenv("STREAM_PROGRESS_INTERVAL", 2))
+# Directory whose files may be played back as streams (testing / demos); unset disables it
+STREAM_FILE_ROOT = os.getenv("STREAM_FILE_ROOT")
+STREAM_SCHEMES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://")
+# Camera URLs the server may open, comma-separated: hosts ("cam1.school.lan",
+# "10.0.5.12:554") or URL prefixes ("rtsp://10.0.5.12/live/"). Unset allows no
+# camera URLs, so teachers cannot point the server at internal services.
+STREAM_ALLOWED_SOURCES = [s.strip() for s in os.getenv("STREAM_ALLOWED_SOURCES", "").split(",") if s.strip()]
+
+class StreamLimitReached(RuntimeError):
+    pass
+
+def _allowed_url(url: str) -> bool:
+    try:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port
+    except ValueError:
+        return False
+    if not host:
+        return False
+    for entry in STREAM_ALLOWED_SOURCES:
+        if "://" in entry:
+            allowed = urlsplit(entry)
+            prefix = allowed.path.rstrip("/")
+            if (parts.scheme.lower() == allowed.scheme.lower() and host == allowed.hostname
+                    and port == allowed.port
+                    and (parts.path == prefix or parts.path.startswith(prefix + "/"))):
+                return True
+        else:
+            allowed = urlsplit(f"//{entry}")
+            if host == allowed.hostname and allowed.port in (None, port):
+                return True
+    return False
+
+def resolve_source(source: str) -> str:
+    """Accept camera URLs allowed by STREAM_ALLOWED_SOURCES, or files under
+    STREAM_FILE_ROOT; raise ValueError otherwise."""
+    if source.lower().startswith(STREAM_SCHEMES):
+        if not _allowed_url(source):
+            raise ValueError("Stream source is not an allowed camera")
+        return source
+    if STREAM_FILE_ROOT:
+        root = os.path.realpath(STREAM_FILE_ROOT)
+        path = os.path.realpath(os.path.join(root, source))
+        if path.startswith(root + os.sep) and os.path.isfile(path):
+            return path
+    raise ValueError("Unsupported stream source")
+
+class LiveStream:
+    """
+    Recognition over a live source.
+
+    A reader thread decodes frames and offers every `frame_interval`th one to
+    a bounded queue, discarding the oldest queued frame when recognition falls
+    behind, so results track the present instead of an ever-growing backlog.
+    A worker thread analyses queued frames and appends an event whenever a
+    student crosses the presence threshold.
+    """
+
+    def __init__(self, source: str, match, params: dict, teacher_id: int,
+                 roster: dict, realtime: bool = True):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.teacher_id = teacher_id
+        self.params = params
+        self.roster = roster
+        self.realtime = realtime
+        self.status = "running"
+        self.error = None
+        self.started_at = time.time()
+        self.ended_at = None
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+
+        self._match = match
+        self._scores = {}
+        self._detected = []
+        self._events = []
+        self._lock = threading.Lock()
+        self._frames = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._cancelled = False
+        self._worker = None
+
+    def start(self):
+        STREAMS_ACTIVE.inc()
+        threading.Thread(target=self._read, name=f"stream-read-{self.id[:8]}", daemon=True).start()
+        self._worker = threading.Thread(target=self._work, name=f"stream-work-{self.id[:8]}", daemon=True)
+        self._worker.start()
+        return self
+
+    def stop(self, timeout: float = 5):
+        """Stop reading and wait (briefly) for the frame in progress to finish."""
+        self._cancelled = True
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+    # ─── Events ─────────────────────────────────────────────────────────────
+
+    def _emit(self, event_type: str, **data):
+        with self._lock:
+            self._events.append({"id": len(self._events), "type": event_type, **data})
+
+    def events_since(self, cursor: int) -> list:
+        with self._lock:
+            return self._events[cursor:]
+
+    def results(self):
+        """(detected_ids, scores) in the shape returned by `process_video`."""
+        with self._lock:
+            return list(self._detected), {sid: s.to_dict(self.frames_processed)
+                                          for sid, s in self._scores.items()}
+
+    def progress(self) -> dict:
+        return {
+            "status": self.status,
+            "error": self.error,
+            "elapsed_seconds": round((self.ended_at or time.time()) - self.started_at, 1),
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "frames_processed": self.frames_processed,
+            "detected_count": len(self._detected),
+        }
+
+    # ─── Threads ────────────────────────────────────────────────────────────
+
+    def _offer(self, item):
+        # Only the reader puts, so making room then putting cannot race
+        while True:
+            try:
+                self._frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    if self._frames.get_nowait() is not None:
+                        self.frames_dropped += 1
+                        STREAM_FRAMES.inc(kind="dropped")
+                except queue.Empty:
+                    pass
+
+    def _read(self):
+        import cv2
+
+        cap = cv2.VideoCapture(self.source)
+        try:
+            if not cap.isOpened():
+                self.error = "Could not open stream source"
+                return
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25
+            interval = self.params["frame_interval"]
+            start = time.perf_counter()
+            index = 0
+            while not self._stop.is_set() and time.perf_counter() - start < STREAM_MAX_SECONDS:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                self.frames_read += 1
+                STREAM_FRAMES.inc(kind="read")
+                if index % interval == 0:
+                    self._offer((index, frame))
+                index += 1
+                if self.realtime:
+                    # Pace file playback at its native rate; live sources block in read()
+                    delay = start + index / fps - time.perf_counter()
+                    if delay > 0:
+                        self._stop.wait(delay)
+        except Exception as e:
+            self.error = f"Stream read error: {e}"
+        finally:
+            cap.release()
+            self._offer(None)
+
+    def _work(self):
+        tolerance = self.params["tolerance"]
+        min_hits = self.params["min_hits"]
+        max_mean_distance = self.params["max_mean_distance"]
+        last_progress = time.perf_counter()
+        try:
+            while True:
+                item = self._frames.get()
+                if item is None or self._stop.is_set():
+                    break
+                index, frame = item
+                _, matches = analyse_frame(frame, self._match, tolerance)
+                self.frames_processed += 1
+                STREAM_FRAMES.inc(kind="processed")
+
+                newly_present = []
+                with self._lock:
+                    for sid, distance in matches:
+                        if sid not in self._scores:
+                            self._scores[sid] = StudentScore(sid)
+                        self._scores[sid].add(index, distance)
+                    for sid, _ in matches:
+                        score = self._scores[sid]
+                        if sid not in self._detected and score.is_present(min_hits, max_mean_distance):
+                            self._detected.append(sid)
+                            newly_present.append(score)
+                for score in newly_present:
+                    student = self.roster.get(score.student_id)
+                    self._emit("detected", frame=index,
+                               student_id=score.student_id,
+                               name=student["name"] if student else None,
+                               roll_number=student["roll_number"] if student else None,
+                               in_roster=student is not None,
+                               score=score.to_dict(self.frames_processed))
+
+                if time.perf_counter() - last_progress >= STREAM_PROGRESS_INTERVAL:
+                    self._emit("progress", **self.progress())
+                    last_progress = time.perf_counter()
+        except Exception as e:
+            self.error = f"Stream processing error: {e}"
+        finally:
+            self._stop.set()
+            self.ended_at = time.time()
+            if self.error:
+                self.status = "failed"
+            else:
+                self.status = "stopped" if self._cancelled else "finished"
+            STREAMS_ACTIVE.dec()
+            self._emit("end", **self.progress())
+
+# ─── Registry ───────────────────────────────────────────────────────────────
+
+_streams = {}
+_lock = threading.Lock()
+
+def _prune():
+    cutoff = time.time() - STREAM_RESULT_TTL
+    for stream_id, stream in list(_streams.items()):
+        if stream.ended_at and stream.ended_at < cutoff:
+            del _streams[stream_id]
+
+def start_stream(source: str, db: Session, teacher_id: int, roster: dict,
+                 realtime: bool = True, **params) -> LiveStream:
+    """Start recognising `source` in the background; `roster` maps student id to
+    the name/roll number pushed with each detection."""
+    params = recognition_params(**params)
+    match = build_matcher(db, params["tolerance"])
+    with _lock:
+        _prune()
+        if sum(s.running for s in _streams.values()) >= STREAM_MAX_ACTIVE:
+            raise StreamLimitReached("Too many live streams running, try again later")
+        stream = LiveStream(source, match, params, teacher_id, roster, realtime)
+        _streams[stream.id] = stream
+    return stream.start()
+
+def get_stream(stream_id: str, teacher_id: int):
+    with _lock:
+        stream = _streams.get(stream_id)
+    if stream is None or stream.teacher_id != teacher_id:
+        return None
+    return stream
@@ -1,22 +1,102 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
 import os
+import time
 from dotenv import load_dotenv
+from app.utils.metrics import current_request_stats, request_route
 
 load_dotenv()
 
-DATABASE_URL = (
+# DATABASE_URL overrides the MySQL settings, e.g. sqlite:///bench.db for
+# benchmarks or local experiments.
+DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"mysql+mysqlconnector://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
     f"@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
 )
 
-engine = create_engine(DATABASE_URL, echo=False)
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the read-heavy teacher endpoints; imports and other writes
+# stay on the sync engine above. Same database, async driver.
+# Other backends need ASYNC_DATABASE_URL set explicitly.
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+def _async_database_url():
+    url = os.getenv("ASYNC_DATABASE_URL")
+    if url:
+        return url
+    backend = make_url(DATABASE_URL).get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(
+            f"No default async driver for the '{backend}' database backend; "
+            "set ASYNC_DATABASE_URL to an async URL for the same database"
+        )
+    return make_url(DATABASE_URL).set(drivername=ASYNC_DRIVERS[backend])
+
+ASYNC_DATABASE_URL = _async_database_url()
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, pool_recycle=3600)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+# ─── Query Accounting ───────────────────────────────────────────────────────
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+# Statements allowed per request before a warning is logged (0 disables).
+# With QUERY_BUDGET_STRICT=true the offending statement raises instead, so an
+# N+1 regression fails the test that exercises the endpoint.
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 0))
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+# Registered on the Engine class so every engine (incl. test/benchmark ones) is counted
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request_stats()
+    if stats is None:
+        return
+    stats["queries"] += 1
+    if QUERY_BUDGET and stats["queries"] == QUERY_BUDGET + 1:
+        message = f"{request_route(stats)} exceeded the query budget of {QUERY_BUDGET}"
+        if QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request_stats()
+    starts = conn.info.get("query_start")
+    if stats is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats["db_time"] += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("slow query (%.0f ms) in %s: %s", elapsed * 1000,
+                       request_route(stats), " ".join(statement.split())[:500])
+
+@event.listens_for(Engine, "handle_error")
+def _failed_query(exception_context):
+    # after_cursor_execute does not fire for failed statements
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
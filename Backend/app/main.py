@@ -1,19 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from app.database import Base, engine
-from app.models import models
+from fastapi.middleware.gzip import GZipMiddleware
 from app.routes import auth, admin, teacher
-from app.utils.seed import seed_admin
+from app.utils.seed import init_db
+from app.utils.static import CachedStaticFiles
+from app.utils.responses import FastJSONResponse
+from app.utils.metrics import MetricsMiddleware, render_metrics
+from app.utils.admission import AdmissionMiddleware
+from app.database import async_engine
 import os
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
+# Set RUN_STARTUP_TASKS=false on workers when `python -m app.utils.seed`
+# already ran once for the deployment.
+RUN_STARTUP_TASKS = os.getenv("RUN_STARTUP_TASKS", "true").lower() == "true"
 
-# Seed admin on startup
-seed_admin()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if RUN_STARTUP_TASKS:
+        # Create all tables and seed the admin account
+        init_db()
+    yield
+    await async_engine.dispose()
 
-app = FastAPI(title="AttendAI API")
+app = FastAPI(title="AttendAI API", default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# Innermost: refuses overloaded uploads/imports before their body is read
+app.add_middleware(AdmissionMiddleware, routes=admin.router.routes + teacher.router.routes)
+
+# Compress large list responses (students, records, analytics) for mobile clients
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_SIZE", 1024)))
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,7 +43,14 @@ app.add_middleware(
 # Serve uploaded files
 uploads_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
 os.makedirs(uploads_dir, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+app.mount(
+    "/uploads",
+    CachedStaticFiles(directory=uploads_dir, immutable_prefixes=(os.path.join("students", "thumbs"),)),
+    name="uploads"
+)
+
+# Outermost, so latency includes compression and CORS handling
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(admin.router)
@@ -34,4 +58,9 @@ app.include_router(teacher.router)
 
 @app.get("/")
 def root():
-    return {"message": "AttendAI Backend Running"}
\ No newline at end of file
+    return {"message": "AttendAI Backend Running"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -1,8 +1,9 @@
 from sqlalchemy import (
     Column, Integer, String, Float, Date, Time,
-    ForeignKey, Text, Enum, DateTime, Boolean
+    ForeignKey, Text, Enum, DateTime, Boolean, Index
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session, relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -65,6 +66,15 @@ class FaceEncoding(Base):
     encoding = Column(Text, nullable=False)  # JSON serialized numpy array
     student = relationship("Student", back_populates="face_encodings")
 
+class FaceEncodingChange(Base):
+    """Append-only change feed for face_encodings; the latest id is the gallery version."""
+    __tablename__ = "face_encoding_changes"
+    id = Column(Integer, primary_key=True)
+    encoding_id = Column(Integer, nullable=False)
+    student_id = Column(Integer)
+    op = Column(Enum("add", "remove"), nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
 class StudentSubject(Base):
     __tablename__ = "student_subjects"
     id = Column(Integer, primary_key=True)
@@ -95,4 +105,57 @@ class AttendanceRecord(Base):
     marked_by_ai = Column(Boolean, default=False)
     # Relationships
     attendance = relationship("Attendance", back_populates="records")
-    student = relationship("Student")
\ No newline at end of file
+    student = relationship("Student")
+
+# Aggregates maintained by app.utils.rollups; plain ids (no foreign keys) so
+# they never block deletes of the rows they summarise.
+class AttendanceRollup(Base):
+    """Weekly totals per teacher, subject and class."""
+    __tablename__ = "attendance_rollups"
+    id = Column(Integer, primary_key=True)
+    week_start = Column(Date, nullable=False, index=True)  # Monday
+    teacher_id = Column(Integer, index=True)
+    subject_id = Column(Integer, index=True)
+    class_id = Column(Integer, index=True)
+    sessions = Column(Integer, nullable=False, default=0)
+    records = Column(Integer, nullable=False, default=0)
+    present = Column(Integer, nullable=False, default=0)
+    absent = Column(Integer, nullable=False, default=0)
+
+class StudentAttendanceRollup(Base):
+    """Running attendance of one student in one subject."""
+    __tablename__ = "student_attendance_rollups"
+    id = Column(Integer, primary_key=True)
+    student_id = Column(Integer, nullable=False, index=True)
+    subject_id = Column(Integer)
+    class_id = Column(Integer)
+    records = Column(Integer, nullable=False, default=0)
+    present = Column(Integer, nullable=False, default=0)
+    percentage = Column(Float, nullable=False, index=True)
+    __table_args__ = (
+        Index("ix_student_rollups_subject_pct", "subject_id", "percentage"),
+        Index("ix_student_rollups_class_pct", "class_id", "percentage"),
+    )
+
+# Record every ORM insert/delete of a face encoding (including delete-orphan
+# cascades from Student) in the change feed: mapper events collect the rows
+# and they are written in one statement per flush, in the same transaction.
+def _collect_change(op):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        session.info.setdefault("encoding_changes", []).append(
+            {"encoding_id": target.id, "student_id": target.student_id, "op": op})
+    return listener
+
+event.listen(FaceEncoding, "after_insert", _collect_change("add"))
+event.listen(FaceEncoding, "after_delete", _collect_change("remove"))
+
+@event.listens_for(Session, "after_flush")
+def _write_encoding_changes(session, flush_context):
+    rows = session.info.pop("encoding_changes", None)
+    if rows:
+        session.connection().execute(FaceEncodingChange.__table__.insert(), rows)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_encoding_changes(session):
+    session.info.pop("encoding_changes", None)
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 from typing import Optional, List
 from app.database import get_db
@@ -8,8 +9,19 @@ from app.models.models import (
     Student, StudentSubject, FaceEncoding
 )
 from app.utils.auth import hash_password, verify_password, require_admin, create_access_token
-from app.ai.face_service import encode_student_image
-import random, string, os, json, shutil, tempfile, zipfile
+from app.utils.export import attendance_export_response
+from app.utils.responses import FastJSONResponse
+from app.utils.images import make_thumbnails, thumbnail_urls
+from app.utils.schedule_import import read_schedule_file, parse_schedule_frame, insert_schedules
+from app.utils import schedule_cache, rollups
+from app.utils.analytics import check_threshold
+from app.utils.admission import admit, status as admission_status
+from app.ai.face_service import encode_student_image, encode_student_images, select_inliers
+from app.ai.gallery import get_gallery
+from app.ai.duplicates import FACE_DUPLICATE_DISTANCE, flag_new_encodings, duplicate_pairs, cluster_pairs
+from collections import defaultdict
+from datetime import datetime
+import random, string, os, re, io, json, posixpath, tempfile, zipfile
 import pandas as pd
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -54,6 +66,59 @@ def get_or_create_class(db: Session, name: str, section: str = None):
         db.flush()
     return cls
 
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+IMAGE_DIR_NAMES = ('images', 'photos', 'imgs')
+ROSTER_EXTS = ('.csv', '.xlsx', '.xls')
+
+def _depth_order(name: str):
+    return name.count('/'), name
+
+def find_roster_member(names: list) -> Optional[str]:
+    """The shallowest CSV/Excel member of an archive (skipping Office lock files)."""
+    return min((n for n in names
+                if n.lower().endswith(ROSTER_EXTS) and not posixpath.basename(n).startswith('~')),
+               key=_depth_order, default=None)
+
+def find_images_dir(names: list) -> Optional[str]:
+    """The shallowest images/photos/imgs directory among the archive members' parents."""
+    dirs = set()
+    for name in names:
+        parts = name.split('/')[:-1]
+        dirs.update('/'.join(parts[:i + 1]) for i in range(len(parts)))
+    return min((d for d in dirs if posixpath.basename(d).lower() in IMAGE_DIR_NAMES),
+               key=_depth_order, default=None)
+
+def index_student_images(names: list, images_dir: str, roll_numbers) -> dict:
+    """
+    Map roll numbers to the archive members holding their photos. Accepts
+    `STU001.jpg`, numbered extras like `STU001_2.jpg`, and per-student folders
+    like `STU001/front.jpg` under `images_dir`. The plain `STU001.jpg` photo,
+    if any, is listed first. `STU001_2.jpg` counts as an extra for STU001
+    only when STU001_2 is not itself one of `roll_numbers`.
+    """
+    index = {}
+    for name in sorted(names):
+        parent, filename = posixpath.split(name)
+        stem, ext = posixpath.splitext(filename)
+        if ext.lower() not in IMAGE_EXTS or not (parent + '/').startswith(images_dir + '/'):
+            continue
+        if parent != images_dir:
+            key = posixpath.basename(parent)
+        else:
+            key = stem
+            numbered = re.match(r'^(.+)_\d+$', stem)
+            if numbered and stem not in roll_numbers and numbered.group(1) in roll_numbers:
+                key = numbered.group(1)
+        index.setdefault(key, []).append(name)
+    for key, members in index.items():
+        members.sort(key=lambda n: posixpath.splitext(posixpath.basename(n))[0] != key)
+    return index
+
+def read_roster(source, filename: str) -> pd.DataFrame:
+    if filename.lower().endswith('.csv'):
+        return pd.read_csv(source)
+    return pd.read_excel(source)
+
 # ─── Teacher Management ─────────────────────────────────────────────────────
 
 class AddTeacherRequest(BaseModel):
@@ -126,11 +191,12 @@ def delete_teacher(teacher_id: int, db: Session = Depends(get_db), _=Depends(req
     if user_id:
         db.query(User).filter(User.id == user_id).delete()
     db.commit()
+    schedule_cache.invalidate([teacher_id])
     return {"message": "Teacher deleted"}
 
 # ─── Schedule Management ────────────────────────────────────────────────────
 
-@router.post("/teachers/{teacher_id}/schedule")
+@router.post("/teachers/{teacher_id}/schedule", dependencies=[Depends(admit("import"))])
 async def upload_schedule(teacher_id: int, file: UploadFile = File(...),
                           db: Session = Depends(get_db), _=Depends(require_admin)):
     teacher = db.query(Teacher).filter(Teacher.id == teacher_id).first()
@@ -145,104 +211,71 @@ async def upload_schedule(teacher_id: int, file: UploadFile = File(...),
         tmp_path = tmp.name
 
     try:
-        # Parse file
-        if suffix in ['.xlsx', '.xls']:
-            df = pd.read_excel(tmp_path)
-        elif suffix == '.csv':
-            df = pd.read_csv(tmp_path)
-        elif suffix == '.pdf':
-            # Use PyMuPDF to extract tables from PDF
-            import fitz
-            doc = fitz.open(tmp_path)
-            all_text = ""
-            for page in doc:
-                all_text += page.get_text()
-            doc.close()
-            # Try to parse as CSV-like text
-            import io
-            lines = [l.strip() for l in all_text.strip().split('\n') if l.strip()]
-            if len(lines) < 2:
-                raise HTTPException(status_code=400, detail="Could not parse PDF schedule")
-            # Try tab or comma separated
-            header = lines[0]
-            sep = '\t' if '\t' in header else ','
-            csv_text = '\n'.join(lines)
-            df = pd.read_csv(io.StringIO(csv_text), sep=sep)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file format. Use Excel, CSV, or PDF.")
-
-        # Normalize column names
-        df.columns = [c.strip().lower().replace(' ', '_') for c in df.columns]
-
-        # Expected columns: day, time (or time_start/time_end), subject, class (or class/section)
-        required = {'day', 'subject'}
-        if not required.issubset(set(df.columns)):
-            raise HTTPException(
-                status_code=400,
-                detail=f"File must contain columns: day, subject. Found: {list(df.columns)}"
-            )
+        parsed = parse_schedule_frame(read_schedule_file(tmp_path, suffix))
 
-        # Delete old schedule for this teacher
+        # Replace the old schedule for this teacher
         db.query(Schedule).filter(Schedule.teacher_id == teacher_id).delete()
+        insert_schedules(db, parsed, pd.Series(teacher_id, index=parsed.index))
 
-        for _, row in df.iterrows():
-            day = str(row.get('day', '')).strip()
-            subject_name = str(row.get('subject', '')).strip()
-            class_name = str(row.get('class', row.get('class_section', row.get('section', '')))).strip()
-            if class_name == 'nan':
-                class_name = ''
-
-            # Parse time
-            time_str = str(row.get('time', row.get('time_start', ''))).strip()
-            time_end_str = str(row.get('time_end', '')).strip()
-
-            from datetime import time as dt_time
-            time_start = None
-            time_end = None
-            if time_str and time_str != 'nan':
-                # Handle formats like "9:00-10:00" or "09:00"
-                if '-' in time_str:
-                    parts = time_str.split('-')
-                    time_str = parts[0].strip()
-                    time_end_str = parts[1].strip()
-                try:
-                    h, m = time_str.replace(' ', '').split(':')
-                    time_start = dt_time(int(h), int(m))
-                except Exception:
-                    pass
-            if time_end_str and time_end_str != 'nan':
-                try:
-                    h, m = time_end_str.replace(' ', '').split(':')
-                    time_end = dt_time(int(h), int(m))
-                except Exception:
-                    pass
-
-            if not day or not subject_name or day == 'nan' or subject_name == 'nan':
-                continue
+        db.commit()
+        schedule_cache.invalidate([teacher_id])
+        return {"message": "Schedule uploaded successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error parsing file: {str(e)}")
+    finally:
+        os.unlink(tmp_path)
 
-            subject = get_or_create_subject(db, subject_name)
-            class_section = None
-            if class_name:
-                # Parse "10-A" or "10 A" or "Class 10"
-                sec = None
-                if '-' in class_name:
-                    parts = class_name.split('-')
-                    class_name = parts[0].strip()
-                    sec = parts[1].strip() if len(parts) > 1 else None
-                class_section = get_or_create_class(db, class_name, sec)
-
-            schedule = Schedule(
-                teacher_id=teacher_id,
-                subject_id=subject.id if subject else None,
-                class_id=class_section.id if class_section else None,
-                day=day,
-                time_start=time_start,
-                time_end=time_end
-            )
-            db.add(schedule)
+@router.post("/schedules/upload", dependencies=[Depends(admit("import"))])
+async def upload_schedules_bulk(file: UploadFile = File(...),
+                                db: Session = Depends(get_db), _=Depends(require_admin)):
+    """
+    Import timetables for many teachers from one file. Same columns as the
+    per-teacher upload plus a `teacher` column holding the teacher's name or
+    login username. Every teacher present in the file has their schedule replaced.
+    """
+    suffix = os.path.splitext(file.filename)[1].lower()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        content = await file.read()
+        tmp.write(content)
+        tmp_path = tmp.name
 
+    try:
+        parsed = parse_schedule_frame(read_schedule_file(tmp_path, suffix))
+        if 'teacher' not in parsed.columns:
+            raise HTTPException(status_code=400, detail="File must contain a 'teacher' column")
+
+        # Resolve teacher names/usernames in one query
+        keys = {k for k in parsed['teacher'].unique() if k}
+        lookup = {}
+        for t, username in (
+            db.query(Teacher, User.username)
+            .outerjoin(User, Teacher.user_id == User.id)
+            .filter((Teacher.name.in_(keys)) | (User.username.in_(keys)))
+            .all()
+        ):
+            lookup.setdefault(t.name, t.id)
+            if username:
+                lookup[username] = t.id
+        teacher_ids = parsed['teacher'].map(lookup)
+        unknown = sorted(set(parsed.loc[teacher_ids.isna(), 'teacher']))
+        matched = teacher_ids.notna()
+        parsed, teacher_ids = parsed[matched], teacher_ids[matched].astype(int)
+
+        imported = sorted(set(teacher_ids))
+        if imported:
+            db.query(Schedule).filter(Schedule.teacher_id.in_(imported)).delete(synchronize_session=False)
+        inserted = insert_schedules(db, parsed, teacher_ids)
         db.commit()
-        return {"message": "Schedule uploaded successfully"}
+        schedule_cache.invalidate(imported)
+
+        return {
+            "message": f"Imported {inserted} schedule entries for {len(imported)} teachers",
+            "entries": inserted,
+            "teachers": {int(tid): int(n) for tid, n in teacher_ids.value_counts().items()},
+            "unknown_teachers": [u or "(blank)" for u in unknown]
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -274,9 +307,10 @@ def get_teacher_schedule(teacher_id: int, db: Session = Depends(get_db), _=Depen
 
 # ─── Student Management ─────────────────────────────────────────────────────
 
-@router.post("/students/upload")
+@router.post("/students/upload", dependencies=[Depends(admit("import"))])
 async def upload_students(
     file: UploadFile = File(...),
+    duplicate_distance: Optional[float] = Form(None),
     db: Session = Depends(get_db),
     _=Depends(require_admin)
 ):
@@ -284,43 +318,35 @@ async def upload_students(
     Upload a ZIP file containing:
     - students.csv (or .xlsx) with columns: name, roll_number, class, section (optional), subjects
     - images/ folder with images named by roll_number (e.g., STU001.jpg)
+
+    New students whose face is within `duplicate_distance` of another
+    student's are listed in `possible_duplicates`; they are still imported.
     """
+    if duplicate_distance is not None and not 0 < duplicate_distance <= 1:
+        raise HTTPException(status_code=400, detail="duplicate_distance must be between 0 and 1")
     suffix = os.path.splitext(file.filename)[1].lower()
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
-
+    zf = None
     try:
-        extract_dir = tempfile.mkdtemp()
         added = 0
         errors = []
+        new_encodings = []
+        new_encoding_students = []
 
         if suffix == '.zip':
-            with zipfile.ZipFile(tmp_path, 'r') as zf:
-                zf.extractall(extract_dir)
+            # Members are read in place through the archive index; nothing is
+            # extracted, and photos are written to uploads/students only once
+            zf = zipfile.ZipFile(file.file)
+            names = [n for n in zf.namelist() if not n.endswith('/') and not n.startswith('__MACOSX/')]
+            data_name = find_roster_member(names)
         else:
             # If just a CSV/Excel is uploaded (no images)
-            shutil.copy(tmp_path, os.path.join(extract_dir, file.filename))
-
-        # Find the CSV/Excel file
-        data_file = None
-        for root, dirs, files in os.walk(extract_dir):
-            for f in files:
-                if f.lower().endswith(('.csv', '.xlsx', '.xls')) and not f.startswith('~'):
-                    data_file = os.path.join(root, f)
-                    break
-            if data_file:
-                break
+            names = []
+            data_name = file.filename if suffix in ROSTER_EXTS else None
 
-        if not data_file:
+        if not data_name:
             raise HTTPException(status_code=400, detail="No CSV or Excel file found in upload")
 
-        if data_file.endswith('.csv'):
-            df = pd.read_csv(data_file)
-        else:
-            df = pd.read_excel(data_file)
-
+        df = read_roster(io.BytesIO(zf.read(data_name)) if zf else file.file, data_name)
         df.columns = [c.strip().lower().replace(' ', '_') for c in df.columns]
 
         if 'name' not in df.columns or 'roll_number' not in df.columns:
@@ -329,15 +355,12 @@ async def upload_students(
                 detail=f"File must contain 'name' and 'roll_number' columns. Found: {list(df.columns)}"
             )
 
-        # Find images directory
-        images_dir = None
-        for root, dirs, files in os.walk(extract_dir):
-            for d in dirs:
-                if d.lower() in ['images', 'photos', 'imgs']:
-                    images_dir = os.path.join(root, d)
-                    break
-            if images_dir:
-                break
+        images_dir = find_images_dir(names)
+        roll_numbers = {str(roll).strip() for roll in df['roll_number']}
+        image_index = index_student_images(names, images_dir, roll_numbers) if images_dir else {}
+        # Snapshot of the gallery before this import, for the duplicate check
+        gallery = get_gallery(db) if image_index else None
+        imported = {}
 
         student_upload_dir = os.path.join(UPLOAD_DIR, "students")
         os.makedirs(student_upload_dir, exist_ok=True)
@@ -366,25 +389,22 @@ async def upload_students(
             if class_name:
                 class_section = get_or_create_class(db, class_name, section if section else None)
 
-            # Find and save image
-            image_path = None
-            if images_dir:
-                for ext in ['.jpg', '.jpeg', '.png', '.bmp']:
-                    candidate = os.path.join(images_dir, f"{roll}{ext}")
-                    if os.path.exists(candidate):
-                        dest = os.path.join(student_upload_dir, f"{roll}{ext}")
-                        shutil.copy(candidate, dest)
-                        image_path = f"uploads/students/{roll}{ext}"
-                        break
+            # Read the photos into memory; only the accepted ones are written to uploads
+            photos = []
+            for i, member in enumerate(image_index.get(roll, [])):
+                ext = os.path.splitext(member)[1].lower()
+                photo = io.BytesIO(zf.read(member))
+                photo.name = f"{roll}{ext}" if i == 0 else f"{roll}_{i + 1}{ext}"
+                photos.append(photo)
 
             student = Student(
                 name=name,
                 roll_number=roll,
-                image_path=image_path,
                 class_id=class_section.id if class_section else None
             )
             db.add(student)
             db.flush()
+            imported[student.id] = student
 
             # Handle subjects
             subjects_str = str(row.get('subjects', '')).strip()
@@ -395,76 +415,251 @@ async def upload_students(
                         ss = StudentSubject(student_id=student.id, subject_id=subj.id)
                         db.add(ss)
 
-            # Generate face encoding if image exists
-            if image_path:
-                full_path = os.path.join(
-                    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                    image_path
-                )
+            # Generate face encodings for every usable photo
+            accepted = []
+            if photos:
                 try:
-                    encoding = encode_student_image(full_path)
-                    if encoding:
+                    encodings, rejected = encode_student_images(photos)
+                    for encoding in encodings:
                         fe = FaceEncoding(
                             student_id=student.id,
                             encoding=json.dumps(encoding)
                         )
                         db.add(fe)
+                        new_encodings.append(encoding)
+                        new_encoding_students.append(student.id)
+                    for photo in rejected:
+                        errors.append(f"Photo {photo.name} for {roll} rejected: no face or outlier")
+                    accepted = [photo for photo in photos if photo not in rejected]
                 except Exception as e:
                     errors.append(f"Face encoding failed for {roll}: {str(e)}")
+                    # Nothing was judged, so keep the profile photo for a later re-enroll
+                    accepted = photos[:1]
+
+            # Save the accepted photos (the first one is the profile photo)
+            for i, photo in enumerate(accepted):
+                with open(os.path.join(student_upload_dir, photo.name), 'wb') as out:
+                    out.write(photo.getvalue())
+                if i == 0:
+                    student.image_path = f"uploads/students/{photo.name}"
+                    try:
+                        make_thumbnails(io.BytesIO(photo.getvalue()), roll)
+                    except Exception as e:
+                        errors.append(f"Thumbnail generation failed for {roll}: {str(e)}")
 
             added += 1
 
+        possible_duplicates = []
+        if new_encodings:
+            flags = flag_new_encodings(new_encodings, new_encoding_students, gallery,
+                                       FACE_DUPLICATE_DISTANCE if duplicate_distance is None else duplicate_distance)
+            others = {s.id: s for s in db.query(Student).filter(
+                Student.id.in_({other for other, _ in flags.values()})).all()} if flags else {}
+            for student_id, (other_id, distance) in flags.items():
+                student, other = imported[student_id], others.get(other_id)
+                possible_duplicates.append({
+                    "roll_number": student.roll_number,
+                    "name": student.name,
+                    "matched_roll_number": other.roll_number if other else None,
+                    "matched_name": other.name if other else None,
+                    "distance": round(distance, 4)
+                })
+
         db.commit()
-        shutil.rmtree(extract_dir, ignore_errors=True)
         return {
             "message": f"Successfully added {added} students",
             "added": added,
-            "errors": errors
+            "errors": errors,
+            "possible_duplicates": possible_duplicates
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing upload: {str(e)}")
     finally:
-        os.unlink(tmp_path)
+        if zf:
+            zf.close()
+
+@router.post("/students/{student_id}/photos", dependencies=[Depends(admit("import"))])
+async def add_student_photos(student_id: int, files: List[UploadFile] = File(...),
+                             db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Enroll additional photos for an existing student."""
+    student = db.query(Student).filter(Student.id == student_id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    student_upload_dir = os.path.join(UPLOAD_DIR, "students")
+    os.makedirs(student_upload_dir, exist_ok=True)
+    existing = [json.loads(fe.encoding) for fe in student.face_encodings]
+
+    candidates = []
+    errors = []
+    photo_no = 1
+    for upload in files:
+        ext = os.path.splitext(upload.filename)[1].lower()
+        if ext not in IMAGE_EXTS:
+            errors.append(f"{upload.filename}: unsupported image type")
+            continue
+        while True:
+            photo_no += 1
+            filename = f"{student.roll_number}_{photo_no}{ext}"
+            dest = os.path.join(student_upload_dir, filename)
+            if not os.path.exists(dest):
+                break
+        with open(dest, "wb") as f:
+            f.write(await upload.read())
+        encoding = encode_student_image(dest)
+        if encoding is None:
+            errors.append(f"{upload.filename}: no face found")
+            os.unlink(dest)
+            continue
+        candidates.append((upload.filename, dest, filename, encoding))
+
+    inliers = set(select_inliers([c[3] for c in candidates], existing))
+    new_encodings = []
+    for i, (original, dest, filename, encoding) in enumerate(candidates):
+        if i not in inliers:
+            errors.append(f"{original}: does not match the student's other photos")
+            os.unlink(dest)
+            continue
+        db.add(FaceEncoding(student_id=student.id, encoding=json.dumps(encoding)))
+        new_encodings.append(encoding)
+        if not student.image_path:
+            student.image_path = f"uploads/students/{filename}"
+            make_thumbnails(dest, student.roll_number)
+
+    db.commit()
+    return {
+        "message": f"Added {len(new_encodings)} photos",
+        "added": len(new_encodings),
+        "total_encodings": len(existing) + len(new_encodings),
+        "errors": errors
+    }
+
+@router.delete("/students/{student_id}/encodings")
+def reset_student_encodings(student_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Remove a student's face encodings so they can be re-enrolled from new photos."""
+    student = db.query(Student).filter(Student.id == student_id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    removed = len(student.face_encodings)
+    student.face_encodings.clear()
+    db.commit()
+    return {"message": f"Removed {removed} face encodings", "removed": removed}
+
+@router.get("/students/duplicates", dependencies=[Depends(admit("analytics"))])
+def get_duplicate_clusters(max_distance: Optional[float] = None,
+                           db: Session = Depends(get_db), _=Depends(require_admin)):
+    """
+    Groups of students whose stored face encodings lie within `max_distance`
+    of each other: duplicate enrollments, twins, or mislabelled photos.
+    """
+    max_distance = FACE_DUPLICATE_DISTANCE if max_distance is None else max_distance
+    if not 0 < max_distance <= 1:
+        raise HTTPException(status_code=400, detail="max_distance must be between 0 and 1")
+    gallery = get_gallery(db)
+    clusters = cluster_pairs(duplicate_pairs(gallery.encodings, gallery.student_ids, max_distance))
+
+    students = {s.id: s for s in db.query(Student).filter(
+        Student.id.in_({sid for c in clusters for sid in c["student_ids"]})).all()} if clusters else {}
+
+    def describe(student_id):
+        s = students.get(student_id)
+        return {"id": student_id, "name": s.name if s else None, "roll_number": s.roll_number if s else None}
+
+    return FastJSONResponse({
+        "max_distance": max_distance,
+        "encodings": len(gallery),
+        "clusters": [
+            {
+                "students": [describe(sid) for sid in c["student_ids"]],
+                "pairs": [{"student_id": a, "other_student_id": b, "distance": round(d, 4)}
+                          for a, b, d in c["pairs"]],
+                "min_distance": round(c["min_distance"], 4)
+            }
+            for c in clusters
+        ]
+    })
 
 @router.get("/students")
 def get_students(subject_id: Optional[int] = None, db: Session = Depends(get_db),
                  _=Depends(require_admin)):
-    query = db.query(Student)
+    # Fixed number of queries however many students: subjects and encoding
+    # counts are fetched for the whole page and grouped here
+    query = db.query(Student).options(joinedload(Student.class_section))
     if subject_id:
-        student_ids = [ss.student_id for ss in
-                       db.query(StudentSubject).filter(StudentSubject.subject_id == subject_id).all()]
-        query = query.filter(Student.id.in_(student_ids))
-
+        query = query.filter(Student.id.in_(
+            select(StudentSubject.student_id).where(StudentSubject.subject_id == subject_id)))
     students = query.all()
+    selected = query.with_entities(Student.id).subquery()
+
+    subjects = defaultdict(list)
+    for student_id, subj_id, name in db.query(StudentSubject.student_id, Subject.id, Subject.name).join(
+            Subject, Subject.id == StudentSubject.subject_id).filter(
+            StudentSubject.student_id.in_(select(selected.c.id))).order_by(StudentSubject.id):
+        subjects[student_id].append({"id": subj_id, "name": name})
+    encoding_counts = dict(db.query(FaceEncoding.student_id, func.count(FaceEncoding.id)).filter(
+        FaceEncoding.student_id.in_(select(selected.c.id))).group_by(FaceEncoding.student_id).all())
+
     result = []
     for s in students:
-        # Get subjects
-        ss_records = db.query(StudentSubject).filter(StudentSubject.student_id == s.id).all()
-        subjects = []
-        for ss in ss_records:
-            subj = db.query(Subject).filter(Subject.id == ss.subject_id).first()
-            if subj:
-                subjects.append({"id": subj.id, "name": subj.name})
-
+        encoding_count = encoding_counts.get(s.id, 0)
         result.append({
             "id": s.id,
             "name": s.name,
             "roll_number": s.roll_number,
             "image_path": s.image_path,
+            "thumbnails": thumbnail_urls(s.roll_number) if s.image_path else None,
             "class_name": s.class_section.name if s.class_section else "",
             "section": s.class_section.section if s.class_section else "",
-            "subjects": subjects,
-            "has_encoding": len(s.face_encodings) > 0
+            "subjects": subjects[s.id],
+            "has_encoding": encoding_count > 0,
+            "encoding_count": encoding_count
         })
-    return result
+    return FastJSONResponse(result)
+
+@router.post("/students/thumbnails")
+def rebuild_thumbnails(missing_only: bool = True, db: Session = Depends(get_db),
+                       _=Depends(require_admin)):
+    """Generate thumbnails for students imported before thumbnails existed."""
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    generated = 0
+    errors = []
+    for roll, image_path in db.query(Student.roll_number, Student.image_path).filter(
+            Student.image_path.isnot(None)).all():
+        if missing_only and thumbnail_urls(roll):
+            continue
+        try:
+            make_thumbnails(os.path.join(base_dir, image_path), roll)
+            generated += 1
+        except Exception as e:
+            errors.append(f"{roll}: {str(e)}")
+    return {"message": f"Generated thumbnails for {generated} students", "generated": generated, "errors": errors}
 
 @router.get("/subjects")
 def get_subjects(db: Session = Depends(get_db), _=Depends(require_admin)):
     subjects = db.query(Subject).all()
     return [{"id": s.id, "name": s.name, "code": s.code} for s in subjects]
 
+# ─── Attendance Export ──────────────────────────────────────────────────────
+
+@router.get("/attendance/export")
+def export_attendance(
+    format: str = "csv",
+    teacher_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    _=Depends(require_admin)
+):
+    """Stream school-wide attendance records as CSV or XLSX."""
+    return attendance_export_response(
+        format, "attendance_all",
+        teacher_id=teacher_id, subject_id=subject_id, class_id=class_id,
+        date_from=date_from, date_to=date_to
+    )
+
 # ─── Admin Credentials ──────────────────────────────────────────────────────
 
 class ChangeCredentialsRequest(BaseModel):
@@ -528,4 +723,102 @@ def dashboard_stats(db: Session = Depends(get_db), _=Depends(require_admin)):
         "total_classes": db.query(ClassSection).count(),
         "total_attendance_sessions": total_attendance,
         "attendance_trend": trend
-    }
\ No newline at end of file
+    }
+
+# ─── School Analytics ───────────────────────────────────────────────────────
+# Served from the rollup tables (app/utils/rollups.py), never the raw records.
+
+def parse_date(value: Optional[str], field: str):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field} must be YYYY-MM-DD")
+
+def check_per(per: str) -> str:
+    if per not in ("subject", "student"):
+        raise HTTPException(status_code=400, detail="per must be 'subject' or 'student'")
+    return per
+
+@router.get("/analytics/summary", dependencies=[Depends(admit("analytics"))])
+def analytics_summary(group_by: str = "subject", date_from: Optional[str] = None,
+                      date_to: Optional[str] = None,
+                      db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Attendance totals and rates per class, subject, teacher or week."""
+    if group_by not in rollups.DIMENSIONS:
+        raise HTTPException(status_code=400,
+                            detail=f"group_by must be one of: {', '.join(rollups.DIMENSIONS)}")
+    rows = rollups.summary(db, group_by, parse_date(date_from, "date_from"), parse_date(date_to, "date_to"))
+
+    if group_by == "week":
+        rows = [{"week_start": str(row.pop("key")), **row} for row in rows]
+    else:
+        if group_by == "class":
+            names = {c.id: f"{c.name} {c.section or ''}".strip() for c in db.query(ClassSection).all()}
+        elif group_by == "subject":
+            names = {s.id: s.name for s in db.query(Subject).all()}
+        else:
+            names = {t.id: t.name for t in db.query(Teacher).all()}
+        rows = [{f"{group_by}_id": row["key"], "name": names.get(row.pop("key"), "Unknown"), **row}
+                for row in rows]
+    return FastJSONResponse({"group_by": group_by, "rows": rows})
+
+@router.get("/analytics/distribution", dependencies=[Depends(admit("analytics"))])
+def analytics_distribution(per: str = "subject", subject_id: Optional[int] = None,
+                           class_id: Optional[int] = None, threshold: Optional[float] = None,
+                           percentiles: str = "10,25,50,75,90",
+                           db: Session = Depends(get_db), _=Depends(require_admin)):
+    """School-wide percentiles of student attendance and how many fall below the threshold."""
+    try:
+        points = [float(p) for p in percentiles.split(",") if p.strip()]
+    except ValueError:
+        points = None
+    if not points or not all(0 <= p <= 100 for p in points):
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers from 0 to 100")
+    scope = rollups.student_scope(check_per(per), subject_id, class_id)
+    return rollups.distribution(db, scope, check_threshold(threshold), points)
+
+@router.get("/analytics/low-attendance", dependencies=[Depends(admit("analytics"))])
+def analytics_low_attendance(per: str = "subject", subject_id: Optional[int] = None,
+                             class_id: Optional[int] = None, threshold: Optional[float] = None,
+                             limit: int = 100, offset: int = 0,
+                             db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Students below the threshold across every teacher, lowest attendance first."""
+    threshold = check_threshold(threshold)
+    limit = max(1, min(limit, 1000))
+    scope = rollups.student_scope(check_per(per), subject_id, class_id)
+    total, rows = rollups.below_threshold(db, scope, threshold, limit, max(offset, 0))
+
+    subjects = {s.id: s.name for s in db.query(Subject).all()}
+    classes = {c.id: f"{c.name} {c.section or ''}".strip() for c in db.query(ClassSection).all()}
+    return FastJSONResponse({
+        "threshold": threshold,
+        "total": total,
+        "students": [
+            {
+                "student_id": row["student_id"],
+                "student_name": row["name"],
+                "roll_number": row["roll_number"],
+                "class": classes.get(row["class_id"], ""),
+                "subject_id": row["subject_id"],
+                "subject": subjects.get(row["subject_id"], "") if row["subject_id"] else None,
+                "present": int(row["present"]),
+                "total": int(row["records"]),
+                "attendance_percentage": round(row["percentage"], 1),
+            }
+            for row in rows
+        ]
+    })
+
+@router.post("/analytics/rebuild", dependencies=[Depends(admit("import"))])
+def rebuild_analytics(db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Recompute the rollups from the full attendance history."""
+    return {"message": "Analytics rebuilt", **rollups.rebuild(db)}
+
+# ─── Admission Control ──────────────────────────────────────────────────────
+
+@router.get("/admission")
+def get_admission_status(_=Depends(require_admin)):
+    """Slots in use and queue depth per route class, for this worker."""
+    return admission_status()
@@ -1,17 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Request, Header, Response
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from pydantic import BaseModel
 from typing import Optional, List
-from app.database import get_db
+from app.database import get_db, get_async_db, SessionLocal
 from app.models.models import (
     Teacher, User, Subject, ClassSection, Schedule,
     Student, StudentSubject, FaceEncoding,
     Attendance, AttendanceRecord
 )
 from app.utils.auth import require_teacher
-from app.ai.face_service import process_video
+from app.utils.export import attendance_export_response
+from app.utils import video_store, chunked_upload, rollups
+from app.utils.admission import admit, run_admitted
+from app.utils.responses import FastJSONResponse
+from app.utils.metrics import detached
+from app.utils.schedule_cache import get_schedule_view
+from app.utils.analytics import check_threshold, attendance_heatmap
+from app.ai.result_cache import cached_process_video
+from app.ai import stream_service
 from datetime import date, time as dt_time, datetime
-import os, tempfile, json
+import os, tempfile, json, hashlib, asyncio
 
 router = APIRouter(prefix="/teacher", tags=["Teacher"])
 
@@ -25,32 +37,45 @@ def get_teacher_from_token(current_user: dict, db: Session):
         raise HTTPException(status_code=404, detail="Teacher profile not found")
     return teacher
 
+async def get_teacher_async(current_user: dict, db: AsyncSession):
+    """Async variant of get_teacher_from_token for routes on the async session."""
+    user_id = int(current_user["sub"])
+    teacher = await db.scalar(select(Teacher).where(Teacher.user_id == user_id))
+    if not teacher:
+        raise HTTPException(status_code=404, detail="Teacher profile not found")
+    return teacher
+
+def class_label(entry: dict) -> str:
+    return f"{entry['class_name']} {entry['section'] or ''}".strip()
+
 # ─── Dashboard ──────────────────────────────────────────────────────────────
 
 @router.get("/dashboard")
-def teacher_dashboard(db: Session = Depends(get_db), current_user: dict = Depends(require_teacher)):
-    teacher = get_teacher_from_token(current_user, db)
-    schedules = db.query(Schedule).filter(Schedule.teacher_id == teacher.id).all()
+async def teacher_dashboard(db: AsyncSession = Depends(get_async_db),
+                            current_user: dict = Depends(require_teacher)):
+    teacher = await get_teacher_async(current_user, db)
+    schedules = await get_schedule_view(db, teacher.id)
 
-    subjects = list({s.subject.name for s in schedules if s.subject})
-    classes = list({f"{s.class_section.name} {s.class_section.section or ''}".strip()
-                    for s in schedules if s.class_section})
+    subjects = list({s["subject"] for s in schedules if s["subject"]})
+    classes = list({class_label(s) for s in schedules if s["class_name"]})
 
     # Today's schedule
     day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
     today = day_names[date.today().weekday()]
     today_schedule = []
     for s in schedules:
-        if s.day == today:
+        if s["day"] == today:
             today_schedule.append({
-                "subject": s.subject.name if s.subject else "",
-                "class_name": f"{s.class_section.name} {s.class_section.section or ''}".strip() if s.class_section else "",
-                "time_start": str(s.time_start) if s.time_start else "",
-                "time_end": str(s.time_end) if s.time_end else "",
+                "subject": s["subject"],
+                "class_name": class_label(s),
+                "time_start": s["time_start"] or "",
+                "time_end": s["time_end"] or "",
             })
 
     # Total lectures taken
-    total_lectures = db.query(Attendance).filter(Attendance.teacher_id == teacher.id).count()
+    total_lectures = await db.scalar(
+        select(func.count()).select_from(Attendance).where(Attendance.teacher_id == teacher.id)
+    )
 
     return {
         "name": teacher.name,
@@ -64,44 +89,30 @@ def teacher_dashboard(db: Session = Depends(get_db), current_user: dict = Depend
 # ─── Schedule ───────────────────────────────────────────────────────────────
 
 @router.get("/schedule")
-def get_schedule(db: Session = Depends(get_db), current_user: dict = Depends(require_teacher)):
-    teacher = get_teacher_from_token(current_user, db)
-    schedules = db.query(Schedule).filter(Schedule.teacher_id == teacher.id).all()
-
-    result = []
-    for s in schedules:
-        result.append({
-            "id": s.id,
-            "day": s.day,
-            "time_start": str(s.time_start) if s.time_start else None,
-            "time_end": str(s.time_end) if s.time_end else None,
-            "subject": s.subject.name if s.subject else "",
-            "subject_id": s.subject_id,
-            "class_name": s.class_section.name if s.class_section else "",
-            "section": s.class_section.section if s.class_section else "",
-            "class_id": s.class_id
-        })
-    return result
+async def get_schedule(db: AsyncSession = Depends(get_async_db),
+                       current_user: dict = Depends(require_teacher)):
+    teacher = await get_teacher_async(current_user, db)
+    return await get_schedule_view(db, teacher.id)
 
 # ─── Attendance Filters ─────────────────────────────────────────────────────
 
 @router.get("/attendance/filters")
-def get_attendance_filters(db: Session = Depends(get_db),
-                           current_user: dict = Depends(require_teacher)):
-    teacher = get_teacher_from_token(current_user, db)
-    schedules = db.query(Schedule).filter(Schedule.teacher_id == teacher.id).all()
+async def get_attendance_filters(db: AsyncSession = Depends(get_async_db),
+                                 current_user: dict = Depends(require_teacher)):
+    teacher = await get_teacher_async(current_user, db)
+    schedules = await get_schedule_view(db, teacher.id)
 
     subjects = {}
     classes = {}
     days = set()
 
     for s in schedules:
-        if s.subject:
-            subjects[s.subject_id] = s.subject.name
-        if s.class_section:
-            classes[s.class_id] = f"{s.class_section.name} {s.class_section.section or ''}".strip()
-        if s.day:
-            days.add(s.day)
+        if s["subject"]:
+            subjects[s["subject_id"]] = s["subject"]
+        if s["class_name"]:
+            classes[s["class_id"]] = class_label(s)
+        if s["day"]:
+            days.add(s["day"])
 
     return {
         "subjects": [{"id": k, "name": v} for k, v in subjects.items()],
@@ -140,55 +151,95 @@ def get_students_for_attendance(
 
 # ─── AI Video Upload ────────────────────────────────────────────────────────
 
-@router.post("/attendance/video")
+def build_video_results(db: Session, detected_ids: list, scores: dict,
+                        subject_id: int, class_id: Optional[int]) -> dict:
+    """Turn recognition output into the per-student attendance response."""
+    detected = set(detected_ids)
+
+    # Get all students for this subject
+    ss_records = db.query(StudentSubject).filter(StudentSubject.subject_id == subject_id).all()
+    student_ids = [ss.student_id for ss in ss_records]
+
+    query = db.query(Student).filter(Student.id.in_(student_ids))
+    if class_id:
+        query = query.filter(Student.class_id == class_id)
+
+    students = query.order_by(Student.roll_number).all()
+
+    results = []
+    for s in students:
+        results.append({
+            "student_id": s.id,
+            "name": s.name,
+            "roll_number": s.roll_number,
+            "status": "Present" if s.id in detected else "Absent",
+            "marked_by_ai": s.id in detected,
+            "score": scores.get(s.id)
+        })
+
+    return {
+        "message": f"Detected {len(detected)} students",
+        "total_students": len(students),
+        "detected_count": len([r for r in results if r['status'] == 'Present']),
+        "results": results
+    }
+
+@router.post("/attendance/video", dependencies=[Depends(admit("video"))])
 async def upload_attendance_video(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     subject_id: int = 0,
     class_id: Optional[int] = None,
+    frame_interval: Optional[int] = None,
+    tolerance: Optional[float] = None,
+    min_hits: Optional[int] = None,
+    max_mean_distance: Optional[float] = None,
+    include_timings: bool = False,
     db: Session = Depends(get_db),
     current_user: dict = Depends(require_teacher)
 ):
-    """Upload video for AI face recognition attendance."""
+    """Upload video for AI face recognition attendance.
+
+    The optional sampling and threshold parameters trade accuracy for speed;
+    per-student match scores are returned so borderline cases can be reviewed.
+    When video retention is enabled the response carries a `video_id` that
+    can be reprocessed with different thresholds without re-uploading.
+    `include_timings` adds the per-stage time breakdown of this job.
+    """
     teacher = get_teacher_from_token(current_user, db)
 
     video_dir = os.path.join(UPLOAD_DIR, "videos")
     os.makedirs(video_dir, exist_ok=True)
 
+    # Hash the content while streaming it to disk so repeat uploads hit the cache
     suffix = os.path.splitext(file.filename)[1].lower()
+    hasher = hashlib.sha256()
     with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=video_dir) as tmp:
-        content = await file.read()
-        tmp.write(content)
+        while chunk := await file.read(1024 * 1024):
+            hasher.update(chunk)
+            tmp.write(chunk)
         tmp_path = tmp.name
+    content_hash = hasher.hexdigest()
 
+    timings = {}
     try:
-        detected_ids = process_video(tmp_path, db)
-
-        # Get all students for this subject
-        ss_records = db.query(StudentSubject).filter(StudentSubject.subject_id == subject_id).all()
-        student_ids = [ss.student_id for ss in ss_records]
-
-        query = db.query(Student).filter(Student.id.in_(student_ids))
-        if class_id:
-            query = query.filter(Student.class_id == class_id)
-
-        students = query.order_by(Student.roll_number).all()
-
-        results = []
-        for s in students:
-            results.append({
-                "student_id": s.id,
-                "name": s.name,
-                "roll_number": s.roll_number,
-                "status": "Present" if s.id in detected_ids else "Absent",
-                "marked_by_ai": s.id in detected_ids
-            })
-
-        return {
-            "message": f"Detected {len(detected_ids)} students",
-            "total_students": len(students),
-            "detected_count": len([r for r in results if r['status'] == 'Present']),
-            "results": results
-        }
+        # Recognition is CPU-bound; keep it off the event loop
+        detected_ids, scores, cached = await asyncio.to_thread(
+            cached_process_video, tmp_path, content_hash, db,
+            frame_interval=frame_interval,
+            tolerance=tolerance,
+            min_hits=min_hits,
+            max_mean_distance=max_mean_distance,
+            timings=timings
+        )
+        response = build_video_results(db, detected_ids, scores, subject_id, class_id)
+        response["cached"] = cached
+        if include_timings:
+            response["timings"] = timings
+        response["video_id"] = video_store.retain(tmp_path, teacher.id, file.filename, content_hash)
+        if response["video_id"]:
+            background_tasks.add_task(detached(video_store.evict))
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Video processing error: {str(e)}")
     finally:
@@ -197,6 +248,311 @@ async def upload_attendance_video(
         except Exception:
             pass
 
+@router.post("/attendance/video/{video_id}/reprocess", dependencies=[Depends(admit("video"))])
+def reprocess_attendance_video(
+    video_id: str,
+    subject_id: int = 0,
+    class_id: Optional[int] = None,
+    frame_interval: Optional[int] = None,
+    tolerance: Optional[float] = None,
+    min_hits: Optional[int] = None,
+    max_mean_distance: Optional[float] = None,
+    include_timings: bool = False,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(require_teacher)
+):
+    """Re-run recognition on a retained video with different parameters."""
+    teacher = get_teacher_from_token(current_user, db)
+    video = video_store.get(video_id, teacher.id)
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found or no longer retained")
+
+    timings = {}
+    try:
+        detected_ids, scores, cached = cached_process_video(
+            video["path"], video.get("content_hash"), db,
+            frame_interval=frame_interval,
+            tolerance=tolerance,
+            min_hits=min_hits,
+            max_mean_distance=max_mean_distance,
+            timings=timings
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Video processing error: {str(e)}")
+    response = build_video_results(db, detected_ids, scores, subject_id, class_id)
+    response["cached"] = cached
+    if include_timings:
+        response["timings"] = timings
+    response["video_id"] = video_id
+    return response
+
+@router.delete("/attendance/video/{video_id}")
+def delete_attendance_video(video_id: str, db: Session = Depends(get_db),
+                            current_user: dict = Depends(require_teacher)):
+    teacher = get_teacher_from_token(current_user, db)
+    if not video_store.get(video_id, teacher.id):
+        raise HTTPException(status_code=404, detail="Video not found or no longer retained")
+    video_store.remove(video_id)
+    return {"message": "Video deleted"}
+
+# ─── Resumable Video Upload ─────────────────────────────────────────────────
+
+class InitUploadRequest(BaseModel):
+    filename: str
+    size: int
+    subject_id: int = 0
+    class_id: Optional[int] = None
+    frame_interval: Optional[int] = None
+    tolerance: Optional[float] = None
+    min_hits: Optional[int] = None
+    max_mean_distance: Optional[float] = None
+
+def upload_status(meta: dict, response: Response = None) -> dict:
+    received = chunked_upload.offset(meta["upload_id"]) if meta["status"] == "uploading" else meta["size"]
+    if response is not None:
+        response.headers["Upload-Offset"] = str(received)
+    return {
+        "upload_id": meta["upload_id"],
+        "filename": meta["filename"],
+        "size": meta["size"],
+        "offset": received,
+        "chunk_size": chunked_upload.UPLOAD_CHUNK_SIZE,
+        "status": meta["status"],
+        "error": meta["error"],
+        "result": meta["result"],
+    }
+
+def get_teacher_upload(upload_id: str, current_user: dict, db: Session) -> dict:
+    teacher = get_teacher_from_token(current_user, db)
+    meta = chunked_upload.get(upload_id, teacher.id)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return meta
+
+def offset_conflict(detail: str, received: int):
+    return HTTPException(status_code=409, detail=detail, headers={"Upload-Offset": str(received)})
+
+@router.post("/attendance/uploads")
+def init_video_upload(data: InitUploadRequest, response: Response, db: Session = Depends(get_db),
+                      current_user: dict = Depends(require_teacher)):
+    """Start a resumable upload of a lecture video.
+
+    Send the file as raw bytes with `PUT /attendance/uploads/{upload_id}?offset=N`,
+    in chunks of about `chunk_size`. After a dropped connection, GET the upload
+    to learn the offset to resume from. `POST .../complete` starts recognition;
+    poll the upload until `status` is `done` and read `result`.
+    """
+    teacher = get_teacher_from_token(current_user, db)
+    if data.size <= 0:
+        raise HTTPException(status_code=400, detail="Upload size must be positive")
+    if data.size > chunked_upload.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Video is too large")
+    meta = chunked_upload.create(teacher.id, os.path.basename(data.filename), data.size,
+                                 job=data.model_dump(exclude={"filename", "size"}))
+    return upload_status(meta, response)
+
+@router.put("/attendance/uploads/{upload_id}")
+async def append_video_chunk(upload_id: str, offset: int, request: Request, response: Response,
+                             db: Session = Depends(get_db), current_user: dict = Depends(require_teacher)):
+    """Append the request body at `offset`. Bytes are written as they arrive,
+    so a connection dropped mid-chunk still advances the offset."""
+    meta = get_teacher_upload(upload_id, current_user, db)
+    if meta["status"] != "uploading":
+        raise HTTPException(status_code=409, detail=f"Upload is already {meta['status']}")
+    try:
+        with chunked_upload.appender(upload_id) as f:
+            if f is None:
+                raise offset_conflict("A chunk for this upload is still being received",
+                                      chunked_upload.offset(upload_id))
+            received = os.fstat(f.fileno()).st_size
+            if offset != received:
+                raise offset_conflict(f"Expected offset {received}", received)
+            try:
+                async for chunk in request.stream():
+                    if received + len(chunk) > meta["size"]:
+                        raise HTTPException(status_code=413, detail="Chunk exceeds the declared upload size",
+                                            headers={"Upload-Offset": str(received)})
+                    f.write(chunk)
+                    received += len(chunk)
+            except ClientDisconnect:
+                pass  # keep what arrived; the client resumes from the new offset
+            f.flush()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload_status(meta, response)
+
+@router.get("/attendance/uploads/{upload_id}")
+def get_video_upload(upload_id: str, response: Response, db: Session = Depends(get_db),
+                     current_user: dict = Depends(require_teacher)):
+    """Resume point while uploading; recognition results once `status` is `done`."""
+    return upload_status(get_teacher_upload(upload_id, current_user, db), response)
+
+async def process_staged_upload(upload_id: str, user_id):
+    """Background job run on completion; waits for a video admission slot."""
+    await run_admitted("video", user_id, recognise_staged_upload, upload_id)
+
+def recognise_staged_upload(upload_id: str):
+    """Hash the staged file, recognise and store the same response
+    `/attendance/video` returns."""
+    meta = chunked_upload.get(upload_id)
+    job = meta["job"]
+    path = chunked_upload.data_path(upload_id)
+    db = SessionLocal()
+    try:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
+        content_hash = hasher.hexdigest()
+        detected_ids, scores, cached = cached_process_video(
+            path, content_hash, db,
+            frame_interval=job["frame_interval"],
+            tolerance=job["tolerance"],
+            min_hits=job["min_hits"],
+            max_mean_distance=job["max_mean_distance"]
+        )
+        result = build_video_results(db, detected_ids, scores, job["subject_id"], job["class_id"])
+        result["cached"] = cached
+        result["video_id"] = video_store.retain(path, meta["teacher_id"], meta["filename"], content_hash)
+        chunked_upload.update(upload_id, status="done", result=result)
+        if result["video_id"]:
+            video_store.evict()
+    except Exception as e:
+        chunked_upload.update(upload_id, status="failed", error=f"Video processing error: {str(e)}")
+    finally:
+        db.close()
+        chunked_upload.remove_data(upload_id)
+
+@router.post("/attendance/uploads/{upload_id}/complete", status_code=202)
+def complete_video_upload(upload_id: str, background_tasks: BackgroundTasks, response: Response,
+                          db: Session = Depends(get_db), current_user: dict = Depends(require_teacher)):
+    """Start recognition once every byte has arrived. Safe to repeat."""
+    meta = get_teacher_upload(upload_id, current_user, db)
+    if meta["status"] != "uploading":
+        return upload_status(meta, response)
+    received = chunked_upload.offset(upload_id)
+    if received != meta["size"]:
+        raise offset_conflict(f"Upload incomplete: {received} of {meta['size']} bytes received", received)
+    meta = chunked_upload.update(upload_id, status="processing")
+    background_tasks.add_task(detached(process_staged_upload), upload_id, current_user.get("sub"))
+    return upload_status(meta, response)
+
+@router.delete("/attendance/uploads/{upload_id}")
+def cancel_video_upload(upload_id: str, db: Session = Depends(get_db),
+                        current_user: dict = Depends(require_teacher)):
+    meta = get_teacher_upload(upload_id, current_user, db)
+    if meta["status"] == "processing":
+        raise HTTPException(status_code=409, detail="Upload is being processed")
+    chunked_upload.remove(upload_id)
+    return {"message": "Upload cancelled"}
+
+# ─── Live Stream ────────────────────────────────────────────────────────────
+
+class StartStreamRequest(BaseModel):
+    source: Optional[str] = None  # rtsp/http camera URL, or a file under STREAM_FILE_ROOT
+    video_id: Optional[str] = None  # or a retained upload, played back as a stream
+    subject_id: int
+    class_id: Optional[int] = None
+    realtime: bool = True  # pace file playback at its native frame rate
+    frame_interval: Optional[int] = None
+    tolerance: Optional[float] = None
+    min_hits: Optional[int] = None
+    max_mean_distance: Optional[float] = None
+
+def stream_response(db: Session, stream, subject_id: int, class_id: Optional[int]) -> dict:
+    detected_ids, scores = stream.results()
+    response = build_video_results(db, detected_ids, scores, subject_id, class_id)
+    response.update({"stream_id": stream.id, **stream.progress()})
+    return response
+
+@router.post("/attendance/stream")
+def start_attendance_stream(data: StartStreamRequest, db: Session = Depends(get_db),
+                            current_user: dict = Depends(require_teacher)):
+    """Start live recognition on a camera stream.
+
+    Detections are pushed on `/attendance/stream/{stream_id}/events` (SSE) as
+    students cross the presence threshold; stopping the stream returns the
+    same per-student results as a video upload, ready to review and save.
+    """
+    teacher = get_teacher_from_token(current_user, db)
+    if data.video_id:
+        video = video_store.get(data.video_id, teacher.id)
+        if not video:
+            raise HTTPException(status_code=404, detail="Video not found or no longer retained")
+        source = video["path"]
+    elif data.source:
+        try:
+            source = stream_service.resolve_source(data.source)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        raise HTTPException(status_code=400, detail="Provide a stream source or video_id")
+
+    roster = {r["student_id"]: {"name": r["name"], "roll_number": r["roll_number"]}
+              for r in build_video_results(db, [], {}, data.subject_id, data.class_id)["results"]}
+    try:
+        stream = stream_service.start_stream(
+            source, db, teacher.id, roster, realtime=data.realtime,
+            frame_interval=data.frame_interval,
+            tolerance=data.tolerance,
+            min_hits=data.min_hits,
+            max_mean_distance=data.max_mean_distance
+        )
+    except stream_service.StreamLimitReached as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"stream_id": stream.id, "total_students": len(roster), **stream.progress()}
+
+def get_teacher_stream(stream_id: str, current_user: dict, db: Session):
+    teacher = get_teacher_from_token(current_user, db)
+    stream = stream_service.get_stream(stream_id, teacher.id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return stream
+
+@router.get("/attendance/stream/{stream_id}/events")
+async def stream_attendance_events(stream_id: str, request: Request,
+                                   last_event_id: Optional[str] = Header(None),
+                                   db: Session = Depends(get_db),
+                                   current_user: dict = Depends(require_teacher)):
+    """Server-sent events: `detected` per recognised student, periodic
+    `progress`, and a final `end`. Reconnects resume after Last-Event-ID."""
+    stream = get_teacher_stream(stream_id, current_user, db)
+    cursor = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    async def events():
+        nonlocal cursor
+        idle = 0.0
+        while not await request.is_disconnected():
+            batch = stream.events_since(cursor)
+            for event in batch:
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            cursor += len(batch)
+            if batch and batch[-1]["type"] == "end":
+                return
+            idle = 0.0 if batch else idle + 0.25
+            if idle >= 15:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/attendance/stream/{stream_id}")
+def get_attendance_stream(stream_id: str, subject_id: int = 0, class_id: Optional[int] = None,
+                          db: Session = Depends(get_db), current_user: dict = Depends(require_teacher)):
+    """Current results of a running or recently ended stream."""
+    stream = get_teacher_stream(stream_id, current_user, db)
+    return stream_response(db, stream, subject_id, class_id)
+
+@router.delete("/attendance/stream/{stream_id}")
+def stop_attendance_stream(stream_id: str, subject_id: int = 0, class_id: Optional[int] = None,
+                           db: Session = Depends(get_db), current_user: dict = Depends(require_teacher)):
+    """Stop a stream and return its final results."""
+    stream = get_teacher_stream(stream_id, current_user, db)
+    stream.stop()
+    return stream_response(db, stream, subject_id, class_id)
+
 # ─── Save Attendance ────────────────────────────────────────────────────────
 
 class AttendanceRecordItem(BaseModel):
@@ -237,8 +593,10 @@ def save_attendance(data: SaveAttendanceRequest,
 
     existing_att = existing.first()
 
+    stale_students = set()
     if existing_att:
         # Update existing records
+        stale_students = rollups.session_students(db, [existing_att.id])
         db.query(AttendanceRecord).filter(
             AttendanceRecord.attendance_id == existing_att.id
         ).delete()
@@ -264,39 +622,164 @@ def save_attendance(data: SaveAttendanceRequest,
         )
         db.add(record)
 
+    rollups.refresh(db, [attendance.id], stale_students)
     db.commit()
     return {"message": "Attendance saved successfully", "attendance_id": attendance.id}
 
+# ─── Batch Save Attendance ──────────────────────────────────────────────────
+
+ATTENDANCE_STATUSES = {"Present", "Absent", "Not Marked"}
+
+class BatchSaveAttendanceRequest(BaseModel):
+    sessions: List[SaveAttendanceRequest]
+
+@router.post("/attendance/batch")
+def save_attendance_batch(data: BatchSaveAttendanceRequest,
+                          db: Session = Depends(get_db),
+                          current_user: dict = Depends(require_teacher)):
+    """
+    Save many attendance sessions (e.g. an offline day synced at once) in one
+    transaction. Existing sessions for the same subject/class/date are
+    overwritten like `save_attendance` does; invalid sessions are reported
+    and skipped without affecting the others. A session repeated within the
+    batch is saved from its first occurrence and the repeats are reported
+    as duplicates.
+    """
+    teacher = get_teacher_from_token(current_user, db)
+
+    results = []
+    valid = []
+    for i, item in enumerate(data.sessions):
+        try:
+            att_date = datetime.strptime(item.date, "%Y-%m-%d").date()
+        except ValueError:
+            results.append({"index": i, "status": "error", "detail": "date must be YYYY-MM-DD"})
+            continue
+        bad_status = {r.status for r in item.records} - ATTENDANCE_STATUSES
+        if bad_status:
+            results.append({"index": i, "status": "error",
+                            "detail": f"Invalid status: {', '.join(sorted(bad_status))}"})
+            continue
+        att_time = None
+        if item.time_start:
+            try:
+                parts = item.time_start.split(":")
+                att_time = dt_time(int(parts[0]), int(parts[1]))
+            except Exception:
+                pass
+        results.append({"index": i, "status": None})
+        valid.append((results[-1], item, att_date, att_time))
+
+    # One query for every session this batch could overwrite
+    existing = []
+    if valid:
+        existing = db.query(Attendance).filter(
+            Attendance.teacher_id == teacher.id,
+            Attendance.subject_id.in_({item.subject_id for _, item, _, _ in valid}),
+            Attendance.date.in_({d for _, _, d, _ in valid})
+        ).order_by(Attendance.id).all()
+
+    def find_existing(item, att_date):
+        for att in existing:
+            if att.subject_id == item.subject_id and att.date == att_date and (
+                    not item.class_id or att.class_id == item.class_id):
+                return att
+        return None
+
+    targets = []
+    claimed = {}
+    overwritten_ids = set()
+    for result, item, att_date, att_time in valid:
+        attendance = find_existing(item, att_date)
+        if attendance in claimed:
+            result["status"] = "duplicate"
+            result["detail"] = f"Same session as index {claimed[attendance]}"
+            continue
+        if attendance:
+            attendance.time_start = att_time
+            if attendance.id:
+                overwritten_ids.add(attendance.id)
+            result["status"] = "updated"
+        else:
+            attendance = Attendance(
+                teacher_id=teacher.id,
+                subject_id=item.subject_id,
+                class_id=item.class_id,
+                date=att_date,
+                time_start=att_time
+            )
+            db.add(attendance)
+            # Later sessions in the same batch with the same key are duplicates
+            existing.append(attendance)
+            result["status"] = "created"
+        claimed[attendance] = result["index"]
+        targets.append((result, item, attendance))
+
+    stale_students = rollups.session_students(db, overwritten_ids)
+    if overwritten_ids:
+        db.query(AttendanceRecord).filter(
+            AttendanceRecord.attendance_id.in_(overwritten_ids)
+        ).delete(synchronize_session=False)
+    db.flush()
+
+    rows = []
+    for result, item, attendance in targets:
+        result["attendance_id"] = attendance.id
+        result["records"] = len(item.records)
+        rows.extend({
+            "attendance_id": attendance.id,
+            "student_id": rec.student_id,
+            "status": rec.status,
+            "marked_by_ai": rec.marked_by_ai
+        } for rec in item.records)
+    if rows:
+        db.execute(insert(AttendanceRecord), rows)
+
+    rollups.refresh(db, [attendance.id for _, _, attendance in targets], stale_students)
+    db.commit()
+    saved = sum(1 for r in results if r["status"] in ("created", "updated"))
+    return {
+        "message": f"Saved {saved} of {len(data.sessions)} sessions",
+        "saved": saved,
+        "results": results
+    }
+
 # ─── Attendance Records ─────────────────────────────────────────────────────
 
 @router.get("/attendance/records")
-def get_attendance_records(
+async def get_attendance_records(
     subject_id: Optional[int] = None,
     class_id: Optional[int] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(require_teacher)
 ):
-    teacher = get_teacher_from_token(current_user, db)
-    query = db.query(Attendance).filter(Attendance.teacher_id == teacher.id)
+    teacher = await get_teacher_async(current_user, db)
+    query = (
+        select(Attendance)
+        .options(
+            joinedload(Attendance.subject),
+            joinedload(Attendance.class_section),
+            selectinload(Attendance.records).joinedload(AttendanceRecord.student),
+        )
+        .where(Attendance.teacher_id == teacher.id)
+    )
 
     if subject_id:
-        query = query.filter(Attendance.subject_id == subject_id)
+        query = query.where(Attendance.subject_id == subject_id)
     if class_id:
-        query = query.filter(Attendance.class_id == class_id)
+        query = query.where(Attendance.class_id == class_id)
     if date_from:
-        query = query.filter(Attendance.date >= datetime.strptime(date_from, "%Y-%m-%d").date())
+        query = query.where(Attendance.date >= datetime.strptime(date_from, "%Y-%m-%d").date())
     if date_to:
-        query = query.filter(Attendance.date <= datetime.strptime(date_to, "%Y-%m-%d").date())
+        query = query.where(Attendance.date <= datetime.strptime(date_to, "%Y-%m-%d").date())
 
-    attendance_list = query.order_by(Attendance.date.desc()).all()
+    attendance_list = (await db.scalars(query.order_by(Attendance.date.desc()))).unique().all()
 
     result = []
     for att in attendance_list:
-        records = db.query(AttendanceRecord).filter(
-            AttendanceRecord.attendance_id == att.id
-        ).all()
+        records = att.records
 
         present_count = sum(1 for r in records if r.status == "Present")
         total = len(records)
@@ -321,7 +804,27 @@ def get_attendance_records(
             } for r in records]
         })
 
-    return result
+    return FastJSONResponse(result)
+
+# ─── Export Attendance ──────────────────────────────────────────────────────
+
+@router.get("/attendance/export")
+def export_attendance(
+    format: str = "csv",
+    subject_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(require_teacher)
+):
+    """Stream this teacher's attendance records as CSV or XLSX, one row per student per session."""
+    teacher = get_teacher_from_token(current_user, db)
+    return attendance_export_response(
+        format, "attendance",
+        teacher_id=teacher.id, subject_id=subject_id, class_id=class_id,
+        date_from=date_from, date_to=date_to
+    )
 
 # ─── Edit Attendance ────────────────────────────────────────────────────────
 
@@ -346,6 +849,7 @@ def edit_attendance(attendance_id: int, data: EditAttendanceRequest,
         raise HTTPException(status_code=404, detail="Attendance record not found")
 
     # Delete old records and add new
+    stale_students = rollups.session_students(db, [attendance_id])
     db.query(AttendanceRecord).filter(AttendanceRecord.attendance_id == attendance_id).delete()
 
     for rec in data.records:
@@ -357,18 +861,36 @@ def edit_attendance(attendance_id: int, data: EditAttendanceRequest,
         )
         db.add(record)
 
+    rollups.refresh(db, [attendance_id], stale_students)
     db.commit()
     return {"message": "Attendance updated successfully"}
 
 # ─── Analytics ──────────────────────────────────────────────────────────────
 
-@router.get("/analytics")
-def get_analytics(db: Session = Depends(get_db),
-                  current_user: dict = Depends(require_teacher)):
-    teacher = get_teacher_from_token(current_user, db)
+@router.get("/analytics", dependencies=[Depends(admit("analytics"))])
+async def get_analytics(threshold: Optional[float] = None,
+                        db: AsyncSession = Depends(get_async_db),
+                        current_user: dict = Depends(require_teacher)):
+    teacher = await get_teacher_async(current_user, db)
+    threshold = check_threshold(threshold)
 
     # Get all attendance sessions for this teacher
-    sessions = db.query(Attendance).filter(Attendance.teacher_id == teacher.id).all()
+    sessions = (await db.scalars(
+        select(Attendance).options(joinedload(Attendance.subject)).where(Attendance.teacher_id == teacher.id)
+    )).all()
+    session_ids = [s.id for s in sessions]
+
+    # Record and present counts per session in one grouped query
+    counts = {}
+    if session_ids:
+        rows = await db.execute(
+            select(AttendanceRecord.attendance_id, AttendanceRecord.status, func.count())
+            .where(AttendanceRecord.attendance_id.in_(session_ids))
+            .group_by(AttendanceRecord.attendance_id, AttendanceRecord.status)
+        )
+        for attendance_id, status, n in rows:
+            total, present = counts.get(attendance_id, (0, 0))
+            counts[attendance_id] = (total + n, present + (n if status == "Present" else 0))
 
     # Subject-wise analytics
     subject_analytics = {}
@@ -384,12 +906,9 @@ def get_analytics(db: Session = Depends(get_db),
             }
         subject_analytics[subj_name]["total_lectures"] += 1
 
-        records = db.query(AttendanceRecord).filter(
-            AttendanceRecord.attendance_id == session.id
-        ).all()
-        present = sum(1 for r in records if r.status == "Present")
+        total, present = counts.get(session.id, (0, 0))
         subject_analytics[subj_name]["total_present"] += present
-        subject_analytics[subj_name]["total_records"] += len(records)
+        subject_analytics[subj_name]["total_records"] += total
 
     for key in subject_analytics:
         sa = subject_analytics[key]
@@ -400,52 +919,96 @@ def get_analytics(db: Session = Depends(get_db),
         else:
             sa["attendance_percentage"] = 0
 
-    # Students with < 75% attendance
+    # Students below the attendance threshold
     low_attendance_students = []
     # Get all subjects taught by this teacher
     teacher_subject_ids = list({s.subject_id for s in sessions if s.subject_id})
+    lectures = {sid: sum(1 for s in sessions if s.subject_id == sid) for sid in teacher_subject_ids}
+    subject_names = {s.subject_id: s.subject.name for s in sessions if s.subject}
+
+    # Sessions each student was present in, per subject
+    present_counts = {}
+    enrolments = []
+    if teacher_subject_ids:
+        rows = await db.execute(
+            select(AttendanceRecord.student_id, Attendance.subject_id,
+                   func.count(func.distinct(Attendance.id)))
+            .join(Attendance, AttendanceRecord.attendance_id == Attendance.id)
+            .where(Attendance.teacher_id == teacher.id, AttendanceRecord.status == "Present")
+            .group_by(AttendanceRecord.student_id, Attendance.subject_id)
+        )
+        present_counts = {(student_id, subj_id): n for student_id, subj_id, n in rows}
+        enrolments = (await db.execute(
+            select(StudentSubject.subject_id, Student.id, Student.name, Student.roll_number)
+            .join(Student, Student.id == StudentSubject.student_id)
+            .where(StudentSubject.subject_id.in_(teacher_subject_ids))
+            .order_by(StudentSubject.id)
+        )).all()
 
     for subject_id in teacher_subject_ids:
-        ss_records = db.query(StudentSubject).filter(
-            StudentSubject.subject_id == subject_id
-        ).all()
-
-        subject_sessions = [s for s in sessions if s.subject_id == subject_id]
-        total_lectures = len(subject_sessions)
-
-        if total_lectures == 0:
-            continue
-
-        subject = db.query(Subject).filter(Subject.id == subject_id).first()
-
-        for ss in ss_records:
-            student = db.query(Student).filter(Student.id == ss.student_id).first()
-            if not student:
+        total_lectures = lectures[subject_id]
+        for subj_id, student_id, name, roll_number in enrolments:
+            if subj_id != subject_id:
                 continue
-
-            present_count = 0
-            for session in subject_sessions:
-                rec = db.query(AttendanceRecord).filter(
-                    AttendanceRecord.attendance_id == session.id,
-                    AttendanceRecord.student_id == student.id,
-                    AttendanceRecord.status == "Present"
-                ).first()
-                if rec:
-                    present_count += 1
-
+            present_count = present_counts.get((student_id, subject_id), 0)
             percentage = round((present_count / total_lectures) * 100, 1)
-            if percentage < 75:
+            if percentage < threshold:
                 low_attendance_students.append({
-                    "student_name": student.name,
-                    "roll_number": student.roll_number,
-                    "subject": subject.name if subject else "",
+                    "student_name": name,
+                    "roll_number": roll_number,
+                    "subject": subject_names.get(subject_id, ""),
                     "attendance_percentage": percentage,
                     "present": present_count,
                     "total": total_lectures
                 })
 
-    return {
+    return FastJSONResponse({
         "total_lectures": len(sessions),
+        "threshold": threshold,
         "subject_analytics": list(subject_analytics.values()),
         "low_attendance_students": low_attendance_students
-    }
+    })
+
+@router.get("/analytics/heatmap", dependencies=[Depends(admit("analytics"))])
+async def get_attendance_heatmap(
+    subject_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    threshold: Optional[float] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(require_teacher)
+):
+    """Student × session matrix, weekday/time-slot rates and absence streaks
+    for one subject and/or class, built from a single query."""
+    teacher = await get_teacher_async(current_user, db)
+    threshold = check_threshold(threshold)
+    if not subject_id and not class_id:
+        raise HTTPException(status_code=400, detail="subject_id or class_id is required")
+
+    query = (
+        select(Attendance.id, Attendance.date, Attendance.time_start,
+               Attendance.subject_id, Attendance.class_id,
+               Student.id, Student.name, Student.roll_number, AttendanceRecord.status)
+        .join(AttendanceRecord, AttendanceRecord.attendance_id == Attendance.id)
+        .join(Student, AttendanceRecord.student_id == Student.id)
+        .where(Attendance.teacher_id == teacher.id)
+    )
+    if subject_id:
+        query = query.where(Attendance.subject_id == subject_id)
+    if class_id:
+        query = query.where(Attendance.class_id == class_id)
+    try:
+        if date_from:
+            query = query.where(Attendance.date >= datetime.strptime(date_from, "%Y-%m-%d").date())
+        if date_to:
+            query = query.where(Attendance.date <= datetime.strptime(date_to, "%Y-%m-%d").date())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+
+    rows = (await db.execute(query)).all()
+    schedule = await get_schedule_view(db, teacher.id)
+    # pandas/NumPy work is CPU-bound; keep it off the event loop
+    heatmap = await asyncio.to_thread(attendance_heatmap, rows, schedule, threshold)
+    heatmap.update(subject_id=subject_id, class_id=class_id)
+    return FastJSONResponse(heatmap)
@@ -0,0 +1,230 @@
+import asyncio
+import collections
+import os
+import time
+from starlette.routing import Match
+from app.utils.auth import decode_token
+from app.utils.responses import FastJSONResponse
+from app.utils.metrics import ADMISSION_ACTIVE, ADMISSION_QUEUED, ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS
+
+# Limits are per worker process, like the metrics. Each route class can be
+# tuned with ADMISSION_<CLASS>_{CONCURRENCY,PER_USER,QUEUE,TIMEOUT}; a QUEUE or
+# TIMEOUT of 0 answers 429 as soon as the class is full instead of queueing.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 5))
+
+ROUTE_CLASSES = {
+    # Face recognition over uploaded videos: CPU-bound, so half the cores
+    "video": {"concurrency": max(1, (os.cpu_count() or 2) // 2), "per_user": 1, "queue": 8, "timeout": 60},
+    # Roster, photo and timetable imports (face encoding, bulk inserts)
+    "import": {"concurrency": 2, "per_user": 1, "queue": 4, "timeout": 30},
+    # Analytics and gallery-wide scans
+    "analytics": {"concurrency": 8, "per_user": 2, "queue": 32, "timeout": 10},
+}
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class AdmissionLimiter:
+    """
+    Concurrency limit for one route class, global and per user.
+
+    Callers over the global limit wait in a FIFO queue (bounded in length and
+    time); a freed slot is handed straight to the first waiter whose user is
+    under their own limit. A user already at their per-user limit is refused
+    at once rather than allowed to fill the queue. All state lives on the
+    event loop, so no locking is needed.
+    """
+
+    def __init__(self, route_class: str, concurrency: int, per_user: int, queue: int, timeout: float):
+        self.route_class = route_class
+        self.concurrency = concurrency
+        self.per_user = per_user
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self._by_user = {}
+        self._waiters = collections.deque()
+
+    def _has_room(self, user) -> bool:
+        return self.active < self.concurrency and (
+            self.per_user <= 0 or self._by_user.get(user, 0) < self.per_user)
+
+    def _take(self, user):
+        self.active += 1
+        self._by_user[user] = self._by_user.get(user, 0) + 1
+        ADMISSION_ACTIVE.set(self.active, route_class=self.route_class)
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.inc(route_class=self.route_class, reason=reason)
+        raise AdmissionRejected(reason)
+
+    async def acquire(self, user, background: bool = False):
+        """
+        Take a slot for `user`, queueing while the class is full. Raises
+        AdmissionRejected when the request should get a 429. `background`
+        work has already been accepted, so it waits as long as it takes.
+        """
+        if self._has_room(user):
+            self._take(user)
+            return
+        if not background:
+            if self.per_user > 0 and self._by_user.get(user, 0) >= self.per_user:
+                self._reject("per_user")
+            if len(self._waiters) >= self.queue or self.timeout <= 0:
+                self._reject("queue_full")
+
+        entry = (user, asyncio.get_running_loop().create_future())
+        self._waiters.append(entry)
+        ADMISSION_QUEUED.set(len(self._waiters), route_class=self.route_class)
+        started = time.perf_counter()
+        try:
+            if background:
+                await entry[1]
+            else:
+                await asyncio.wait_for(entry[1], self.timeout)
+        except BaseException as e:
+            if entry[1].done() and not entry[1].cancelled():
+                # Granted just as we gave up; pass it on
+                self.release(user)
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout")
+            raise
+        finally:
+            ADMISSION_QUEUED.set(len(self._waiters), route_class=self.route_class)
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, route_class=self.route_class)
+
+    def release(self, user):
+        self.active -= 1
+        if self._by_user.get(user, 0) <= 1:
+            self._by_user.pop(user, None)
+        else:
+            self._by_user[user] -= 1
+        for entry in list(self._waiters):
+            if self.active >= self.concurrency:
+                break
+            waiter, future = entry
+            if future.done():
+                self._waiters.remove(entry)
+            elif self._has_room(waiter):
+                self._waiters.remove(entry)
+                self._take(waiter)
+                future.set_result(None)
+        ADMISSION_ACTIVE.set(self.active, route_class=self.route_class)
+        ADMISSION_QUEUED.set(len(self._waiters), route_class=self.route_class)
+
+    def snapshot(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "per_user": self.per_user,
+            "queue_limit": self.queue,
+            "timeout_seconds": self.timeout,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "users": len(self._by_user),
+        }
+
+def _setting(route_class: str, name: str, default):
+    return type(default)(os.getenv(f"ADMISSION_{route_class.upper()}_{name.upper()}", default))
+
+limiters = {
+    name: AdmissionLimiter(name, **{key: _setting(name, key, value) for key, value in limits.items()})
+    for name, limits in ROUTE_CLASSES.items()
+}
+
+def admit(route_class: str):
+    """
+    Mark a route for admission control:
+    `@router.post(..., dependencies=[Depends(admit("video"))])`.
+
+    The slot is taken by AdmissionMiddleware before the request body is read.
+    FastAPI parses a multipart body before any dependency runs, so checking
+    here would refuse an overloaded upload only after receiving all of it.
+    """
+    limiters[route_class]  # unknown classes fail at import
+
+    async def dependency():
+        return None
+
+    dependency.admission_class = route_class
+    return dependency
+
+def admitted_routes(routes) -> list:
+    """(route, route class) for each of `routes` marked with `admit()`."""
+    found = []
+    for route in routes:
+        for depends in getattr(route, "dependencies", ()):
+            route_class = getattr(depends.dependency, "admission_class", None)
+            if route_class:
+                found.append((route, route_class))
+    return found
+
+def _bearer_user(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            payload = decode_token(token) if scheme.lower() == "bearer" else None
+            return payload.get("sub") if payload else None
+    return None
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting requests to the `routes` marked with `admit()`
+    before their body is read, so a 429 costs the client no upload. Requests
+    without a valid token pass through and are refused by the route's auth.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = admitted_routes(routes)
+
+    def _match(self, scope):
+        for route, route_class in self.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route, route_class
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        route, route_class = self._match(scope)
+        user = _bearer_user(scope) if route_class else None
+        if user is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = limiters[route_class]
+        try:
+            await limiter.acquire(user)
+        except AdmissionRejected as e:
+            scope["route"] = route  # so the metrics label the 429 with its route
+            detail = ("You already have a request of this kind running" if e.reason == "per_user"
+                      else "Server busy, try again shortly")
+            response = FastJSONResponse({"detail": detail}, status_code=429,
+                                        headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(user)
+
+async def run_admitted(route_class: str, user, func, *args, **kwargs):
+    """Run blocking `func` in a thread once a `route_class` slot is free, for
+    work already accepted (background jobs)."""
+    if not ADMISSION_ENABLED:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    limiter = limiters[route_class]
+    await limiter.acquire(user, background=True)
+    try:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    finally:
+        limiter.release(user)
+
+def status() -> dict:
+    return {name: limiter.snapshot() for name, limiter in limiters.items()}
@@ -0,0 +1,158 @@
+import os
+from typing import Optional
+from fastapi import HTTPException
+import numpy as np
+import pandas as pd
+from app.utils.schedule_import import DAY_NAMES
+
+ANALYTICS_LOW_THRESHOLD = float(os.getenv("ANALYTICS_LOW_THRESHOLD", 75))
+
+# One row per attendance record, as fetched by the heatmap route's single query
+HEATMAP_COLUMNS = [
+    "attendance_id", "date", "time_start", "subject_id", "class_id",
+    "student_id", "name", "roll_number", "status"
+]
+# Matrix cell codes; NaN means no record or "Not Marked"
+PRESENT, ABSENT = 1.0, 0.0
+UNSCHEDULED = "Unscheduled"
+
+def check_threshold(threshold: Optional[float]) -> float:
+    if threshold is None:
+        return ANALYTICS_LOW_THRESHOLD
+    if not 0 <= threshold <= 100:
+        raise HTTPException(status_code=400, detail="threshold must be between 0 and 100")
+    return threshold
+
+def _percent(present: np.ndarray, total: np.ndarray) -> np.ndarray:
+    out = np.zeros(len(total))
+    np.divide(present * 100.0, total, out=out, where=total > 0)
+    return np.round(out, 1)
+
+def absence_streaks(matrix: np.ndarray):
+    """
+    (longest, current) runs of consecutive absences along each row of a
+    student × session matrix in date order. Unmarked sessions (NaN) neither
+    extend nor break a run.
+    """
+    if matrix.shape[1] == 0:
+        zeros = np.zeros(matrix.shape[0], dtype=int)
+        return zeros, zeros
+    absences = np.cumsum(matrix == ABSENT, axis=1)
+    # Absence count as of each row's most recent "Present"
+    at_last_present = np.maximum.accumulate(np.where(matrix == PRESENT, absences, 0), axis=1)
+    run = absences - at_last_present
+    return run.max(axis=1), run[:, -1]
+
+def _time_slots(sessions: pd.DataFrame, schedule) -> pd.Series:
+    """HH:MM a session started at; sessions saved without a time take the
+    slot of the timetable entry for the same subject, class and weekday."""
+    scheduled = {}
+    for entry in schedule:
+        if entry["time_start"]:
+            key = (entry["subject_id"], entry["class_id"], entry["day"])
+            scheduled.setdefault(key, entry["time_start"][:5])
+
+    def slot(session) -> str:
+        if session.time_start is not None:
+            return session.time_start.strftime("%H:%M")
+        return scheduled.get((session.subject_id, session.class_id, session.weekday), UNSCHEDULED)
+
+    return sessions.apply(slot, axis=1) if len(sessions) else pd.Series(dtype=object)
+
+def _group_rates(sessions: pd.DataFrame, key: str, order) -> list:
+    grouped = sessions.groupby(key).agg(
+        sessions=("attendance_id", "size"),
+        present=("present", "sum"),
+        records=("records", "sum"),
+    ).reindex([k for k in order if k in set(sessions[key])])
+    rates = _percent(grouped["present"].to_numpy(), grouped["records"].to_numpy())
+    return [
+        {key: name, "sessions": int(row.sessions), "present": int(row.present),
+         "records": int(row.records), "attendance_percentage": float(rate)}
+        for name, row, rate in zip(grouped.index, grouped.itertuples(), rates)
+    ]
+
+def attendance_heatmap(rows, schedule=(), threshold: float = ANALYTICS_LOW_THRESHOLD) -> dict:
+    """
+    Student × session attendance matrix with per-student, per-weekday and
+    per-time-slot rates and absence streaks, all derived from `rows`
+    (tuples in HEATMAP_COLUMNS order). `schedule` is the teacher's resolved
+    timetable, used to place sessions that were saved without a start time.
+
+    Matrix cells are 1 (present), 0 (absent) or null (no record / not
+    marked). A student's percentage is over the sessions they have a record
+    in, so students who joined mid-term are not penalised for earlier lectures.
+    """
+    # object dtype keeps nullable ids as None rather than NaN floats
+    df = pd.DataFrame(rows, columns=HEATMAP_COLUMNS, dtype=object)
+
+    sessions = df.drop_duplicates("attendance_id")[
+        ["attendance_id", "date", "time_start", "subject_id", "class_id"]
+    ].copy()
+    sessions["weekday"] = [DAY_NAMES[d.weekday()] for d in sessions["date"]]
+    sessions["time_slot"] = _time_slots(sessions, schedule)
+    sessions = sessions.sort_values(["date", "time_slot", "attendance_id"]).reset_index(drop=True)
+
+    students = df.drop_duplicates("student_id")[["student_id", "name", "roll_number"]]
+    students = students.sort_values("roll_number").reset_index(drop=True)
+
+    row = pd.Index(students["student_id"]).get_indexer(df["student_id"])
+    col = pd.Index(sessions["attendance_id"]).get_indexer(df["attendance_id"])
+    matrix = np.full((len(students), len(sessions)), np.nan)
+    matrix[row, col] = df["status"].map({"Present": PRESENT, "Absent": ABSENT}).to_numpy(dtype=float)
+    recorded = np.zeros(matrix.shape, dtype=bool)
+    recorded[row, col] = True
+
+    present = matrix == PRESENT
+    student_present = present.sum(axis=1)
+    student_total = recorded.sum(axis=1)
+    student_rate = _percent(student_present, student_total)
+    longest, current = absence_streaks(matrix)
+
+    sessions["present"] = present.sum(axis=0)
+    sessions["records"] = recorded.sum(axis=0)
+    session_rate = _percent(sessions["present"].to_numpy(), sessions["records"].to_numpy())
+
+    student_list = [
+        {
+            "student_id": int(s.student_id),
+            "name": s.name,
+            "roll_number": s.roll_number,
+            "present": int(student_present[i]),
+            "total": int(student_total[i]),
+            "attendance_percentage": float(student_rate[i]),
+            "longest_absence_streak": int(longest[i]),
+            "current_absence_streak": int(current[i]),
+            "below_threshold": bool(student_rate[i] < threshold),
+        }
+        for i, s in enumerate(students.itertuples())
+    ]
+
+    cells = np.nan_to_num(matrix, nan=-1).astype(np.int8).astype(object)
+    cells[np.isnan(matrix)] = None
+
+    return {
+        "threshold": threshold,
+        "sessions": [
+            {
+                "attendance_id": int(s.attendance_id),
+                "date": str(s.date),
+                "weekday": s.weekday,
+                "time_slot": s.time_slot,
+                "subject_id": s.subject_id,
+                "class_id": s.class_id,
+                "present": int(s.present),
+                "records": int(s.records),
+                "attendance_percentage": float(session_rate[i]),
+            }
+            for i, s in enumerate(sessions.itertuples())
+        ],
+        "students": student_list,
+        "matrix": cells.tolist(),
+        "weekday_rates": _group_rates(sessions, "weekday", DAY_NAMES),
+        "time_slot_rates": _group_rates(sessions, "time_slot", sorted(set(sessions["time_slot"]))),
+        "low_attendance_students": sorted(
+            (s for s in student_list if s["below_threshold"]),
+            key=lambda s: (s["attendance_percentage"], -s["current_absence_streak"])
+        ),
+    }
@@ -0,0 +1,141 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock below
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", os.path.join(BASE_DIR, "data", "upload_staging"))
+UPLOAD_MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_GB", 4)) * 1024 ** 3)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_STAGING_TTL_HOURS = float(os.getenv("UPLOAD_STAGING_TTL_HOURS", 24))
+
+# Without fcntl, appends are only serialised within this process
+_locks = {}
+_locks_guard = threading.Lock()
+
+def _meta_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_STAGING_DIR, f"{upload_id}.json")
+
+def data_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_STAGING_DIR, f"{upload_id}.part")
+
+def _write_meta(meta: dict):
+    tmp = _meta_path(meta["upload_id"]) + f".{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, _meta_path(meta["upload_id"]))
+
+@contextlib.contextmanager
+def appender(upload_id: str):
+    """
+    The staging file opened for appending under an exclusive lock, or None
+    if another request (in any worker) is still appending to it. A retry can
+    arrive while the handler of the dropped connection is still draining, so
+    callers get None instead of waiting. Check the offset only once the lock
+    is held. Raises FileNotFoundError if the upload was removed.
+    """
+    f = os.fdopen(os.open(data_path(upload_id), os.O_WRONLY | os.O_APPEND), "ab")
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield None
+                return
+            yield f
+            return
+        with _locks_guard:
+            local = _locks.setdefault(upload_id, threading.Lock())
+        if not local.acquire(blocking=False):
+            yield None
+            return
+        try:
+            yield f
+        finally:
+            local.release()
+    finally:
+        f.close()  # also releases the flock
+
+def offset(upload_id: str) -> int:
+    """Bytes received so far; the staging file itself is the source of truth."""
+    try:
+        return os.path.getsize(data_path(upload_id))
+    except OSError:
+        return 0
+
+def create(teacher_id: int, filename: str, size: int, job: dict) -> dict:
+    """Start a staged upload; `job` holds the recognition parameters to run on completion."""
+    prune()
+    os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+    meta = {
+        "upload_id": uuid.uuid4().hex,
+        "teacher_id": teacher_id,
+        "filename": filename,
+        "size": size,
+        "job": job,
+        "status": "uploading",
+        "result": None,
+        "error": None,
+        "created_at": time.time(),
+    }
+    open(data_path(meta["upload_id"]), "wb").close()
+    _write_meta(meta)
+    return meta
+
+def get(upload_id: str, teacher_id: int = None):
+    if not upload_id.isalnum():
+        return None
+    try:
+        with open(_meta_path(upload_id)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if teacher_id is not None and meta["teacher_id"] != teacher_id:
+        return None
+    return meta
+
+def update(upload_id: str, **fields) -> dict:
+    meta = get(upload_id)
+    meta.update(fields)
+    _write_meta(meta)
+    return meta
+
+def remove_data(upload_id: str):
+    try:
+        os.unlink(data_path(upload_id))
+    except OSError:
+        pass
+
+def remove(upload_id: str):
+    remove_data(upload_id)
+    try:
+        os.unlink(_meta_path(upload_id))
+    except OSError:
+        pass
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+
+def prune():
+    """Drop staged uploads (finished or abandoned) older than the TTL."""
+    if not os.path.isdir(UPLOAD_STAGING_DIR):
+        return
+    cutoff = time.time() - UPLOAD_STAGING_TTL_HOURS * 3600
+    for name in os.listdir(UPLOAD_STAGING_DIR):
+        if not name.endswith(".json"):
+            continue
+        upload_id = name[:-len(".json")]
+        try:
+            last_activity = max(os.path.getmtime(os.path.join(UPLOAD_STAGING_DIR, name)),
+                                os.path.getmtime(data_path(upload_id)) if os.path.exists(data_path(upload_id)) else 0)
+            if last_activity < cutoff:
+                remove(upload_id)
+        except OSError:
+            pass
@@ -0,0 +1,123 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from app.database import SessionLocal
+from app.models.models import (
+    Teacher, Subject, ClassSection, Student, Attendance, AttendanceRecord
+)
+import csv, io, os, tempfile
+
+EXPORT_COLUMNS = [
+    "date", "time_start", "subject", "class_name", "section", "teacher",
+    "roll_number", "student_name", "status", "marked_by_ai"
+]
+EXPORT_BATCH_SIZE = 1000
+
+def _parse_date(value: str, field: str):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field} must be YYYY-MM-DD")
+
+def _iter_rows(filters: dict):
+    """
+    Yield one flat tuple per attendance record, streamed from the DB in
+    batches. The generator owns its session because the response body is
+    produced after the request's `get_db` session has been closed.
+    """
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(
+                Attendance.date, Attendance.time_start,
+                Subject.name, ClassSection.name, ClassSection.section, Teacher.name,
+                Student.roll_number, Student.name,
+                AttendanceRecord.status, AttendanceRecord.marked_by_ai
+            )
+            .select_from(AttendanceRecord)
+            .join(Attendance, AttendanceRecord.attendance_id == Attendance.id)
+            .outerjoin(Subject, Attendance.subject_id == Subject.id)
+            .outerjoin(ClassSection, Attendance.class_id == ClassSection.id)
+            .outerjoin(Teacher, Attendance.teacher_id == Teacher.id)
+            .outerjoin(Student, AttendanceRecord.student_id == Student.id)
+        )
+        if filters.get("teacher_id"):
+            query = query.filter(Attendance.teacher_id == filters["teacher_id"])
+        if filters.get("subject_id"):
+            query = query.filter(Attendance.subject_id == filters["subject_id"])
+        if filters.get("class_id"):
+            query = query.filter(Attendance.class_id == filters["class_id"])
+        if filters.get("date_from"):
+            query = query.filter(Attendance.date >= filters["date_from"])
+        if filters.get("date_to"):
+            query = query.filter(Attendance.date <= filters["date_to"])
+
+        query = query.order_by(Attendance.date, Attendance.id, Student.roll_number)
+        for row in query.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE):
+            date, time_start, subject, class_name, section, teacher, roll, name, status, by_ai = row
+            yield (
+                str(date), str(time_start) if time_start else "",
+                subject or "", class_name or "", section or "", teacher or "",
+                roll or "", name or "", status, "yes" if by_ai else "no"
+            )
+    finally:
+        db.close()
+
+def _iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _iter_xlsx(rows):
+    # openpyxl's write-only mode flushes rows to a temp file as they are added,
+    # so memory stays flat; the finished workbook is then streamed from disk.
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Attendance")
+    ws.append(EXPORT_COLUMNS)
+    for row in rows:
+        ws.append(list(row))
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(path)
+        with open(path, "rb") as f:
+            while chunk := f.read(64 * 1024):
+                yield chunk
+    finally:
+        os.unlink(path)
+
+def attendance_export_response(fmt: str, filename: str, teacher_id: int = None,
+                               subject_id: int = None, class_id: int = None,
+                               date_from: str = None, date_to: str = None):
+    """Build a StreamingResponse exporting attendance records as CSV or XLSX."""
+    fmt = (fmt or "csv").lower()
+    if fmt not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="format must be csv or xlsx")
+
+    filters = {
+        "teacher_id": teacher_id,
+        "subject_id": subject_id,
+        "class_id": class_id,
+        "date_from": _parse_date(date_from, "date_from") if date_from else None,
+        "date_to": _parse_date(date_to, "date_to") if date_to else None,
+    }
+    rows = _iter_rows(filters)
+    if fmt == "csv":
+        body, media_type = _iter_csv(rows), "text/csv"
+    else:
+        body = _iter_xlsx(rows)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
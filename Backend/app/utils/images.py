@@ -0,0 +1,44 @@
+from PIL import Image, ImageOps
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+THUMBNAIL_SIZES = {"sm": 64, "md": 160, "lg": 320}
+THUMBNAIL_ROOT = "uploads/students/thumbs"
+
+def thumbnail_path(roll: str, size: str) -> str:
+    """Path of a student thumbnail relative to the backend root (like `image_path`)."""
+    return f"{THUMBNAIL_ROOT}/{size}/{roll}.jpg"
+
+def make_thumbnails(source, roll: str) -> dict:
+    """
+    Write one JPEG per THUMBNAIL_SIZES entry for a student photo. `source`
+    may be a path or an open file. Returns {size: relative path}.
+    """
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        paths = {}
+        # Largest first so each smaller size is resampled from fewer pixels
+        for size, px in sorted(THUMBNAIL_SIZES.items(), key=lambda kv: -kv[1]):
+            img.thumbnail((px, px), Image.LANCZOS)
+            rel = thumbnail_path(roll, size)
+            dest = os.path.join(BASE_DIR, rel)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            img.save(dest, "JPEG", quality=85, optimize=True)
+            paths[size] = rel
+    return paths
+
+def thumbnail_urls(roll: str) -> dict:
+    """
+    Versioned thumbnail URLs for a student, or None if none were generated.
+    The `v` query changes whenever a thumbnail is rewritten, so the files
+    can be served with a long-lived immutable Cache-Control.
+    """
+    urls = {}
+    for size in THUMBNAIL_SIZES:
+        rel = thumbnail_path(roll, size)
+        try:
+            version = int(os.stat(os.path.join(BASE_DIR, rel)).st_mtime)
+        except OSError:
+            return None
+        urls[size] = f"{rel}?v={version}"
+    return urls
@@ -0,0 +1,228 @@
+from contextvars import ContextVar
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Minimal Prometheus-style registry. Metrics are per process and rendered in
+# the text exposition format at /metrics; with several workers, scrape each.
+_registry = []
+_lock = threading.Lock()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value) -> list:
+        return [f"{self.name}{_label_str(self.labelnames, key)} {value}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if idx < len(self.buckets):
+                state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, value) -> list:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, c in zip(self.buckets, counts):
+            cumulative += c
+            labels = _label_str(self.labelnames + ("le",), key + (bound,))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_bucket{_label_str(self.labelnames + ('le',), key + ('+Inf',))} {count}")
+        label = _label_str(self.labelnames, key)
+        lines.append(f"{self.name}_sum{label} {total}")
+        lines.append(f"{self.name}_count{label} {count}")
+        return lines
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+# ─── Application Metrics ────────────────────────────────────────────────────
+
+HTTP_REQUESTS = Counter(
+    "attendai_http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+HTTP_LATENCY = Histogram(
+    "attendai_http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+DB_QUERIES_PER_REQUEST = Histogram(
+    "attendai_db_queries_per_request", "SQL statements executed per HTTP request", ("route",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+DB_TIME_PER_REQUEST = Histogram(
+    "attendai_db_seconds_per_request", "Time spent executing SQL per HTTP request", ("route",))
+
+VIDEO_STAGE_SECONDS = Histogram(
+    "attendai_video_stage_seconds", "Per-frame time spent in each recognition stage", ("stage",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+VIDEO_FRAMES = Counter(
+    "attendai_video_frames_total", "Video frames decoded (all) and analysed (sampled)", ("kind",))
+VIDEO_FACES_PER_FRAME = Histogram(
+    "attendai_video_faces_per_frame", "Faces detected per sampled frame",
+    buckets=(0, 1, 2, 5, 10, 20, 40, 80))
+VIDEO_JOB_SECONDS = Histogram(
+    "attendai_video_job_seconds", "Total process_video time per job",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200))
+GALLERY_SIZE = Gauge("attendai_gallery_size", "Face encodings in the loaded gallery")
+STREAM_FRAMES = Counter(
+    "attendai_stream_frames_total", "Live stream frames read, dropped under backpressure and analysed", ("kind",))
+STREAMS_ACTIVE = Gauge("attendai_streams_active", "Live attendance streams currently running")
+ADMISSION_ACTIVE = Gauge(
+    "attendai_admission_active", "Requests holding an admission slot", ("route_class",))
+ADMISSION_QUEUED = Gauge(
+    "attendai_admission_queued", "Requests waiting for an admission slot", ("route_class",))
+ADMISSION_REJECTED = Counter(
+    "attendai_admission_rejected_total", "Requests turned away with 429", ("route_class", "reason"))
+ADMISSION_WAIT_SECONDS = Histogram(
+    "attendai_admission_wait_seconds", "Time spent queued before admission", ("route_class",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+
+# ─── Request Context ────────────────────────────────────────────────────────
+
+# Adds X-DB-Queries / X-DB-Time-Ms to every response; meant for development.
+QUERY_DEBUG_HEADERS = os.getenv("QUERY_DEBUG_HEADERS", "false").lower() == "true"
+
+# Holds a mutable dict per request so SQL hooks running in threadpool workers
+# can update it (ContextVar *values* set in a thread do not propagate back).
+request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+def current_request_stats():
+    return request_stats.get()
+
+def detached(func):
+    """
+    Wrap `func` (sync or async) to run without the scheduling request's
+    stats. BackgroundTasks and asyncio.to_thread copy the context, so work
+    done after the response would otherwise be charged to that request and
+    count against its query budget.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def run_async(*args, **kwargs):
+            token = request_stats.set(None)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                request_stats.reset(token)
+        return run_async
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        token = request_stats.set(None)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            request_stats.reset(token)
+    return run
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def request_route(stats: dict) -> str:
+    """'METHOD /route/template' of the request owning `stats`, for log lines."""
+    scope = stats["scope"]
+    return f"{scope.get('method', '')} {_route_label(scope)}"
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and DB query count per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # The router fills scope["route"] in place, so hooks can resolve it later
+        stats = {"queries": 0, "db_time": 0.0, "scope": scope}
+        token = request_stats.set(stats)
+        status_holder = {"status": 500}
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                if QUERY_DEBUG_HEADERS:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-db-queries", str(stats["queries"]).encode()),
+                        (b"x-db-time-ms", f"{stats['db_time'] * 1000:.1f}".encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = _route_label(scope)
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(method=method, route=route, status=status_holder["status"])
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
+            DB_QUERIES_PER_REQUEST.observe(stats["queries"], route=route)
+            DB_TIME_PER_REQUEST.observe(stats["db_time"], route=route)
+            request_stats.reset(token)
@@ -0,0 +1,255 @@
+"""
+Precomputed attendance rollups for the admin analytics.
+
+Two tables summarise the attendance history: weekly totals per teacher,
+subject and class, and each student's running totals per subject. Saving or
+editing attendance recomputes just the rows those sessions feed into, in the
+same transaction; `python -m app.utils.rollups` rebuilds everything (run it
+nightly, or with ROLLUP_ON_WRITE=false instead of the on-write upkeep).
+
+Admin queries read only these tables, so their cost depends on the number of
+students, classes and weeks rather than on the number of attendance records.
+"""
+import os
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+from app.models.models import (
+    Student, Attendance, AttendanceRecord, AttendanceRollup, StudentAttendanceRollup
+)
+
+ROLLUP_ON_WRITE = os.getenv("ROLLUP_ON_WRITE", "true").lower() == "true"
+
+def week_start(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+def _is(column, value):
+    return column.is_(None) if value is None else column == value
+
+def _in(column, values):
+    """`column IN values`, also matching NULL when None is among them."""
+    values = set(values)
+    known = column.in_(values - {None})
+    return or_(known, column.is_(None)) if None in values else known
+
+# ─── Computing ──────────────────────────────────────────────────────────────
+
+def _session_totals(db: Session, *criteria) -> list:
+    """(teacher, subject, class, date, records, present, absent) per session."""
+    return db.execute(
+        select(Attendance.teacher_id, Attendance.subject_id, Attendance.class_id, Attendance.date,
+               func.count(AttendanceRecord.id),
+               func.coalesce(func.sum(case((AttendanceRecord.status == "Present", 1), else_=0)), 0),
+               func.coalesce(func.sum(case((AttendanceRecord.status == "Absent", 1), else_=0)), 0))
+        .outerjoin(AttendanceRecord, AttendanceRecord.attendance_id == Attendance.id)
+        .where(*criteria)
+        .group_by(Attendance.id, Attendance.teacher_id, Attendance.subject_id,
+                  Attendance.class_id, Attendance.date)
+    ).all()
+
+def _week_rows(sessions, keys=None) -> list:
+    weeks = {}
+    for teacher_id, subject_id, class_id, day, records, present, absent in sessions:
+        key = (week_start(day), teacher_id, subject_id, class_id)
+        if keys is not None and key not in keys:
+            continue
+        row = weeks.setdefault(key, {
+            "week_start": key[0], "teacher_id": teacher_id, "subject_id": subject_id,
+            "class_id": class_id, "sessions": 0, "records": 0, "present": 0, "absent": 0
+        })
+        row["sessions"] += 1
+        row["records"] += records
+        row["present"] += present
+        row["absent"] += absent
+    return list(weeks.values())
+
+def _student_rows(db: Session, *criteria) -> list:
+    rows = db.execute(
+        select(AttendanceRecord.student_id, Attendance.subject_id, Student.class_id,
+               func.count(AttendanceRecord.id),
+               func.sum(case((AttendanceRecord.status == "Present", 1), else_=0)))
+        .join(Attendance, AttendanceRecord.attendance_id == Attendance.id)
+        .join(Student, AttendanceRecord.student_id == Student.id)
+        .where(*criteria)
+        .group_by(AttendanceRecord.student_id, Attendance.subject_id, Student.class_id)
+    ).all()
+    return [
+        {"student_id": student_id, "subject_id": subject_id, "class_id": class_id,
+         "records": records, "present": present, "percentage": present * 100.0 / records}
+        for student_id, subject_id, class_id, records, present in rows
+    ]
+
+def session_students(db: Session, attendance_ids) -> set:
+    """Students with records in these sessions; collect them before the records are replaced."""
+    if not attendance_ids:
+        return set()
+    return set(db.scalars(
+        select(AttendanceRecord.student_id).distinct()
+        .where(AttendanceRecord.attendance_id.in_(list(attendance_ids)))
+    ))
+
+def refresh(db: Session, attendance_ids, stale_students=()):
+    """
+    Recompute the rollup rows that the given sessions feed into, inside the
+    caller's transaction: call it after their records are written and before
+    commit. `stale_students` had records in these sessions that were replaced,
+    so their totals are recomputed even if they are no longer listed.
+    """
+    attendance_ids = list(attendance_ids)
+    if not ROLLUP_ON_WRITE or not attendance_ids:
+        return
+    db.flush()
+    sessions = db.execute(
+        select(Attendance.teacher_id, Attendance.subject_id, Attendance.class_id, Attendance.date)
+        .where(Attendance.id.in_(attendance_ids))
+    ).all()
+    keys = {(week_start(d), teacher_id, subject_id, class_id)
+            for teacher_id, subject_id, class_id, d in sessions}
+    teacher_ids = {k[1] for k in keys}
+    subject_ids = {k[2] for k in keys}
+
+    db.execute(delete(AttendanceRollup).where(or_(*[
+        and_(AttendanceRollup.week_start == week, _is(AttendanceRollup.teacher_id, teacher_id),
+             _is(AttendanceRollup.subject_id, subject_id), _is(AttendanceRollup.class_id, class_id))
+        for week, teacher_id, subject_id, class_id in keys
+    ])))
+    first = min(k[0] for k in keys)
+    last = max(k[0] for k in keys) + timedelta(days=6)
+    weeks = _week_rows(_session_totals(
+        db, Attendance.date.between(first, last),
+        _in(Attendance.teacher_id, teacher_ids), _in(Attendance.subject_id, subject_ids)
+    ), keys)
+    if weeks:
+        db.execute(insert(AttendanceRollup), weeks)
+
+    student_ids = session_students(db, attendance_ids) | set(stale_students)
+    if student_ids:
+        db.execute(delete(StudentAttendanceRollup).where(
+            StudentAttendanceRollup.student_id.in_(student_ids),
+            _in(StudentAttendanceRollup.subject_id, subject_ids)
+        ))
+        students = _student_rows(db, AttendanceRecord.student_id.in_(student_ids),
+                                 _in(Attendance.subject_id, subject_ids))
+        if students:
+            db.execute(insert(StudentAttendanceRollup), students)
+
+def rebuild(db: Session) -> dict:
+    """Recompute every rollup from the attendance history and commit."""
+    db.execute(delete(AttendanceRollup))
+    db.execute(delete(StudentAttendanceRollup))
+    weeks = _week_rows(_session_totals(db))
+    students = _student_rows(db)
+    if weeks:
+        db.execute(insert(AttendanceRollup), weeks)
+    if students:
+        db.execute(insert(StudentAttendanceRollup), students)
+    db.commit()
+    return {"weekly_rows": len(weeks), "student_rows": len(students)}
+
+def ensure_built(db: Session):
+    """Build the rollups once for a database that has attendance but none yet
+    (first start after upgrading)."""
+    if db.scalar(select(AttendanceRollup.id).limit(1)) is None and \
+            db.scalar(select(Attendance.id).limit(1)) is not None:
+        rebuild(db)
+
+# ─── Queries ────────────────────────────────────────────────────────────────
+
+DIMENSIONS = {
+    "class": AttendanceRollup.class_id,
+    "subject": AttendanceRollup.subject_id,
+    "teacher": AttendanceRollup.teacher_id,
+    "week": AttendanceRollup.week_start,
+}
+
+def summary(db: Session, group_by: str, date_from: date = None, date_to: date = None) -> list:
+    """Totals and attendance rate per class, subject, teacher or week. Date
+    bounds are applied at week granularity."""
+    column = DIMENSIONS[group_by]
+    query = (
+        select(column, func.sum(AttendanceRollup.sessions), func.sum(AttendanceRollup.records),
+               func.sum(AttendanceRollup.present), func.sum(AttendanceRollup.absent))
+        .group_by(column).order_by(column)
+    )
+    if date_from:
+        query = query.where(AttendanceRollup.week_start >= week_start(date_from))
+    if date_to:
+        query = query.where(AttendanceRollup.week_start <= date_to)
+    return [
+        {"key": key, "sessions": int(sessions), "records": int(records),
+         "present": int(present), "absent": int(absent),
+         "attendance_percentage": round(present * 100.0 / records, 1) if records else 0}
+        for key, sessions, records, present, absent in db.execute(query)
+    ]
+
+def student_scope(per: str = "subject", subject_id: int = None, class_id: int = None):
+    """Per-student attendance rows (student, subject, class, present, records,
+    percentage): one per subject, or with per="student" one per student
+    across all their subjects."""
+    r = StudentAttendanceRollup
+    criteria = []
+    if subject_id:
+        criteria.append(r.subject_id == subject_id)
+    if class_id:
+        criteria.append(r.class_id == class_id)
+    if per == "subject":
+        return select(r.student_id, r.subject_id, r.class_id, r.present, r.records,
+                      r.percentage).where(*criteria).subquery()
+    return (
+        select(r.student_id, literal(None).label("subject_id"), r.class_id,
+               func.sum(r.present).label("present"), func.sum(r.records).label("records"),
+               (func.sum(r.present) * 100.0 / func.sum(r.records)).label("percentage"))
+        .where(*criteria)
+        .group_by(r.student_id, r.class_id)
+        .subquery()
+    )
+
+def distribution(db: Session, scope, threshold: float, percentiles) -> dict:
+    """
+    Summary statistics of the students' percentages. The database returns
+    a histogram of 0.1-point buckets (at most 1001 rows) rather than every
+    student, and the percentiles are interpolated from its cumulative counts.
+    """
+    count, mean, below = db.execute(select(
+        func.count(), func.avg(scope.c.percentage),
+        func.coalesce(func.sum(case((scope.c.percentage < threshold, 1), else_=0)), 0)
+    ).select_from(scope)).one()
+    bucket = func.round(scope.c.percentage, 1)
+    histogram = db.execute(select(bucket, func.count()).group_by(bucket).order_by(bucket)).all()
+    points = []
+    if count:
+        values = np.array([float(value) for value, _ in histogram])
+        ends = np.cumsum([n for _, n in histogram])
+        for p in percentiles:
+            # Linear interpolation between the closest ranks, as np.percentile does
+            rank = p / 100 * (count - 1)
+            lower, upper = values[np.searchsorted(ends, [np.floor(rank), np.ceil(rank)], side="right")]
+            points.append(lower + (upper - lower) * (rank - np.floor(rank)))
+    return {
+        "count": count,
+        "mean": round(float(mean), 1) if count else None,
+        "percentiles": {f"p{p:g}": round(float(v), 1) for p, v in zip(percentiles, points)},
+        "threshold": threshold,
+        "below_threshold": int(below),
+    }
+
+def below_threshold(db: Session, scope, threshold: float, limit: int, offset: int):
+    """(total, rows) of students under `threshold`, lowest first."""
+    total = db.scalar(select(func.count()).select_from(scope).where(scope.c.percentage < threshold))
+    rows = db.execute(
+        select(scope, Student.name, Student.roll_number)
+        .join(Student, Student.id == scope.c.student_id)
+        .where(scope.c.percentage < threshold)
+        .order_by(scope.c.percentage, scope.c.student_id)
+        .limit(limit).offset(offset)
+    ).mappings().all()
+    return total, rows
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        print(rebuild(db))
+    finally:
+        db.close()
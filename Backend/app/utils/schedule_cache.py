@@ -0,0 +1,65 @@
+import os
+import time
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from app.models.models import Schedule
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+SCHEDULE_CACHE_TTL = int(os.getenv("SCHEDULE_CACHE_TTL", 600))
+# Touched on every invalidation so other workers drop their copies too
+SCHEDULE_CACHE_STAMP = os.getenv("SCHEDULE_CACHE_STAMP", os.path.join(BASE_DIR, "data", "schedule_cache.stamp"))
+
+# teacher_id -> (expires_at, stamp, entries)
+_cache = {}
+
+def _stamp() -> int:
+    try:
+        return os.stat(SCHEDULE_CACHE_STAMP).st_mtime_ns
+    except OSError:
+        return 0
+
+def invalidate(teacher_ids=None):
+    """Forget cached schedules for `teacher_ids` (all teachers when None), in
+    this worker and, via the stamp file, in every other worker."""
+    if teacher_ids is None:
+        _cache.clear()
+    else:
+        for teacher_id in teacher_ids:
+            _cache.pop(int(teacher_id), None)
+    os.makedirs(os.path.dirname(SCHEDULE_CACHE_STAMP), exist_ok=True)
+    with open(SCHEDULE_CACHE_STAMP, "a"):
+        os.utime(SCHEDULE_CACHE_STAMP)
+
+def _entry(s: Schedule) -> dict:
+    return {
+        "id": s.id,
+        "day": s.day,
+        "time_start": str(s.time_start) if s.time_start else None,
+        "time_end": str(s.time_end) if s.time_end else None,
+        "subject": s.subject.name if s.subject else "",
+        "subject_id": s.subject_id,
+        "class_name": s.class_section.name if s.class_section else "",
+        "section": s.class_section.section if s.class_section else "",
+        "class_id": s.class_id
+    }
+
+async def get_schedule_view(db: AsyncSession, teacher_id: int) -> list:
+    """
+    A teacher's schedule with subject and class names resolved, cached per
+    teacher. Schedules only change through the admin schedule uploads and
+    teacher deletion, which call `invalidate`; the TTL is a backstop.
+    """
+    stamp = _stamp()
+    cached = _cache.get(teacher_id)
+    if cached and cached[0] > time.monotonic() and cached[1] == stamp:
+        return cached[2]
+
+    result = await db.scalars(
+        select(Schedule)
+        .options(joinedload(Schedule.subject), joinedload(Schedule.class_section))
+        .where(Schedule.teacher_id == teacher_id)
+    )
+    entries = [_entry(s) for s in result.all()]
+    _cache[teacher_id] = (time.monotonic() + SCHEDULE_CACHE_TTL, stamp, entries)
+    return entries
@@ -0,0 +1,195 @@
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from datetime import time as dt_time
+from app.models.models import Subject, ClassSection, Schedule
+import io, random
+import pandas as pd
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DAY_LOOKUP = {d[:3].lower(): d for d in DAY_NAMES}
+
+# ─── File Reading ───────────────────────────────────────────────────────────
+
+def read_schedule_file(path: str, suffix: str) -> pd.DataFrame:
+    """Load an Excel, CSV or PDF timetable into a DataFrame with normalized column names."""
+    if suffix in ['.xlsx', '.xls']:
+        df = pd.read_excel(path)
+    elif suffix == '.csv':
+        df = pd.read_csv(path)
+    elif suffix == '.pdf':
+        # Use PyMuPDF to extract tables from PDF
+        import fitz
+        doc = fitz.open(path)
+        all_text = ""
+        for page in doc:
+            all_text += page.get_text()
+        doc.close()
+        # Try to parse as CSV-like text
+        lines = [l.strip() for l in all_text.strip().split('\n') if l.strip()]
+        if len(lines) < 2:
+            raise HTTPException(status_code=400, detail="Could not parse PDF schedule")
+        # Try tab or comma separated
+        sep = '\t' if '\t' in lines[0] else ','
+        df = pd.read_csv(io.StringIO('\n'.join(lines)), sep=sep)
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported file format. Use Excel, CSV, or PDF.")
+
+    df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
+    return df
+
+# ─── Vectorized Parsing ─────────────────────────────────────────────────────
+
+def _text(df: pd.DataFrame, *columns) -> pd.Series:
+    """First present column as stripped strings, with missing values as ''."""
+    for col in columns:
+        if col in df.columns:
+            values = df[col].astype(object).fillna('').astype(str).str.strip()
+            return values.replace({'nan': '', 'None': '', 'NaT': ''})
+    return pd.Series('', index=df.index)
+
+def _parse_times(values: pd.Series) -> pd.Series:
+    parts = values.str.extract(r'^\s*(\d{1,2})\s*:\s*(\d{2})')
+    hours = pd.to_numeric(parts[0], errors='coerce')
+    minutes = pd.to_numeric(parts[1], errors='coerce')
+    valid = hours.between(0, 23) & minutes.between(0, 59)
+    result = pd.Series(None, index=values.index, dtype=object)
+    result[valid] = [dt_time(int(h), int(m)) for h, m in zip(hours[valid], minutes[valid])]
+    return result
+
+def parse_schedule_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize a raw timetable into columns day, subject, class_name, section,
+    time_start, time_end (and teacher, when the file has that column).
+
+    Days accept any spelling starting with the weekday's first three letters,
+    times accept "9:00-10:00" ranges or separate time_start/time_end columns,
+    and classes like "10-A" are split into name and section. Rows without a
+    valid day or subject are dropped.
+    """
+    required = {'day', 'subject'}
+    if not required.issubset(set(df.columns)):
+        raise HTTPException(
+            status_code=400,
+            detail=f"File must contain columns: day, subject. Found: {list(df.columns)}"
+        )
+
+    columns = ['day', 'subject', 'time_start', 'time_end', 'class_name', 'section']
+    if 'teacher' in df.columns:
+        columns.append('teacher')
+    if df.empty:
+        # str.split(expand=True) yields no columns at all for an empty frame
+        return pd.DataFrame(columns=columns, dtype=object)
+
+    out = pd.DataFrame(index=df.index)
+    out['day'] = _text(df, 'day').str[:3].str.lower().map(DAY_LOOKUP)
+    out['subject'] = _text(df, 'subject')
+
+    time_range = _text(df, 'time', 'time_start').str.split('-', n=1, expand=True)
+    start = time_range[0]
+    end = _text(df, 'time_end')
+    if time_range.shape[1] > 1:
+        end = time_range[1].fillna('').str.strip().where(time_range[1].notna(), end)
+    out['time_start'] = _parse_times(start)
+    out['time_end'] = _parse_times(end)
+
+    class_parts = _text(df, 'class', 'class_section', 'section').str.split('-', n=1, expand=True)
+    out['class_name'] = class_parts[0].fillna('').str.strip()
+    if class_parts.shape[1] > 1:
+        out['section'] = class_parts[1].fillna('').str.strip()
+    else:
+        out['section'] = ''
+
+    if 'teacher' in df.columns:
+        out['teacher'] = _text(df, 'teacher')
+
+    return out[out['day'].notna() & (out['subject'] != '')]
+
+# ─── Bulk Lookups ───────────────────────────────────────────────────────────
+
+def _key(value) -> str:
+    """Lookup key for a subject or class name: timetables vary in case and spacing."""
+    return str(value or '').strip().casefold()
+
+def resolve_subjects(db: Session, names) -> dict:
+    """Map subject names to ids, creating the missing ones with one flush."""
+    names = {n for n in names if _key(n)}
+    if not names:
+        return {}
+    # Keys are normalized in Python, so read the (small) subjects table whole
+    ids = {}
+    for subject_id, name in db.query(Subject.id, Subject.name).order_by(Subject.id):
+        ids.setdefault(_key(name), subject_id)
+    missing = {}
+    for name in sorted(names):
+        if _key(name) not in ids:
+            missing.setdefault(_key(name), name.strip())
+    if missing:
+        used_codes = {c for (c,) in db.query(Subject.code).all()}
+        new_subjects = {}
+        for key, name in missing.items():
+            code = name[:3].upper() + str(random.randint(100, 999))
+            while code in used_codes:
+                code = code + str(random.randint(10, 99))
+            used_codes.add(code)
+            subj = Subject(name=name, code=code)
+            db.add(subj)
+            new_subjects[key] = subj
+        db.flush()
+        ids.update({key: subj.id for key, subj in new_subjects.items()})
+    return {name: ids[_key(name)] for name in names}
+
+def resolve_classes(db: Session, pairs) -> dict:
+    """
+    Map (class name, section) pairs to class ids, creating the missing ones.
+    An empty section matches any existing class with that name, as
+    `get_or_create_class` does.
+    """
+    pairs = {(n, s or '') for n, s in pairs if _key(n)}
+    if not pairs:
+        return {}
+    by_pair, by_name = {}, {}
+    for c in db.query(ClassSection).order_by(ClassSection.id):
+        by_pair.setdefault((_key(c.name), _key(c.section)), c.id)
+        by_name.setdefault(_key(c.name), c.id)
+
+    found, new_classes = {}, {}
+    for name, section in sorted(pairs):
+        key = (_key(name), _key(section))
+        class_id = by_pair.get(key) if key[1] else by_name.get(key[0])
+        if class_id:
+            found[(name, section)] = class_id
+        elif key in new_classes:
+            new_classes[key][1].append((name, section))
+        else:
+            cls = ClassSection(name=name.strip(), section=section.strip() or None)
+            db.add(cls)
+            new_classes[key] = (cls, [(name, section)])
+    if new_classes:
+        db.flush()
+        found.update({pair: cls.id for cls, spellings in new_classes.values() for pair in spellings})
+    return found
+
+def insert_schedules(db: Session, parsed: pd.DataFrame, teacher_ids: pd.Series) -> int:
+    """Bulk-insert parsed schedule rows for the given per-row teacher ids."""
+    if parsed.empty:
+        return 0
+    subject_ids = resolve_subjects(db, parsed['subject'].unique())
+    class_ids = resolve_classes(db, zip(parsed['class_name'], parsed['section']))
+
+    rows = [
+        {
+            "teacher_id": int(teacher_id),
+            "subject_id": subject_ids.get(subject),
+            "class_id": class_ids.get((class_name, section)) if class_name else None,
+            "day": day,
+            "time_start": start if isinstance(start, dt_time) else None,
+            "time_end": end if isinstance(end, dt_time) else None,
+        }
+        for teacher_id, subject, class_name, section, day, start, end in zip(
+            teacher_ids, parsed['subject'], parsed['class_name'], parsed['section'],
+            parsed['day'], parsed['time_start'], parsed['time_end']
+        )
+    ]
+    db.execute(insert(Schedule), rows)
+    return len(rows)
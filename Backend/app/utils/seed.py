@@ -1,6 +1,8 @@
-from app.database import SessionLocal
+from app.database import Base, SessionLocal, engine
+from app.models import models
 from app.models.models import User
 from app.utils.auth import hash_password
+from app.utils.rollups import ensure_built
 
 def seed_admin():
     db = SessionLocal()
@@ -14,4 +16,18 @@ def seed_admin():
         db.add(admin)
         db.commit()
         print("✅ Admin seeded successfully")
-    db.close()
\ No newline at end of file
+    db.close()
+
+def init_db():
+    """Create missing tables and the default admin. Idempotent, so it can run
+    once per deployment (`python -m app.utils.seed`) instead of per worker."""
+    Base.metadata.create_all(bind=engine)
+    seed_admin()
+    db = SessionLocal()
+    try:
+        ensure_built(db)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    init_db()
\ No newline at end of file
@@ -0,0 +1,23 @@
+from fastapi.staticfiles import StaticFiles
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with Cache-Control headers. Paths under one of the
+    `immutable_prefixes` are versioned by the API (`?v=`) and cached for a
+    year; everything else keeps a short max-age. Starlette already adds
+    ETag / Last-Modified and answers conditional requests with 304.
+    """
+
+    def __init__(self, *args, immutable_prefixes=(), max_age: int = 3600, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_prefixes = tuple(immutable_prefixes)
+        self.max_age = max_age
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        path = self.get_path(scope)
+        if path.startswith(self.immutable_prefixes):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={self.max_age}"
+        return response
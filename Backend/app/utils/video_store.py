@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Kept outside of /uploads so retained lecture videos are never served statically
+VIDEO_STORE_DIR = os.getenv("VIDEO_STORE_DIR", os.path.join(BASE_DIR, "data", "videos"))
+VIDEO_RETENTION_ENABLED = os.getenv("VIDEO_RETENTION_ENABLED", "false").lower() == "true"
+VIDEO_RETENTION_TTL_HOURS = float(os.getenv("VIDEO_RETENTION_TTL_HOURS", 72))
+VIDEO_RETENTION_MAX_BYTES = int(float(os.getenv("VIDEO_RETENTION_MAX_GB", 20)) * 1024 ** 3)
+
+def _meta_path(video_id: str) -> str:
+    return os.path.join(VIDEO_STORE_DIR, f"{video_id}.json")
+
+def _read_meta(video_id: str):
+    try:
+        with open(_meta_path(video_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def retain(tmp_path: str, teacher_id: int, filename: str, content_hash: str = None) -> str:
+    """
+    Move a processed upload into the store and return its id, or return None
+    (leaving the file untouched) when retention is disabled.
+    """
+    if not VIDEO_RETENTION_ENABLED:
+        return None
+    os.makedirs(VIDEO_STORE_DIR, exist_ok=True)
+    video_id = uuid.uuid4().hex
+    ext = os.path.splitext(filename)[1].lower()
+    dest = os.path.join(VIDEO_STORE_DIR, f"{video_id}{ext}")
+    shutil.move(tmp_path, dest)
+    meta = {
+        "video_id": video_id,
+        "teacher_id": teacher_id,
+        "filename": filename,
+        "path": dest,
+        "size": os.path.getsize(dest),
+        "content_hash": content_hash,
+        "created_at": time.time(),
+    }
+    with open(_meta_path(video_id), "w") as f:
+        json.dump(meta, f)
+    return video_id
+
+def _expired(video_id: str) -> bool:
+    try:
+        last_used = os.path.getmtime(_meta_path(video_id))
+    except OSError:
+        return True
+    return last_used < time.time() - VIDEO_RETENTION_TTL_HOURS * 3600
+
+def get(video_id: str, teacher_id: int):
+    """Return the metadata (path, content hash, ...) of a teacher's stored
+    video and mark it recently used. Videos unused for longer than the TTL
+    are removed here too, since eviction only runs after new uploads."""
+    if not video_id.isalnum():
+        return None
+    meta = _read_meta(video_id)
+    if not meta or meta["teacher_id"] != teacher_id or not os.path.exists(meta["path"]):
+        return None
+    if _expired(video_id):
+        remove(video_id)
+        return None
+    # The metadata file's mtime doubles as the LRU timestamp
+    os.utime(_meta_path(video_id))
+    return meta
+
+def remove(video_id: str):
+    meta = _read_meta(video_id)
+    if meta:
+        try:
+            os.unlink(meta["path"])
+        except OSError:
+            pass
+    try:
+        os.unlink(_meta_path(video_id))
+    except OSError:
+        pass
+
+def evict():
+    """Drop videos unused for longer than the TTL, then the least recently used
+    ones until the store fits under the size cap. Safe to run in the background."""
+    if not os.path.isdir(VIDEO_STORE_DIR):
+        return
+    entries = []
+    for name in os.listdir(VIDEO_STORE_DIR):
+        if not name.endswith(".json"):
+            continue
+        video_id = name[:-5]
+        meta = _read_meta(video_id)
+        if not meta:
+            continue
+        try:
+            last_used = os.path.getmtime(_meta_path(video_id))
+        except OSError:
+            continue
+        entries.append((last_used, meta.get("size", 0), video_id))
+
+    cutoff = time.time() - VIDEO_RETENTION_TTL_HOURS * 3600
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for last_used, size, video_id in entries:
+        if last_used >= cutoff and total <= VIDEO_RETENTION_MAX_BYTES:
+            break
+        remove(video_id)
+        total -= size
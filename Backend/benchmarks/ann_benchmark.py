@@ -0,0 +1,97 @@
+"""
+Recall-vs-latency benchmark for the IVF face index against the exact scan.
+
+Generates a synthetic gallery of 128-d encodings (one per student) and
+queries that are noisy copies of known students, then reports recall@1 and
+per-query latency for a range of n_probe settings. Queries are matched in
+batches of --faces-per-frame, as video recognition does; the exact baseline
+is the production batched scan (face_service._nearest).
+
+    cd Backend
+    python -m benchmarks.ann_benchmark --students 20000 --queries 500
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+# face_service pulls in the DB layer; nothing connects, so any URL will do
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+from app.ai.ann_index import IVFIndex
+from app.ai.face_service import _nearest
+
+def synthetic_gallery(n_students: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # dlib encodings are roughly zero-centred with per-dimension spread ~0.09
+    gallery = rng.normal(0.0, 0.09, size=(n_students, 128))
+    labels = np.arange(1, n_students + 1)
+    return gallery, labels
+
+def noisy_queries(gallery, labels, n_queries: int, noise: float, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(gallery), n_queries, replace=len(gallery) < n_queries)
+    queries = gallery[picks] + rng.normal(0.0, noise, size=(n_queries, 128))
+    return queries, labels[picks]
+
+def batches(queries, size: int):
+    for start in range(0, len(queries), size):
+        yield queries[start:start + size]
+
+def exact_search(gallery, labels, queries, faces_per_frame: int):
+    gallery_sq = (gallery ** 2).sum(axis=1)
+    found = [_nearest(gallery, gallery_sq, labels, batch)[1] for batch in batches(queries, faces_per_frame)]
+    return np.concatenate(found)
+
+def run(n_students: int, n_queries: int, noise: float, probes: list, faces_per_frame: int):
+    gallery, labels = synthetic_gallery(n_students)
+    queries, truth = noisy_queries(gallery, labels, n_queries, noise)
+
+    exact_search(gallery, labels, queries[:faces_per_frame], faces_per_frame)  # warm-up
+    t0 = time.perf_counter()
+    exact_labels = exact_search(gallery, labels, queries, faces_per_frame)
+    exact_ms = (time.perf_counter() - t0) * 1000 / n_queries
+    results = [{
+        "method": "exact",
+        "students": n_students,
+        "recall_at_1": float((exact_labels == truth).mean()),
+        "ms_per_query": round(exact_ms, 4),
+    }]
+
+    t0 = time.perf_counter()
+    index = IVFIndex().build(gallery, labels)
+    build_s = time.perf_counter() - t0
+
+    for n_probe in probes:
+        t0 = time.perf_counter()
+        ann_labels = np.concatenate([index.search(batch, n_probe=n_probe)[1]
+                                     for batch in batches(queries, faces_per_frame)])
+        ann_ms = (time.perf_counter() - t0) * 1000 / n_queries
+        results.append({
+            "method": "ivf",
+            "students": n_students,
+            "n_lists": index.n_lists,
+            "n_probe": n_probe,
+            "build_seconds": round(build_s, 3),
+            "recall_at_1": float((ann_labels == truth).mean()),
+            "recall_vs_exact": float((ann_labels == exact_labels).mean()),
+            "ms_per_query": round(ann_ms, 4),
+            "speedup": round(exact_ms / ann_ms, 2) if ann_ms else None,
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--faces-per-frame", type=int, default=8)
+    args = parser.parse_args()
+
+    for n in args.students:
+        for row in run(n, args.queries, args.noise, args.probes, args.faces_per_frame):
+            print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Reproducible benchmarks for the recognition, analytics and import hot paths.
+
+Everything runs against a throwaway SQLite database filled with synthetic
+data (random 128-d encodings, attendance histories, generated videos), so no
+MySQL server or real photos are needed. Results are printed and optionally
+written as JSON; pass a previous run as --baseline to flag regressions.
+
+    cd Backend
+    python -m benchmarks.run_benchmarks --students 300 --sessions 60 --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench.json
+
+The process_video benchmark needs face_recognition (dlib) and is reported as
+skipped when it is not installed.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+def prepare_environment(workdir: str):
+    """Point the app at a scratch SQLite DB and data dirs; must run before importing `app`."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["FACE_GALLERY_DIR"] = os.path.join(workdir, "gallery")
+    os.environ["FACE_RESULT_CACHE_ENABLED"] = "false"
+    os.environ["FACE_ANN_PATH"] = os.path.join(workdir, "face_index.npz")
+    os.environ["VIDEO_RETENTION_ENABLED"] = "false"
+    os.environ["SCHEDULE_CACHE_STAMP"] = os.path.join(workdir, "schedule_cache.stamp")
+
+class QueryCounter:
+    """Counts SQL statements executed on the given engines while active."""
+
+    def __init__(self, *engines):
+        self.engines = engines
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._on_execute)
+
+def result(name: str, value: float, unit: str, lower_is_better: bool = True, **params) -> dict:
+    return {"name": name, "value": round(value, 6), "unit": unit,
+            "lower_is_better": lower_is_better, **params}
+
+# ─── Synthetic Data ─────────────────────────────────────────────────────────
+
+def random_encodings(rng, n: int):
+    # dlib encodings are roughly zero-centred with per-dimension spread ~0.09
+    return rng.normal(0.0, 0.09, size=(n, 128))
+
+def seed_school(db, rng, n_students: int, n_sessions: int, teacher_id: int):
+    """Insert subjects, classes, students (with encodings) and an attendance history."""
+    from sqlalchemy import insert
+    from app.models.models import (
+        Subject, ClassSection, Schedule, Student, StudentSubject, FaceEncoding,
+        Attendance, AttendanceRecord
+    )
+
+    n_subjects, n_classes = 8, 10
+    db.execute(insert(Subject), [{"id": i + 1, "name": f"Subject {i + 1}", "code": f"SUB{i + 1}"}
+                                 for i in range(n_subjects)])
+    db.execute(insert(ClassSection), [{"id": i + 1, "name": str(6 + i // 2), "section": "AB"[i % 2]}
+                                      for i in range(n_classes)])
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    db.execute(insert(Schedule), [
+        {"teacher_id": teacher_id, "subject_id": s % 4 + 1, "class_id": s % n_classes + 1,
+         "day": days[s % 5], "time_start": datetime.time(8 + s % 6), "time_end": datetime.time(9 + s % 6)}
+        for s in range(20)
+    ])
+
+    db.execute(insert(Student), [
+        {"id": i + 1, "name": f"Student {i + 1}", "roll_number": f"BENCH{i + 1:05d}",
+         "class_id": i % n_classes + 1}
+        for i in range(n_students)
+    ])
+    enrolments = {}
+    rows = []
+    for i in range(n_students):
+        for subject_id in rng.choice(n_subjects, size=4, replace=False) + 1:
+            enrolments.setdefault(int(subject_id), []).append(i + 1)
+            rows.append({"student_id": i + 1, "subject_id": int(subject_id)})
+    db.execute(insert(StudentSubject), rows)
+    db.execute(insert(FaceEncoding), [
+        {"student_id": i + 1, "encoding": json.dumps(enc.tolist())}
+        for i, enc in enumerate(random_encodings(rng, n_students))
+    ])
+
+    start = datetime.date(2025, 7, 1)
+    for s in range(n_sessions):
+        subject_id = s % 4 + 1
+        class_id = s % n_classes + 1
+        att = Attendance(teacher_id=teacher_id, subject_id=subject_id, class_id=class_id,
+                         date=start + datetime.timedelta(days=s // 4), time_start=datetime.time(8 + s % 4))
+        db.add(att)
+        db.flush()
+        students = [sid for sid in enrolments.get(subject_id, []) if (sid - 1) % n_classes + 1 == class_id]
+        if students:
+            db.execute(insert(AttendanceRecord), [
+                {"attendance_id": att.id, "student_id": sid,
+                 "status": "Present" if rng.random() < 0.8 else "Absent", "marked_by_ai": False}
+                for sid in students
+            ])
+    db.commit()
+    # Bulk inserts bypass the on-write upkeep, as a restore or migration would
+    from app.utils.rollups import rebuild
+    rebuild(db)
+
+def synthetic_video(path: str, n_frames: int, size=(640, 480)):
+    import cv2
+    import numpy as np
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, size=(size[1], size[0], 3), dtype=np.uint8)
+    for i in range(n_frames):
+        writer.write(np.roll(base, i * 4, axis=1))
+    writer.release()
+
+# ─── Benchmarks ─────────────────────────────────────────────────────────────
+
+def time_request(client, engines, method: str, url: str, repeats: int, **kwargs):
+    latencies = []
+    queries = 0
+    for _ in range(repeats):
+        with QueryCounter(*engines) as qc:
+            t0 = time.perf_counter()
+            response = client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+        response.raise_for_status()
+        queries = qc.count
+    latencies.sort()
+    return latencies[len(latencies) // 2], queries, len(response.content)
+
+def bench_endpoints(client, engines, admin_headers, teacher_headers, repeats: int):
+    out = []
+    for name, url, headers in [
+        ("admin_students", "/admin/students", admin_headers),
+        ("admin_teachers", "/admin/teachers", admin_headers),
+        ("teacher_dashboard", "/teacher/dashboard", teacher_headers),
+        ("teacher_records", "/teacher/attendance/records", teacher_headers),
+        ("teacher_analytics", "/teacher/analytics", teacher_headers),
+        ("teacher_heatmap", "/teacher/analytics/heatmap?subject_id=1", teacher_headers),
+        ("admin_analytics_summary", "/admin/analytics/summary?group_by=week", admin_headers),
+        ("admin_analytics_distribution", "/admin/analytics/distribution", admin_headers),
+        ("admin_analytics_low", "/admin/analytics/low-attendance", admin_headers),
+    ]:
+        median, queries, size = time_request(client, engines, "GET", url, repeats, headers=headers)
+        out.append(result(f"{name}_latency", median * 1000, "ms"))
+        out.append(result(f"{name}_queries", queries, "queries", response_bytes=size))
+    return out
+
+def bench_imports(client, admin_headers, teacher_headers, n_rows: int):
+    out = []
+
+    roster = io.StringIO()
+    roster.write("name,roll_number,class,section,subjects\n")
+    for i in range(n_rows):
+        roster.write(f"Import {i},IMP{i:05d},{6 + i % 5},{'AB'[i % 2]},\"Subject 1,Subject {2 + i % 7}\"\n")
+    t0 = time.perf_counter()
+    r = client.post("/admin/students/upload", headers=admin_headers,
+                    files={"file": ("students.csv", roster.getvalue().encode(), "text/csv")})
+    r.raise_for_status()
+    out.append(result("student_import_rows_per_second", n_rows / (time.perf_counter() - t0),
+                      "rows/s", lower_is_better=False, rows=n_rows))
+
+    schedule = io.StringIO()
+    schedule.write("teacher,day,time,subject,class\n")
+    days = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+    for i in range(n_rows):
+        schedule.write(f"Bench Teacher,{days[i % 5]},{8 + i % 8}:00-{9 + i % 8}:00,Subject {1 + i % 8},{6 + i % 5}-{'AB'[i % 2]}\n")
+    t0 = time.perf_counter()
+    r = client.post("/admin/schedules/upload", headers=admin_headers,
+                    files={"file": ("schedule.csv", schedule.getvalue().encode(), "text/csv")})
+    r.raise_for_status()
+    out.append(result("schedule_import_rows_per_second", n_rows / (time.perf_counter() - t0),
+                      "rows/s", lower_is_better=False, rows=n_rows))
+
+    sessions = [
+        {"subject_id": 1 + s % 4, "class_id": 1 + s % 10, "date": f"2026-03-{1 + s % 28:02d}",
+         "records": [{"student_id": sid, "status": "Present"} for sid in range(1, 41)]}
+        for s in range(50)
+    ]
+    t0 = time.perf_counter()
+    r = client.post("/teacher/attendance/batch", headers=teacher_headers, json={"sessions": sessions})
+    r.raise_for_status()
+    out.append(result("attendance_batch_sessions_per_second", len(sessions) / (time.perf_counter() - t0),
+                      "sessions/s", lower_is_better=False, batch_sessions=len(sessions)))
+    return out
+
+def bench_gallery(db, rng, sizes):
+    from sqlalchemy import insert, func
+    from app.models.models import FaceEncoding
+    from app.ai import face_service
+    from app.ai.gallery import get_gallery
+
+    out = []
+    for size in sorted(sizes):
+        current = db.query(func.count(FaceEncoding.id)).scalar()
+        if size > current:
+            db.execute(insert(FaceEncoding), [
+                {"student_id": 100000 + i, "encoding": json.dumps(enc.tolist())}
+                for i, enc in enumerate(random_encodings(rng, size - current), start=current)
+            ])
+            db.commit()
+
+        t0 = time.perf_counter()
+        gallery = get_gallery(db)
+        out.append(result("gallery_refresh_seconds", time.perf_counter() - t0, "s", gallery_size=len(gallery)))
+
+        faces = gallery.encodings[rng.choice(len(gallery), 8)] + rng.normal(0, 0.01, size=(8, 128))
+        for ann in (False, True):
+            face_service.FACE_ANN_ENABLED = ann
+            face_service.FACE_ANN_MIN_GALLERY = 0
+            match = face_service.build_matcher(db)
+            match(faces)  # warm-up (and index build for ANN)
+            repeats = 50
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                match(faces)
+            per_frame = (time.perf_counter() - t0) / repeats
+            out.append(result("gallery_match_ms_per_frame", per_frame * 1000, "ms",
+                              gallery_size=len(gallery), faces=8, method="ivf" if ann else "exact"))
+        face_service.FACE_ANN_ENABLED = False
+    return out
+
+def bench_process_video(db, workdir: str, n_frames: int, frame_interval: int):
+    try:
+        import face_recognition  # noqa: F401
+    except ImportError:
+        return [{"name": "process_video_fps", "skipped": "face_recognition not installed"}]
+    from app.ai.face_service import process_video
+
+    path = os.path.join(workdir, "bench.avi")
+    synthetic_video(path, n_frames)
+    timings = {}
+    t0 = time.perf_counter()
+    process_video(path, db, frame_interval=frame_interval, timings=timings)
+    elapsed = time.perf_counter() - t0
+    out = [
+        result("process_video_fps", n_frames / elapsed, "frames/s", lower_is_better=False,
+               frames=n_frames, frame_interval=frame_interval),
+    ]
+    for stage, seconds in timings.get("stage_seconds", {}).items():
+        out.append(result(f"process_video_{stage}_seconds", seconds, "s", frames=n_frames))
+    return out
+
+# ─── Reporting ──────────────────────────────────────────────────────────────
+
+def _key(r: dict) -> tuple:
+    params = tuple(sorted((k, v) for k, v in r.items()
+                          if k not in ("value", "unit", "lower_is_better", "response_bytes")))
+    return params
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """Return the results that got worse than the baseline by more than `threshold`."""
+    previous = {_key(r): r for r in baseline.get("results", []) if "value" in r}
+    regressions = []
+    for r in results:
+        old = previous.get(_key(r))
+        if "value" not in r or not old or not old["value"]:
+            continue
+        change = (r["value"] - old["value"]) / abs(old["value"])
+        worse = change > threshold if r["lower_is_better"] else change < -threshold
+        r["baseline"] = old["value"]
+        r["change"] = round(change, 4)
+        if worse:
+            regressions.append(r)
+    return regressions
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--import-rows", type=int, default=500)
+    parser.add_argument("--video-frames", type=int, default=300)
+    parser.add_argument("--frame-interval", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="+", choices=["endpoints", "imports", "gallery", "video"])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="previous JSON output to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change treated as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attendai-bench-")
+    prepare_environment(workdir)
+
+    import numpy as np
+    from fastapi.testclient import TestClient
+    from app.database import SessionLocal, engine, async_engine
+    from app.main import app
+
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+    only = set(args.only or ["endpoints", "imports", "gallery", "video"])
+    results = []
+
+    with TestClient(app) as client:
+        login = client.post("/auth/login", json={"username": "admin@classroom.com", "password": "Admin123"})
+        admin_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        creds = client.post("/admin/teachers", json={"name": "Bench Teacher"}, headers=admin_headers).json()
+        login = client.post("/auth/login", json={"username": creds["username"], "password": creds["password"]})
+        teacher_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        db = SessionLocal()
+        t0 = time.perf_counter()
+        seed_school(db, rng, args.students, args.sessions, creds["teacher_id"])
+        print(f"seeded {args.students} students / {args.sessions} sessions in "
+              f"{time.perf_counter() - t0:.1f}s ({workdir})", file=sys.stderr)
+
+        if "endpoints" in only:
+            engines = (engine, async_engine.sync_engine)
+            results += bench_endpoints(client, engines, admin_headers, teacher_headers, args.repeats)
+        if "imports" in only:
+            results += bench_imports(client, admin_headers, teacher_headers, args.import_rows)
+        if "gallery" in only:
+            results += bench_gallery(db, rng, args.gallery_sizes)
+        if "video" in only:
+            results += bench_process_video(db, workdir, args.video_frames, args.frame_interval)
+        db.close()
+
+    for r in results:
+        r.setdefault("students", args.students)
+        r.setdefault("sessions", args.sessions)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+        "regressions": [r["name"] for r in regressions],
+    }
+    for r in results:
+        print(json.dumps(r))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: "
+              + ", ".join(r["name"] for r in regressions), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
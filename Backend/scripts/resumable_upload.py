@@ -0,0 +1,150 @@
+"""
+Client for the resumable lecture video upload, with simulated network drops.
+
+Uploads a file through /teacher/attendance/uploads in chunks. With
+--drop-rate > 0 some chunks are cut off part-way by closing the socket, the
+way a flaky classroom connection would; the client then asks the server for
+the current offset and resumes from there. Once every byte is acknowledged it
+completes the upload and polls for the recognition result.
+
+    cd Backend
+    python -m scripts.resumable_upload lecture.mp4 --subject-id 3 \\
+        --username jane.doe@classroom.com --password ... --drop-rate 0.3
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+class Client:
+    def __init__(self, base_url: str, token: str = None):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.netloc
+        self.token = token
+
+    def _connection(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, timeout=60)
+
+    def _headers(self, extra=None) -> dict:
+        headers = dict(extra or {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return headers
+
+    def request(self, method: str, path: str, payload=None):
+        conn = self._connection()
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = self._headers({"Content-Type": "application/json"} if body else None)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read() or b"null")
+        finally:
+            conn.close()
+
+    def put_chunk(self, path: str, data: bytes, drop_after: int = None):
+        """PUT `data`; with `drop_after`, send only that many bytes and hang up."""
+        conn = self._connection()
+        conn.putrequest("PUT", path)
+        for key, value in self._headers({"Content-Type": "application/octet-stream",
+                                         "Content-Length": str(len(data))}).items():
+            conn.putheader(key, value)
+        conn.endheaders()
+        try:
+            if drop_after is not None:
+                conn.send(data[:drop_after])
+                return None, None
+            conn.send(data)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read() or b"null")
+        finally:
+            conn.close()
+
+def login(client: Client, username: str, password: str) -> str:
+    status, body = client.request("POST", "/auth/login", {"username": username, "password": password})
+    if status != 200:
+        sys.exit(f"login failed: {body}")
+    return body["access_token"]
+
+def upload(client: Client, path: str, subject_id: int, class_id: int = None,
+           chunk_size: int = None, drop_rate: float = 0.0, rng=random) -> dict:
+    size = os.path.getsize(path)
+    status, meta = client.request("POST", "/teacher/attendance/uploads", {
+        "filename": os.path.basename(path), "size": size,
+        "subject_id": subject_id, "class_id": class_id,
+    })
+    if status != 200:
+        sys.exit(f"init failed: {meta}")
+    upload_id = meta["upload_id"]
+    chunk_size = chunk_size or meta["chunk_size"]
+    resource = f"/teacher/attendance/uploads/{upload_id}"
+    stats = {"chunks": 0, "drops": 0, "conflicts": 0}
+
+    offset = 0
+    with open(path, "rb") as f:
+        while offset < size:
+            f.seek(offset)
+            data = f.read(chunk_size)
+            drop_after = rng.randrange(len(data)) if rng.random() < drop_rate else None
+            status, body = client.put_chunk(f"{resource}?offset={offset}", data, drop_after)
+            if drop_after is not None:
+                stats["drops"] += 1
+                print(f"  dropped connection after {offset + drop_after}/{size} bytes", file=sys.stderr)
+            elif status == 409:
+                stats["conflicts"] += 1
+            elif status != 200:
+                sys.exit(f"chunk failed ({status}): {body}")
+            else:
+                stats["chunks"] += 1
+            if status != 200:
+                # Ask the server where to resume; it keeps whatever arrived before the drop
+                time.sleep(0.2)
+                status, body = client.request("GET", resource)
+            offset = body["offset"]
+            print(f"  {offset}/{size} bytes acknowledged", file=sys.stderr)
+
+    status, body = client.request("POST", f"{resource}/complete")
+    if status != 202:
+        sys.exit(f"complete failed: {body}")
+    while body["status"] == "processing":
+        time.sleep(1)
+        status, body = client.request("GET", resource)
+    body["client_stats"] = stats
+    return body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file")
+    parser.add_argument("--subject-id", type=int, required=True)
+    parser.add_argument("--class-id", type=int)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", help="bearer token (or use --username/--password)")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--chunk-mb", type=float, help="chunk size (default: server's suggestion)")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="probability of cutting a chunk off mid-transfer")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    client = Client(args.url, args.token)
+    if not args.token:
+        if not (args.username and args.password):
+            parser.error("give --token or --username and --password")
+        client.token = login(client, args.username, args.password)
+
+    result = upload(client, args.file, args.subject_id, args.class_id,
+                    chunk_size=int(args.chunk_mb * 1024 * 1024) if args.chunk_mb else None,
+                    drop_rate=args.drop_rate, rng=random.Random(args.seed))
+    print(json.dumps(result, indent=2))
+    if result["status"] != "done":
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
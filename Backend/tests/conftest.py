@@ -0,0 +1,35 @@
+import os
+import tempfile
+import pytest
+
+# Point the app at a throwaway SQLite DB and data dirs; must run before `app` is imported
+WORKDIR = tempfile.mkdtemp(prefix="attendai-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["FACE_GALLERY_DIR"] = os.path.join(WORKDIR, "gallery")
+os.environ["FACE_RESULT_CACHE_ENABLED"] = "false"
+os.environ["FACE_ANN_PATH"] = os.path.join(WORKDIR, "face_index.npz")
+os.environ["VIDEO_RETENTION_ENABLED"] = "false"
+os.environ["SCHEDULE_CACHE_STAMP"] = os.path.join(WORKDIR, "schedule_cache.stamp")
+os.environ["UPLOAD_STAGING_DIR"] = os.path.join(WORKDIR, "upload_staging")
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as client:
+        yield client
+
+def login(client, username: str, password: str) -> dict:
+    response = client.post("/auth/login", json={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    return login(client, "admin@classroom.com", "Admin123")
+
+@pytest.fixture(scope="session")
+def teacher_headers(client, admin_headers):
+    teacher = client.post("/admin/teachers", json={"name": "Test Teacher"}, headers=admin_headers).json()
+    return login(client, teacher["username"], teacher["password"])
@@ -0,0 +1,48 @@
+import pytest
+from app.utils import admission
+
+@pytest.fixture
+def full_video_class(monkeypatch):
+    limiter = admission.AdmissionLimiter("video", concurrency=0, per_user=1, queue=0, timeout=0)
+    monkeypatch.setitem(admission.limiters, "video", limiter)
+    return limiter
+
+def test_busy_upload_is_refused_before_its_body_is_read(client, teacher_headers, full_video_class):
+    body_reads = []
+
+    async def receive():
+        body_reads.append(1)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    headers = [(key.lower().encode(), value.encode()) for key, value in {
+        **teacher_headers,
+        "Content-Type": "multipart/form-data; boundary=x",
+        "Content-Length": str(500 * 1024 ** 2),
+    }.items()]
+    path = "/teacher/attendance/video"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"subject_id=1", "headers": headers,
+        "server": ("testserver", 80), "client": ("testclient", 50000),
+    }
+    client.portal.call(client.app, scope, receive, send)
+
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    assert start["status"] == 429
+    assert (b"retry-after", b"5") in start["headers"]
+    assert body_reads == []
+
+def test_admitted_requests_release_their_slot(client, teacher_headers):
+    assert client.get("/teacher/analytics", headers=teacher_headers).status_code == 200
+    assert admission.limiters["analytics"].active == 0
+
+def test_requests_without_a_token_get_401_not_429(client, full_video_class):
+    response = client.post("/teacher/attendance/video", params={"subject_id": 1},
+                           files={"file": ("v.mp4", b"x", "video/mp4")})
+    assert response.status_code == 401
@@ -0,0 +1,58 @@
+import json
+import numpy as np
+from sqlalchemy import delete, insert
+from app.ai import face_service
+from app.database import SessionLocal
+from app.models.models import FaceEncoding, Student
+
+def test_index_follows_encodings_replaced_without_a_size_change(client):
+    rng = np.random.default_rng(0)
+    db = SessionLocal()
+    try:
+        students = [Student(name=f"ANN {i}", roll_number=f"ANN{i:03d}") for i in range(20)]
+        db.add_all(students)
+        db.flush()
+        for student in students:
+            db.add(FaceEncoding(student_id=student.id, encoding=json.dumps(rng.normal(0, 0.1, 128).tolist())))
+        db.commit()
+        face_service.get_ann_index(db)
+
+        # Re-enroll one student with a different photo, e.g. from another worker
+        student = students[0]
+        old = np.array(json.loads(student.face_encodings[0].encoding))
+        new = rng.normal(0, 0.1, 128)
+        student.face_encodings.clear()
+        db.add(FaceEncoding(student_id=student.id, encoding=json.dumps(new.tolist())))
+        db.commit()
+
+        index = face_service.get_ann_index(db)
+        distances, labels = index.search(np.stack([new, old]), n_probe=index.n_lists)
+        assert labels[0] == student.id and distances[0] < 1e-9
+        assert distances[1] > 1e-9
+    finally:
+        db.close()
+
+def test_index_rebuilds_when_rows_change_outside_the_feed(client):
+    rng = np.random.default_rng(1)
+    db = SessionLocal()
+    try:
+        students = [Student(name=f"RAW {i}", roll_number=f"RAW{i:03d}") for i in range(10)]
+        db.add_all(students)
+        db.flush()
+        for student in students:
+            db.add(FaceEncoding(student_id=student.id, encoding=json.dumps(rng.normal(0, 0.1, 128).tolist())))
+        db.commit()
+        face_service.get_ann_index(db)
+
+        # Delete one row and insert another with core statements: same count, no feed entries
+        new = rng.normal(0, 0.1, 128)
+        db.execute(delete(FaceEncoding).where(FaceEncoding.student_id == students[0].id))
+        db.execute(insert(FaceEncoding).values(student_id=students[1].id, encoding=json.dumps(new.tolist())))
+        db.commit()
+
+        index = face_service.get_ann_index(db)
+        distances, labels = index.search([new], n_probe=index.n_lists)
+        assert labels[0] == students[1].id and distances[0] < 1e-9
+        assert np.array_equal(index.ids(), np.sort(face_service.get_gallery(db).encoding_ids))
+    finally:
+        db.close()
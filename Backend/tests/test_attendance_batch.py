@@ -0,0 +1,31 @@
+from app.database import SessionLocal
+from app.models.models import Attendance, AttendanceRecord, Student
+
+def test_repeated_new_session_is_reported_as_duplicate(client, teacher_headers):
+    db = SessionLocal()
+    try:
+        student = Student(name="Batch Student", roll_number="BATCH01")
+        db.add(student)
+        db.commit()
+        student_id = student.id
+    finally:
+        db.close()
+
+    session = {"subject_id": 4242, "date": "2024-05-06"}
+    response = client.post("/teacher/attendance/batch", headers=teacher_headers, json={"sessions": [
+        {**session, "records": [{"student_id": student_id, "status": "Present"}]},
+        {**session, "records": [{"student_id": student_id, "status": "Absent"}]},
+    ]})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [r["status"] for r in body["results"]] == ["created", "duplicate"]
+    assert body["saved"] == 1
+
+    db = SessionLocal()
+    try:
+        sessions = db.query(Attendance).filter(Attendance.subject_id == 4242).all()
+        assert len(sessions) == 1
+        records = db.query(AttendanceRecord).filter(AttendanceRecord.attendance_id == sessions[0].id).all()
+        assert [r.status for r in records] == ["Present"]
+    finally:
+        db.close()
@@ -0,0 +1,71 @@
+import pytest
+from fastapi import BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from app import database
+from app.database import SessionLocal, QueryBudgetExceeded
+from app.models.models import Student, StudentSubject, Subject
+from app.utils.metrics import MetricsMiddleware, current_request_stats, detached
+
+@pytest.fixture
+def strict_budget(monkeypatch):
+    monkeypatch.setattr(database, "QUERY_BUDGET", 1)
+    monkeypatch.setattr(database, "QUERY_BUDGET_STRICT", True)
+
+def run_queries(count: int, seen: list):
+    seen.append(current_request_stats())
+    db = SessionLocal()
+    try:
+        for _ in range(count):
+            db.execute(text("SELECT 1"))
+    finally:
+        db.close()
+
+def test_strict_budget_fails_the_request(client, teacher_headers, strict_budget):
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/teacher/dashboard", headers=teacher_headers)
+
+def test_background_work_is_not_charged_to_the_request(strict_budget):
+    seen, stats = [], []
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/job")
+    def job(background_tasks: BackgroundTasks):
+        run_queries(1, [])
+        stats.append(current_request_stats())
+        background_tasks.add_task(detached(run_queries), 3, seen)
+        return {}
+
+    with TestClient(app) as job_client:
+        assert job_client.get("/job").status_code == 200
+    assert seen == [None]
+    assert stats[0]["queries"] == 1
+
+def test_student_list_query_count_does_not_grow_with_students(client, admin_headers):
+    def count_queries():
+        seen = []
+        listener = lambda *args: seen.append(1)
+        event.listen(Engine, "before_cursor_execute", listener)
+        try:
+            assert client.get("/admin/students", headers=admin_headers).status_code == 200
+        finally:
+            event.remove(Engine, "before_cursor_execute", listener)
+        return len(seen)
+
+    before = count_queries()
+    db = SessionLocal()
+    try:
+        subject = Subject(name="Budget Subject")
+        db.add(subject)
+        db.flush()
+        for i in range(5):
+            student = Student(name=f"Budget {i}", roll_number=f"BUD{i:03d}")
+            db.add(student)
+            db.flush()
+            db.add(StudentSubject(student_id=student.id, subject_id=subject.id))
+        db.commit()
+    finally:
+        db.close()
+    assert count_queries() == before
@@ -0,0 +1,21 @@
+from app.ai.face_service import StudentScore
+
+def score(*frames):
+    s = StudentScore(1)
+    for frame in frames:
+        s.add(frame, 0.3)
+    return s
+
+def test_min_hits_counts_distinct_frames():
+    assert score(0, 0).hits == 2
+    assert not score(0, 0).is_present(2, 0.5)
+    assert score(0, 30).is_present(2, 0.5)
+
+def test_mean_distance_limit():
+    s = score(0, 30)
+    assert not s.is_present(2, 0.25)
+
+def test_short_video_scales_min_hits_to_sampled_frames():
+    assert score(0).is_present(2, 0.5, frames_sampled=1)
+    assert not score(0).is_present(2, 0.5, frames_sampled=2)
+    assert score(0, 30).is_present(3, 0.5, frames_sampled=2)
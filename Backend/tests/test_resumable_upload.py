@@ -0,0 +1,76 @@
+import os
+from app.utils import chunked_upload
+
+VIDEO = os.urandom(300_000)
+
+def start_upload(client, headers) -> str:
+    response = client.post("/teacher/attendance/uploads",
+                           json={"filename": "lecture.mp4", "size": len(VIDEO), "subject_id": 1},
+                           headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["upload_id"]
+
+def put_chunk(client, headers, upload_id: str, offset: int, data: bytes):
+    return client.put(f"/teacher/attendance/uploads/{upload_id}", params={"offset": offset},
+                      content=data, headers={**headers, "Content-Type": "application/octet-stream"})
+
+def put_and_drop(client, headers, upload_id: str, offset: int, data: bytes, sent: int):
+    """PUT `data` but have the client disconnect after `sent` bytes, the way a
+    dropped classroom connection would."""
+    messages = [
+        {"type": "http.request", "body": data[:sent], "more_body": True},
+        {"type": "http.disconnect"},
+    ]
+    headers = [(key.lower().encode(), value.encode()) for key, value in {
+        **headers, "Content-Type": "application/octet-stream", "Content-Length": str(len(data))
+    }.items()]
+    path = f"/teacher/attendance/uploads/{upload_id}"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "PUT",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": f"offset={offset}".encode(), "headers": headers,
+        "server": ("testserver", 80), "client": ("testclient", 50000),
+    }
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    client.portal.call(client.app, scope, receive, send)
+
+def staged_bytes(upload_id: str) -> bytes:
+    with open(chunked_upload.data_path(upload_id), "rb") as f:
+        return f.read()
+
+def test_resume_after_mid_chunk_disconnect(client, teacher_headers):
+    upload_id = start_upload(client, teacher_headers)
+    put_and_drop(client, teacher_headers, upload_id, 0, VIDEO[:200_000], sent=123_457)
+
+    status = client.get(f"/teacher/attendance/uploads/{upload_id}", headers=teacher_headers).json()
+    assert status["offset"] == 123_457
+
+    stale = put_chunk(client, teacher_headers, upload_id, 0, VIDEO[:200_000])
+    assert stale.status_code == 409
+    assert stale.headers["Upload-Offset"] == "123457"
+
+    response = put_chunk(client, teacher_headers, upload_id, 123_457, VIDEO[123_457:])
+    assert response.status_code == 200, response.text
+    assert response.json()["offset"] == len(VIDEO)
+    assert staged_bytes(upload_id) == VIDEO
+
+def test_append_in_progress_elsewhere_conflicts(client, teacher_headers):
+    upload_id = start_upload(client, teacher_headers)
+    assert put_chunk(client, teacher_headers, upload_id, 0, VIDEO[:1000]).status_code == 200
+
+    # Another worker holding the staging file mid-append
+    with chunked_upload.appender(upload_id) as f:
+        assert f is not None
+        response = put_chunk(client, teacher_headers, upload_id, 1000, VIDEO[1000:])
+        assert response.status_code == 409
+        assert response.headers["Upload-Offset"] == "1000"
+
+    response = put_chunk(client, teacher_headers, upload_id, 1000, VIDEO[1000:])
+    assert response.status_code == 200, response.text
+    assert staged_bytes(upload_id) == VIDEO
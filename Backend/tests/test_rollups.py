@@ -0,0 +1,51 @@
+from datetime import date
+import numpy as np
+from app.database import SessionLocal
+from app.models.models import (
+    Attendance, AttendanceRecord, AttendanceRollup, Student, StudentAttendanceRollup
+)
+from app.utils import rollups
+
+def test_session_without_subject_is_rolled_up(client):
+    db = SessionLocal()
+    try:
+        student = Student(name="No Subject", roll_number="NOSUBJ01")
+        db.add(student)
+        db.flush()
+        session = Attendance(date=date(2024, 3, 4))
+        session.records.append(AttendanceRecord(student_id=student.id, status="Present"))
+        db.add(session)
+        db.flush()
+        rollups.refresh(db, [session.id])
+
+        session.records[0].status = "Absent"
+        rollups.refresh(db, [session.id], {student.id})
+
+        rows = db.query(StudentAttendanceRollup).filter(StudentAttendanceRollup.student_id == student.id).all()
+        assert [(r.subject_id, r.records, r.present) for r in rows] == [(None, 1, 0)]
+        week = db.query(AttendanceRollup).filter(AttendanceRollup.week_start == date(2024, 3, 4),
+                                                 AttendanceRollup.subject_id.is_(None)).one()
+        assert (week.sessions, week.records, week.absent) == (1, 1, 1)
+    finally:
+        db.rollback()
+        db.close()
+
+def test_distribution_matches_numpy(client):
+    rng = np.random.default_rng(2)
+    values = np.round(rng.uniform(0, 100, 501), 1)
+    db = SessionLocal()
+    try:
+        db.add_all(StudentAttendanceRollup(student_id=i, subject_id=None, class_id=987654,
+                                           records=10, present=5, percentage=float(v))
+                   for i, v in enumerate(values))
+        db.flush()
+        points = [0, 10, 25, 50, 90, 99.5, 100]
+        result = rollups.distribution(db, rollups.student_scope(class_id=987654), 75, points)
+        assert result["count"] == len(values)
+        assert result["mean"] == round(values.mean(), 1)
+        assert result["below_threshold"] == int((values < 75).sum())
+        assert result["percentiles"] == {f"p{p:g}": round(float(v), 1)
+                                         for p, v in zip(points, np.percentile(values, points))}
+    finally:
+        db.rollback()
+        db.close()
@@ -0,0 +1,49 @@
+import pandas as pd
+from sqlalchemy import func
+from app.database import SessionLocal
+from app.models.models import ClassSection, Subject
+from app.utils.schedule_import import parse_schedule_frame, resolve_classes, resolve_subjects
+
+def test_parse_normalizes_days_times_and_classes():
+    parsed = parse_schedule_frame(pd.DataFrame({
+        "day": ["Monday", "tue", "Someday"],
+        "time": ["9:00-10:00", "11:30 - 12:15", "9:00-10:00"],
+        "subject": ["Math", "Physics", "Math"],
+        "class": ["10-A", "11", "10-A"],
+    }))
+    assert list(parsed["day"]) == ["Monday", "Tuesday"]
+    assert [t.strftime("%H:%M") for t in parsed["time_start"]] == ["09:00", "11:30"]
+    assert [t.strftime("%H:%M") for t in parsed["time_end"]] == ["10:00", "12:15"]
+    assert list(parsed["class_name"]) == ["10", "11"]
+    assert list(parsed["section"]) == ["A", ""]
+
+def test_timetable_with_headers_only_parses_to_no_rows():
+    parsed = parse_schedule_frame(pd.DataFrame(columns=["day", "time", "subject", "class"]))
+    assert parsed.empty
+    assert {"day", "subject", "time_start", "time_end", "class_name", "section"} <= set(parsed.columns)
+
+def test_upload_empty_timetable(client, admin_headers):
+    teacher = client.post("/admin/teachers", json={"name": "Empty Timetable"}, headers=admin_headers).json()
+    response = client.post(f"/admin/teachers/{teacher['teacher_id']}/schedule",
+                           files={"file": ("schedule.csv", b"day,time,subject,class\n", "text/csv")},
+                           headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+def test_names_differing_in_case_and_spacing_resolve_to_one_row(client):
+    db = SessionLocal()
+    try:
+        db.add(Subject(name="Chemistry", code="CHE100"))
+        db.add(ClassSection(name="12", section="B"))
+        db.flush()
+        subject_ids = resolve_subjects(db, ["chemistry ", "CHEMISTRY", "Biology", " biology"])
+        class_ids = resolve_classes(db, [("12", "b"), (" 12", "B "), ("9", "c"), ("9 ", "C")])
+
+        assert subject_ids["chemistry "] == subject_ids["CHEMISTRY"]
+        assert subject_ids["Biology"] == subject_ids[" biology"]
+        assert db.query(Subject).filter(func.lower(Subject.name).in_(["chemistry", "biology"])).count() == 2
+        assert class_ids[("12", "b")] == class_ids[(" 12", "B ")]
+        assert class_ids[("9", "c")] == class_ids[("9 ", "C")]
+        assert db.query(ClassSection).filter(ClassSection.name.in_(["12", "9"])).count() == 2
+    finally:
+        db.rollback()
+        db.close()
@@ -0,0 +1,37 @@
+import io
+import os
+import zipfile
+from app.routes import admin
+from app.routes.admin import index_student_images
+
+def test_numbered_photos_are_extras_of_their_roll_number():
+    names = ["imgs/STU001.jpg", "imgs/STU001_2.jpg", "imgs/STU002/front.png", "imgs/notes.txt"]
+    index = index_student_images(names, "imgs", {"STU001", "STU002"})
+    assert index["STU001"] == ["imgs/STU001.jpg", "imgs/STU001_2.jpg"]
+    assert index["STU002"] == ["imgs/STU002/front.png"]
+
+def test_roll_number_that_looks_like_a_numbered_extra_keeps_its_photos():
+    names = ["imgs/A.jpg", "imgs/A_1.jpg", "imgs/A_1_2.jpg"]
+    index = index_student_images(names, "imgs", {"A", "A_1"})
+    assert index["A"] == ["imgs/A.jpg"]
+    assert index["A_1"] == ["imgs/A_1.jpg", "imgs/A_1_2.jpg"]
+
+def test_rejected_zip_photos_are_not_saved(client, admin_headers, monkeypatch, tmp_path):
+    def encode(photos):
+        # The second photo is of someone else
+        return [[0.0] * 128 for _ in photos[::2]], photos[1:2]
+
+    monkeypatch.setattr(admin, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(admin, "encode_student_images", encode)
+    monkeypatch.setattr(admin, "make_thumbnails", lambda *args: None)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("students.csv", "name,roll_number\nZip Student,ZIP001\n")
+        for name in ["ZIP001.jpg", "ZIP001_2.jpg", "ZIP001_3.jpg"]:
+            zf.writestr(f"images/{name}", name)
+
+    response = client.post("/admin/students/upload", headers=admin_headers,
+                           files={"file": ("students.zip", archive.getvalue(), "application/zip")})
+    assert response.status_code == 200, response.text
+    assert sorted(os.listdir(tmp_path / "students")) == ["ZIP001.jpg", "ZIP001_3.jpg"]
+    assert any("ZIP001_2.jpg" in error for error in response.json()["errors"])
@@ -0,0 +1,19 @@
+import os
+import time
+from app.utils import video_store
+
+def test_get_treats_videos_past_the_ttl_as_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_store, "VIDEO_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(video_store, "VIDEO_RETENTION_ENABLED", True)
+    monkeypatch.setattr(video_store, "VIDEO_RETENTION_TTL_HOURS", 1)
+    upload = tmp_path / "upload.mp4"
+    upload.write_bytes(b"video")
+
+    video_id = video_store.retain(str(upload), 1, "lecture.mp4")
+    assert video_store.get(video_id, 1)["filename"] == "lecture.mp4"
+    assert video_store.get(video_id, 2) is None
+
+    stale = time.time() - 2 * 3600
+    os.utime(tmp_path / f"{video_id}.json", (stale, stale))
+    assert video_store.get(video_id, 1) is None
+    assert os.listdir(tmp_path) == []
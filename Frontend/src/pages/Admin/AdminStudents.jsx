@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import AdminLayout from '../../components/AdminLayout';
-import { uploadStudents, getStudents, getSubjects } from '../../services/api';
+import API, { uploadStudents, getStudents, getSubjects } from '../../services/api';
 import '../../styles/admin.css';
 import '../../styles/forms.css';
 import '../../styles/tables.css';
@@ -147,7 +147,9 @@ export default function AdminStudents() {
           {filtered.map(s => (
             <div className="student-card" key={s.id}>
               <div className="sc-avatar">
-                {s.name.charAt(0).toUpperCase()}
+                {s.thumbnails ? (
+                  <img src={`${API.defaults.baseURL}/${s.thumbnails.sm}`} alt={s.name} loading="lazy" />
+                ) : s.name.charAt(0).toUpperCase()}
               </div>
               <div className="sc-info">
                 <div className="sc-name">{s.name}</div>
@@ -16,6 +16,19 @@ export const login = (username, password) =>
 export const getDashboardStats = () =>
   API.get('/admin/dashboard/stats');
 
+// ─── Admin: School Analytics ───────────────────────────────────────────────
+export const getAnalyticsSummary = (groupBy, params) =>
+  API.get('/admin/analytics/summary', { params: { group_by: groupBy, ...params } });
+
+export const getAttendanceDistribution = (params) =>
+  API.get('/admin/analytics/distribution', { params });
+
+export const getSchoolLowAttendance = (params) =>
+  API.get('/admin/analytics/low-attendance', { params });
+
+export const rebuildAnalytics = () =>
+  API.post('/admin/analytics/rebuild');
+
 // ─── Admin: Teachers ────────────────────────────────────────────────────────
 export const getTeachers = () =>
   API.get('/admin/teachers');
@@ -32,6 +45,9 @@ export const deleteTeacher = (id) =>
 export const uploadSchedule = (teacherId, formData) =>
   API.post(`/admin/teachers/${teacherId}/schedule`, formData);
 
+export const uploadSchedulesBulk = (formData) =>
+  API.post('/admin/schedules/upload', formData);
+
 export const getTeacherScheduleAdmin = (teacherId) =>
   API.get(`/admin/teachers/${teacherId}/schedule`);
 
@@ -45,6 +61,23 @@ export const getStudents = (subjectId) =>
 export const getSubjects = () =>
   API.get('/admin/subjects');
 
+export const addStudentPhotos = (studentId, formData) =>
+  API.post(`/admin/students/${studentId}/photos`, formData);
+
+export const resetStudentEncodings = (studentId) =>
+  API.delete(`/admin/students/${studentId}/encodings`);
+
+export const getDuplicateStudents = (maxDistance) =>
+  API.get('/admin/students/duplicates', { params: maxDistance ? { max_distance: maxDistance } : {} });
+
+// ─── Admin: Export ─────────────────────────────────────────────────────────
+export const exportAllAttendance = (params) =>
+  API.get('/admin/attendance/export', { params, responseType: 'blob' });
+
+// ─── Admin: Admission Control ──────────────────────────────────────────────
+export const getAdmissionStatus = () =>
+  API.get('/admin/admission');
+
 // ─── Admin: Credentials ────────────────────────────────────────────────────
 export const changeAdminCredentials = (data) =>
   API.put('/admin/credentials', data);
@@ -69,17 +102,76 @@ export const getStudentsForAttendance = (subjectId, classId) =>
 export const uploadAttendanceVideo = (formData) =>
   API.post('/teacher/attendance/video', formData);
 
+export const reprocessAttendanceVideo = (videoId, params) =>
+  API.post(`/teacher/attendance/video/${videoId}/reprocess`, null, { params });
+
+// Resumable upload: init, PUT chunks at the acknowledged offset, then complete
+export const initVideoUpload = (data) =>
+  API.post('/teacher/attendance/uploads', data);
+
+export const uploadVideoChunk = (uploadId, offset, blob) =>
+  API.put(`/teacher/attendance/uploads/${uploadId}`, blob, {
+    params: { offset },
+    headers: { 'Content-Type': 'application/octet-stream' },
+  });
+
+export const getVideoUpload = (uploadId) =>
+  API.get(`/teacher/attendance/uploads/${uploadId}`);
+
+export const completeVideoUpload = (uploadId) =>
+  API.post(`/teacher/attendance/uploads/${uploadId}/complete`);
+
+export const startAttendanceStream = (data) =>
+  API.post('/teacher/attendance/stream', data);
+
+export const getAttendanceStream = (streamId, params) =>
+  API.get(`/teacher/attendance/stream/${streamId}`, { params });
+
+export const stopAttendanceStream = (streamId, params) =>
+  API.delete(`/teacher/attendance/stream/${streamId}`, { params });
+
+// EventSource cannot send the bearer token, so read the SSE stream with fetch
+export const streamAttendanceEvents = async (streamId, onEvent, signal) => {
+  const res = await fetch(`${API.defaults.baseURL}/teacher/attendance/stream/${streamId}/events`, {
+    headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+    signal,
+  });
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += value;
+    const messages = buffer.split('\n\n');
+    buffer = messages.pop();
+    for (const message of messages) {
+      const data = message.split('\n').find(line => line.startsWith('data: '));
+      if (data) onEvent(JSON.parse(data.slice(6)));
+    }
+  }
+};
+
 export const saveAttendance = (data) =>
   API.post('/teacher/attendance', data);
 
+export const saveAttendanceBatch = (sessions) =>
+  API.post('/teacher/attendance/batch', { sessions });
+
 export const getAttendanceRecords = (params) =>
   API.get('/teacher/attendance/records', { params });
 
 export const editAttendanceRecord = (id, data) =>
   API.put(`/teacher/attendance/${id}`, data);
 
+export const exportAttendance = (params) =>
+  API.get('/teacher/attendance/export', { params, responseType: 'blob' });
+
 // ─── Teacher: Analytics ────────────────────────────────────────────────────
-export const getAnalytics = () =>
-  API.get('/teacher/analytics');
+export const getAnalytics = (params) =>
+  API.get('/teacher/analytics', { params });
+
+// params: subject_id and/or class_id, optional date_from, date_to, threshold
+export const getAttendanceHeatmap = (params) =>
+  API.get('/teacher/analytics/heatmap', { params });
 
 export default API;
\ No newline at end of file